@@ -1,39 +1,101 @@
+import asyncio
+import hashlib
 import json
+import operator
 import os
+import shutil
+import time
 from enum import Enum
-from typing import Dict, List, Any, Optional, TypedDict, cast
+from typing import Annotated, Dict, List, Any, Optional, Tuple, TypedDict, cast
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, END
+
+from llm_cache import LLMResponseCache, discard_response, llm_cache_enabled, open_stream, with_response_cache
+from llm_http import close_loop_connections, get_http_clients, get_http_timeout, http_pool_stats
+from llm_limiter import AdaptiveLimiter, get_limiter_config, llm_limiter_enabled, with_concurrency_limit
+from llm_resilience import RetryPolicy, llm_resilience_enabled, with_resilience
+from model_routing import get_phase_model_config
+from structured_output import ainvoke_structured, structured_output_enabled
+from token_budget import describe_budget, fit_prompt
 
 # Import tools as t
 import tools as t
-
-# Load environment variables
-load_dotenv()
-
-deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
-deepseek_api_base = os.getenv('DEEPSEEK_API_BASE')
-model_name = os.getenv('DEEPSEEK_MODEL', "deepseek-reasoner")
-
-if not deepseek_api_key:
-    raise ValueError("DEEPSEEK_API_KEY must be set")
-if not deepseek_api_base:
-    raise ValueError("DEEPSEEK_API_BASE must be set")
-
-# Create language model
-llm = ChatOpenAI(
-    openai_api_key=deepseek_api_key,
-    openai_api_base=deepseek_api_base,
-    model_name=model_name,
-    temperature=0.4
-)
+from tools.scan_cache import get_cache_dir
+
+# The API credentials, the models and the compiled graphs are created on first use, so importing
+# this module is cheap and does not need DEEPSEEK_API_KEY
+_llm_shared: Optional[Dict[str, Any]] = None
+_phase_models: Dict[str, Any] = {}
+_implement_graph = None
+_agent = None
+
+
+def get_llm_credentials() -> Tuple[str, str]:
+    """API key and base URL of the model endpoint, from the environment or .env."""
+    load_dotenv()
+    deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
+    deepseek_api_base = os.getenv('DEEPSEEK_API_BASE')
+    if not deepseek_api_key:
+        raise ValueError("DEEPSEEK_API_KEY must be set")
+    if not deepseek_api_base:
+        raise ValueError("DEEPSEEK_API_BASE must be set")
+    return deepseek_api_key, deepseek_api_base
+
+
+def get_llm_shared() -> Dict[str, Any]:
+    """
+    State shared by the models of every phase: one concurrency limit and rate budget for the
+    endpoint ("limiter"), one circuit breaker ("policy") and one response cache ("cache"). Each is
+    None when its layer is disabled.
+    """
+    global _llm_shared
+    if _llm_shared is None:
+        _llm_shared = {
+            "limiter": AdaptiveLimiter() if llm_limiter_enabled() else None,
+            "policy": RetryPolicy() if llm_resilience_enabled() else None,
+            "cache": LLMResponseCache() if llm_cache_enabled() else None
+        }
+    return _llm_shared
+
+
+def llm_for(phase: str) -> Any:
+    """
+    Language model for one workflow phase, with the model, temperature and max_tokens from
+    model_routing. Every request attempt passes the shared adaptive concurrency limiter, retries are
+    handled by the resilience layer rather than the OpenAI client, and responses come from the
+    persistent response cache where possible.
+    """
+    if phase not in _phase_models:
+        # langchain_openai (and the openai SDK under it) is most of this module's import time
+        from langchain_openai import ChatOpenAI
+
+        deepseek_api_key, deepseek_api_base = get_llm_credentials()
+        shared = get_llm_shared()
+        config = get_phase_model_config(phase)
+        # Every phase model and every run in the process shares one pooled, keep-alive connection pool
+        clients = get_http_clients()
+        http_clients = {"http_client": clients[0], "http_async_client": clients[1]} if clients else {}
+        model = ChatOpenAI(
+            openai_api_key=deepseek_api_key,
+            openai_api_base=deepseek_api_base,
+            model_name=config["model"],
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"],
+            max_retries=0 if llm_resilience_enabled() else 2,
+            request_timeout=get_http_timeout(),
+            **http_clients
+        )
+        model = with_concurrency_limit(model, shared["limiter"])
+        model = with_resilience(model, shared["policy"])
+        _phase_models[phase] = with_response_cache(model, shared["cache"])
+    return _phase_models[phase]
 
 
 # Define phases for the workflow
 class Phase(str, Enum):
+    PREPARE_REPOSITORY = "prepare_repository"
+    INTERPRET_DIRECTIVE = "interpret_directive"
     CLONE_REPO = "clone_repo"
     SCAN_UI_FILES = "scan_ui_files"
     ANALYZE_UI = "analyze_ui"
@@ -45,6 +107,25 @@ class Phase(str, Enum):
     COMPLETE = "complete"
 
 
+def prefer_non_empty(current: str, update: str) -> str:
+    return update or current
+
+
+def merge_log(current: List[str], update: List[str]) -> List[str]:
+    """
+    Merge a node's log into the state's log.
+
+    Nodes return the log they were given plus their own entries; when parallel branches do so in
+    the same step, the entries each one added after the shared prefix are appended in turn.
+    """
+    shared = 0
+    for existing, new in zip(current, update):
+        if existing != new:
+            break
+        shared += 1
+    return current + update[shared:]
+
+
 # Define a state type with total=False to make all fields optional
 class State(TypedDict, total=False):
     phase: str
@@ -53,8 +134,9 @@ class State(TypedDict, total=False):
     repo_dir: str
     ui_files: Dict[str, Any]
     ui_analysis: Dict[str, Any]
-    primary_focus: str
-    design_approach: str
+    # Written by both the repository and the directive branch, which run in parallel
+    primary_focus: Annotated[str, prefer_non_empty]
+    design_approach: Annotated[str, prefer_non_empty]
     enhancement_opportunities: Dict[str, Any]
     enhancement_plan: Dict[str, Any]
     files_to_enhance: List[Dict[str, Any]]
@@ -62,8 +144,10 @@ class State(TypedDict, total=False):
     enhanced_files: List[Dict[str, Any]]
     verification_result: Dict[str, Any]
     summary: str
+    # fit_prompt report per phase: prompt tokens before and after compaction
+    prompt_budgets: Dict[str, Any]
     error: Optional[str]
-    log: List[str]
+    log: Annotated[List[str], merge_log]
 
 
 # Helper function to ensure all required state fields are present
@@ -85,6 +169,7 @@ def ensure_complete_state(state: State) -> State:
         "enhanced_files": [],
         "verification_result": {},
         "summary": "",
+        "prompt_budgets": {},
         "error": None,
         "log": []
     }
@@ -95,7 +180,7 @@ def ensure_complete_state(state: State) -> State:
 
 
 # Define the node functions
-def clone_repository(state: State) -> State:
+async def clone_repository(state: State) -> State:
     try:
         repo_url = state.get("repo_url", "")
         target_dir = os.getenv('TARGET_DIR', './enhanced_repo')
@@ -105,7 +190,7 @@ def clone_repository(state: State) -> State:
         log_message = f"Cloning repository: {repo_url} to {target_dir}"
         print(log_message)
 
-        result = t.git_clone.invoke({"repo_url": repo_url, "target_dir": target_dir})
+        result = await t.git_clone.ainvoke({"repo_url": repo_url, "target_dir": target_dir})
         print(f"Clone result: {result}")
 
         new_log = state.get("log", []) + [log_message, f"Clone complete: {result}"]
@@ -129,15 +214,14 @@ def clone_repository(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def scan_ui_files(state: State) -> State:
+async def scan_ui_files(state: State) -> State:
     try:
         repo_dir = state.get("repo_dir", "")
         log_message = f"Scanning for UI files in: {repo_dir}"
         print(log_message)
 
-        # Get directory tree, but we don't need to use it directly
-        t.get_directory_tree.invoke({"root_dir": repo_dir})  # Just invoke but don't store result
-        scan_result = t.scan_for_ui_files.invoke({"repo_dir": repo_dir})
+        fused_analysis = os.getenv('UI_FUSED_ANALYSIS', 'true').lower() == 'true'
+        scan_result = await t.scan_for_ui_files.ainvoke({"repo_dir": repo_dir, "fused_analysis": fused_analysis})
         ui_files = json.loads(scan_result)
 
         total_files = ui_files.get("summary", {}).get("total_files", 0)
@@ -172,7 +256,7 @@ def scan_ui_files(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def analyze_ui(state: State) -> State:
+async def analyze_ui(state: State) -> State:
     try:
         repo_dir = state.get("repo_dir", "")
         ui_files = state.get("ui_files", {})
@@ -181,7 +265,7 @@ def analyze_ui(state: State) -> State:
         log_message = "Analyzing UI capabilities..."
         print(log_message)
 
-        analysis_result = t.analyze_ui_capabilities.invoke({
+        analysis_result = await t.analyze_ui_capabilities.ainvoke({
             "repo_dir": repo_dir,
             "ui_files_json": ui_files_json
         })
@@ -202,6 +286,12 @@ def analyze_ui(state: State) -> State:
         if anim_types:
             log_messages.append(f"Animation types: {', '.join(anim_types)}")
 
+        coverage = ui_analysis.get("analysis_coverage", {})
+        if coverage:
+            log_messages.append(
+                f"Analysis examined {coverage.get('files_examined', 0)}/{coverage.get('files_total', 0)} "
+                f"UI files ({coverage.get('mode', 'sampled')})")
+
         print("\n".join(log_messages))
 
         updated_state = {
@@ -223,7 +313,145 @@ def analyze_ui(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def identify_opportunities(state: State) -> State:
+async def determine_focus_and_design(enhancement_prompt: str) -> Tuple[str, str]:
+    """Interpret the directive into a primary focus and design approach; needs nothing from the repository."""
+    # Step 1: Identify the primary focus area
+    focus_prompt = f"""
+    Based on the user's enhancement directive: "{enhancement_prompt}", identify the primary UI aspect to focus on.
+    Choose a specific element or feature, such as:
+    - Color scheme
+    - Typography (fonts, text styles)
+    - Button design
+    - Layout and spacing
+    - Image and media presentation (e.g., photo grid size)
+    - Animations and transitions
+    - Form elements
+    - Navigation elements
+
+    If the directive is general, select one specific aspect that could have the most impact based on the UI analysis.
+    Return only the name of the primary aspect.
+    """
+
+    focus_result = await llm_for("focus").ainvoke([HumanMessage(content=focus_prompt)])
+    primary_focus = focus_result.content.strip()
+
+    # Step 2: Propose a specific design approach
+    design_approach_prompt = f"""
+    For the primary focus area: {primary_focus}, propose a specific design approach or style to apply consistently across the application.
+    For example:
+    - If color scheme: Suggest a color palette (e.g., primary, secondary, accent colors with hex codes)
+    - If typography: Suggest font families, sizes, weights
+    - If button design: Suggest styles (e.g., rounded, flat, with shadows, sizes)
+    - If image and media presentation: Suggest grid sizes or layout styles
+    Provide a brief description of the proposed design approach.
+    """
+
+    design_approach_result = await llm_for("design").ainvoke([HumanMessage(content=design_approach_prompt)])
+    design_approach = design_approach_result.content.strip()
+
+    return primary_focus, design_approach
+
+
+async def interpret_directive(state: State) -> State:
+    # Runs alongside clone/scan/analysis, so it returns only its own keys; the State reducers merge them
+    enhancement_prompt = state.get("enhancement_prompt", "")
+    if structured_output_enabled():
+        # identify_opportunities requests focus and design together with the opportunities
+        return {}
+    try:
+        primary_focus, design_approach = await determine_focus_and_design(enhancement_prompt)
+        log_message = f"Interpreted directive: focus on {primary_focus}"
+        print(log_message)
+        return {
+            "primary_focus": primary_focus,
+            "design_approach": design_approach,
+            "log": state.get("log", []) + [log_message]
+        }
+    except Exception as e:
+        error_message = f"Error in interpret_directive: {e}"
+        print(error_message)
+        return {"log": state.get("log", []) + [error_message]}
+
+
+OPPORTUNITY_CATEGORIES = ["visual_design", "animations", "user_experience", "prioritized_files"]
+
+
+def _non_empty_text(value: Any) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+
+def _valid_opportunities(value: Any) -> bool:
+    return (isinstance(value, dict) and all(isinstance(value.get(category), list) for category in OPPORTUNITY_CATEGORIES)
+            and any(value[category] for category in OPPORTUNITY_CATEGORIES))
+
+
+async def identify_opportunities_structured(enhancement_prompt: str, ui_analysis: Dict[str, Any], primary_focus: str,
+                                            design_approach: str) -> Tuple[str, str, Dict[str, Any], Dict[str, Any]]:
+    """
+    Get focus, design approach and opportunities from one structured-output call, re-asking only for gaps.
+
+    Returns:
+        (primary focus, design approach, opportunities, prompt budget report)
+    """
+    prompt, budget_report = fit_prompt("opportunities", lambda sections: f"""
+    You are a UI/UX expert analyzing a web application.
+
+    User's enhancement directive: "{enhancement_prompt}"
+
+    UI analysis:
+    {sections["ui_analysis"]}
+
+    Provide:
+    - primary_focus: The one UI aspect to focus on (e.g. color scheme, typography, button design, layout and spacing,
+      image and media presentation, animations and transitions, form elements, navigation elements). If the directive
+      is general, pick the aspect with the most impact based on the UI analysis.
+    - design_approach: A brief, specific design approach for that aspect to apply consistently across the application
+      (e.g. a palette with hex codes, font families and sizes, button styles, grid sizes).
+    - opportunities: Concrete enhancement opportunities limited to the primary focus and aligned with the design approach,
+      practical for the existing framework and libraries, in these categories:
+      visual_design, animations, user_experience, and prioritized_files (specific files to enhance, with reasons).
+    """, {"ui_analysis": ui_analysis})
+    string_list = {"type": "array", "items": {"type": "string"}}
+    properties = {
+        "primary_focus": {"type": "string", "description": "Name of the primary UI aspect"},
+        "design_approach": {"type": "string", "description": "Proposed design approach for the primary focus"},
+        "opportunities": {
+            "type": "object",
+            "properties": {
+                "visual_design": string_list,
+                "animations": string_list,
+                "user_experience": string_list,
+                "prioritized_files": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string"}, "reason": {"type": "string"}},
+                        "required": ["file", "reason"]
+                    }
+                }
+            },
+            "required": OPPORTUNITY_CATEGORIES
+        }
+    }
+    validators = {
+        "primary_focus": _non_empty_text,
+        "design_approach": _non_empty_text,
+        "opportunities": _valid_opportunities
+    }
+    known = {"primary_focus": primary_focus, "design_approach": design_approach}
+
+    fields, missing = await ainvoke_structured(llm_for("opportunities"), prompt, "ui_enhancement_opportunities",
+                                               "Primary focus, design approach and enhancement opportunities",
+                                               properties, validators, known)
+    if missing:
+        raise ValueError(f"Structured output is missing {', '.join(missing)} after retries")
+    return fields["primary_focus"].strip(), fields["design_approach"].strip(), fields["opportunities"], budget_report
+
+
+async def identify_opportunities(state: State) -> State:
+    # Joins the repository and directive branches; a failed repository branch ends the run here
+    if state.get("phase") == Phase.COMPLETE:
+        return ensure_complete_state(state)
     try:
         enhancement_prompt = state.get("enhancement_prompt", "")
         ui_analysis = state.get("ui_analysis", {})
@@ -233,84 +461,70 @@ def identify_opportunities(state: State) -> State:
         log_message = f"Identifying enhancement opportunities based on: '{enhancement_prompt}'"
         print(log_message)
 
-        # Step 1: Identify the primary focus area
-        focus_prompt = f"""
-        Based on the user's enhancement directive: "{enhancement_prompt}", identify the primary UI aspect to focus on.
-        Choose a specific element or feature, such as:
-        - Color scheme
-        - Typography (fonts, text styles)
-        - Button design
-        - Layout and spacing
-        - Image and media presentation (e.g., photo grid size)
-        - Animations and transitions
-        - Form elements
-        - Navigation elements
-
-        If the directive is general, select one specific aspect that could have the most impact based on the UI analysis.
-        Return only the name of the primary aspect.
-        """
-
-        focus_result = llm.invoke([HumanMessage(content=focus_prompt)])
-        primary_focus = focus_result.content.strip()
-
-        # Step 2: Propose a specific design approach
-        design_approach_prompt = f"""
-        For the primary focus area: {primary_focus}, propose a specific design approach or style to apply consistently across the application.
-        For example:
-        - If color scheme: Suggest a color palette (e.g., primary, secondary, accent colors with hex codes)
-        - If typography: Suggest font families, sizes, weights
-        - If button design: Suggest styles (e.g., rounded, flat, with shadows, sizes)
-        - If image and media presentation: Suggest grid sizes or layout styles
-        Provide a brief description of the proposed design approach.
-        """
-
-        design_approach_result = llm.invoke([HumanMessage(content=design_approach_prompt)])
-        design_approach = design_approach_result.content.strip()
+        primary_focus = state.get("primary_focus", "")
+        design_approach = state.get("design_approach", "")
+        if structured_output_enabled():
+            # One call for all three artifacts, validated locally; no silent fallback to empty opportunities
+            primary_focus, design_approach, opportunities, budget_report = await identify_opportunities_structured(
+                enhancement_prompt, ui_analysis, primary_focus, design_approach)
+            opportunities_json = json.dumps(opportunities)
+        else:
+            if not primary_focus or not design_approach:
+                # The parallel interpret_directive branch failed; make the calls here instead
+                primary_focus, design_approach = await determine_focus_and_design(enhancement_prompt)
 
-        # Step 3: Identify opportunities based on primary focus
-        refinement_prompt = f"""
-        You are a UI/UX expert analyzing a web application.
+            # Step 3: Identify opportunities based on primary focus
+            refinement_prompt, budget_report = fit_prompt("opportunities", lambda sections: f"""
+            You are a UI/UX expert analyzing a web application.
 
-        User's enhancement directive: "{enhancement_prompt}"
+            User's enhancement directive: "{enhancement_prompt}"
 
-        Primary focus area: {primary_focus}
+            Primary focus area: {primary_focus}
 
-        Proposed design approach: {design_approach}
+            Proposed design approach: {design_approach}
 
-        UI analysis:
-        {ui_analysis_json}
+            UI analysis:
+            {sections["ui_analysis"]}
 
-        Based on the UI analysis, identify specific enhancement opportunities focused solely on {primary_focus}.
-        All opportunities should align with the proposed design approach and enhance {primary_focus} consistently across the application.
-        Consider UI/UX best practices, but limit the scope to {primary_focus}.
+            Based on the UI analysis, identify specific enhancement opportunities focused solely on {primary_focus}.
+            All opportunities should align with the proposed design approach and enhance {primary_focus} consistently across the application.
+            Consider UI/UX best practices, but limit the scope to {primary_focus}.
 
-        For each category, list concrete, specific opportunities for improvement related to {primary_focus}.
-        Be creative but practical, considering the existing framework and libraries.
+            For each category, list concrete, specific opportunities for improvement related to {primary_focus}.
+            Be creative but practical, considering the existing framework and libraries.
 
-        Provide opportunities structured as JSON with these categories:
-        - visual_design: Visual improvements related to {primary_focus}
-        - animations: Animation enhancements (if related to {primary_focus})
-        - user_experience: UX enhancements tied to {primary_focus}
-        - prioritized_files: List of specific files to enhance, with clear reasons tied to {primary_focus}
-        """
+            Provide opportunities structured as JSON with these categories:
+            - visual_design: Visual improvements related to {primary_focus}
+            - animations: Animation enhancements (if related to {primary_focus})
+            - user_experience: UX enhancements tied to {primary_focus}
+            - prioritized_files: List of specific files to enhance, with clear reasons tied to {primary_focus}
+            """, {"ui_analysis": ui_analysis})
+            print(describe_budget(budget_report))
 
-        refinement_result = llm.invoke([HumanMessage(content=refinement_prompt)])
+            refinement_messages = [HumanMessage(content=refinement_prompt)]
+            refinement_result = await llm_for("opportunities").ainvoke(refinement_messages)
 
-        # Extract JSON from the response
-        import re
-        json_match = re.search(r'```json\n(.*?)\n```', refinement_result.content, re.DOTALL)
-        if json_match:
-            opportunities_json = json_match.group(1)
-        else:
-            try:
-                opportunities = json.loads(refinement_result.content)
-                opportunities_json = json.dumps(opportunities)
-            except:
-                opportunities_result = t.identify_enhancement_opportunities.invoke({
-                    "repo_dir": repo_dir,
-                    "ui_analysis_json": ui_analysis_json
-                })
-                opportunities_json = opportunities_result
+            # Extract JSON from the response
+            import re
+            json_match = re.search(r'```json\n(.*?)\n```', refinement_result.content, re.DOTALL)
+            if json_match:
+                opportunities_json = json_match.group(1)
+                try:
+                    json.loads(opportunities_json)
+                except ValueError:
+                    # Don't replay a malformed answer on the next run
+                    await discard_response(llm_for("opportunities"), refinement_messages)
+            else:
+                try:
+                    opportunities = json.loads(refinement_result.content)
+                    opportunities_json = json.dumps(opportunities)
+                except:
+                    await discard_response(llm_for("opportunities"), refinement_messages)
+                    opportunities_result = await t.identify_enhancement_opportunities.ainvoke({
+                        "repo_dir": repo_dir,
+                        "ui_analysis_json": ui_analysis_json
+                    })
+                    opportunities_json = opportunities_result
 
         try:
             enhancement_opportunities = json.loads(opportunities_json)
@@ -318,7 +532,8 @@ def identify_opportunities(state: State) -> State:
                 log_message,
                 f"Primary focus: {primary_focus}",
                 f"Design approach: {design_approach}",
-                f"Identified opportunities in categories: {', '.join(enhancement_opportunities.keys())}"
+                f"Identified opportunities in categories: {', '.join(enhancement_opportunities.keys())}",
+                describe_budget(budget_report)
             ]
 
             for category, opps in enhancement_opportunities.items():
@@ -335,6 +550,7 @@ def identify_opportunities(state: State) -> State:
                 "primary_focus": primary_focus,
                 "design_approach": design_approach,
                 "enhancement_opportunities": enhancement_opportunities,
+                "prompt_budgets": {**state.get("prompt_budgets", {}), "opportunities": budget_report},
                 "phase": Phase.GENERATE_PLAN,
                 "log": state.get("log", []) + log_messages
             }
@@ -361,7 +577,7 @@ def identify_opportunities(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def generate_plan(state: State) -> State:
+async def generate_plan(state: State) -> State:
     try:
         enhancement_prompt = state.get("enhancement_prompt", "")
         primary_focus = state.get("primary_focus", "")
@@ -369,7 +585,6 @@ def generate_plan(state: State) -> State:
         enhancement_opportunities = state.get("enhancement_opportunities", {})
         opportunities_json = json.dumps(enhancement_opportunities)
         ui_analysis = state.get("ui_analysis", {})
-        ui_analysis_json = json.dumps(ui_analysis)
         repo_dir = state.get("repo_dir", "")
 
         log_message = "Generating detailed enhancement plan..."
@@ -382,8 +597,10 @@ def generate_plan(state: State) -> State:
 
         existing_file_paths = [file_info["path"] for file_info in all_ui_files]
         print(f"Found {len(existing_file_paths)} UI files that exist in the repository")
+        # Files named in the opportunities go first, so they survive if the list is shortened to fit the budget
+        existing_file_paths.sort(key=lambda path: path not in opportunities_json)
 
-        plan_prompt = f"""
+        plan_prompt, budget_report = fit_prompt("plan", lambda sections: f"""
         You are a UI/UX expert creating an enhancement plan for a web application.
 
         User's directive: "{enhancement_prompt}"
@@ -393,13 +610,13 @@ def generate_plan(state: State) -> State:
         Proposed design approach: {design_approach}
 
         UI analysis:
-        {ui_analysis_json}
+        {sections["ui_analysis"]}
 
         Enhancement opportunities:
-        {opportunities_json}
+        {sections["opportunities"]}
 
         IMPORTANT: Here are the actual UI files that exist in the repository that you can modify:
-        {json.dumps(existing_file_paths, indent=2)}
+        {sections["file_paths"]}
 
         Create a detailed, actionable enhancement plan that:
         1. Has a clear title and description centered on enhancing {primary_focus}
@@ -419,21 +636,33 @@ def generate_plan(state: State) -> State:
         - description: Overall plan description emphasizing {primary_focus} and the design approach
         - changes: Array of high-level changes related to {primary_focus}
         - file_modifications: Array of specific file changes with details, all tied to {primary_focus}
-        """
+        """, {
+            "ui_analysis": ui_analysis,
+            "opportunities": enhancement_opportunities,
+            "file_paths": existing_file_paths
+        }, indents={"file_paths": 2})
+        print(describe_budget(budget_report))
 
-        plan_result = llm.invoke([HumanMessage(content=plan_prompt)])
+        plan_messages = [HumanMessage(content=plan_prompt)]
+        plan_result = await llm_for("plan").ainvoke(plan_messages)
 
         # Extract JSON from the response
         import re
         json_match = re.search(r'```json\n(.*?)\n```', plan_result.content, re.DOTALL)
         if json_match:
             plan_json = json_match.group(1)
+            try:
+                json.loads(plan_json)
+            except ValueError:
+                # Don't replay a malformed plan on the next run
+                await discard_response(llm_for("plan"), plan_messages)
         else:
             try:
                 plan = json.loads(plan_result.content)
                 plan_json = json.dumps(plan)
             except:
-                plan_json = t.generate_enhancement_plan.invoke({
+                await discard_response(llm_for("plan"), plan_messages)
+                plan_json = await t.generate_enhancement_plan.ainvoke({
                     "opportunities_json": opportunities_json
                 })
 
@@ -458,7 +687,8 @@ def generate_plan(state: State) -> State:
                 log_message,
                 f"Plan generated: {enhancement_plan.get('title', 'UI Enhancement Plan')}",
                 f"Changes planned: {len(enhancement_plan.get('changes', []))}",
-                f"Files to modify: {len(files_to_enhance)} (after verification)"
+                f"Files to modify: {len(files_to_enhance)} (after verification)",
+                describe_budget(budget_report)
             ]
 
             print("\n".join(log_messages))
@@ -469,6 +699,7 @@ def generate_plan(state: State) -> State:
                 "files_to_enhance": files_to_enhance,
                 "current_file_index": 0,
                 "enhanced_files": [],
+                "prompt_budgets": {**state.get("prompt_budgets", {}), "plan": budget_report},
                 "phase": Phase.IMPLEMENT_ENHANCEMENTS if files_to_enhance else Phase.SUMMARIZE,
                 "log": state.get("log", []) + log_messages
             }
@@ -495,194 +726,630 @@ def generate_plan(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def implement_enhancements(state: State) -> State:
-    try:
-        repo_dir = state.get("repo_dir", "")
-        files_to_enhance = state.get("files_to_enhance", [])
-        current_index = state.get("current_file_index", 0)
-        enhanced_files = state.get("enhanced_files", [])
-        ui_analysis = state.get("ui_analysis", {})
+def get_enhancement_concurrency() -> int:
+    """Batches run at once; with the adaptive limiter on, it sets the pace and this only caps it."""
+    default = int(get_limiter_config()["max_limit"]) if llm_limiter_enabled() else 4
+    return max(1, int(os.getenv('ENHANCEMENT_CONCURRENCY', str(default))))
 
-        if current_index >= len(files_to_enhance):
-            log_message = f"All {len(enhanced_files)} files enhanced successfully"
-            print(log_message)
-            updated_state = {
-                **state,
-                "phase": Phase.VERIFY_CHANGES,
-                "log": state.get("log", []) + [log_message]
-            }
-            return ensure_complete_state(updated_state)
 
-        file_info = files_to_enhance[current_index]
-        file_path = file_info["path"]
-        enhancement_type = file_info["enhancement_type"]
-        planned_changes = file_info["changes"]
+def get_enhancement_edit_mode() -> str:
+    """"edits" asks for search/replace blocks and falls back to the full file; "full" always asks for the full file."""
+    return os.getenv('ENHANCEMENT_EDIT_MODE', 'edits').lower()
 
-        log_message = f"Enhancing file {current_index + 1}/{len(files_to_enhance)}: {file_path}"
-        print(log_message)
 
-        try:
-            full_path = os.path.join(repo_dir, file_path)
-            if not os.path.exists(full_path):
-                error_message = f"File {file_path} does not exist - skipping"
-                print(error_message)
-                updated_state = {
-                    **state,
-                    "current_file_index": current_index + 1,
-                    "log": state.get("log", []) + [log_message, error_message]
-                }
-                return ensure_complete_state(updated_state)
+def get_region_min_lines() -> int:
+    """Files with at least this many lines send only the regions the plan touches; 0 disables region mode."""
+    return int(os.getenv('ENHANCEMENT_REGION_MIN_LINES', '300'))
 
-            original_content = t.get_file_content.invoke({
-                "repo_dir": repo_dir,
-                "relative_path": file_path
-            })
-
-            if original_content.startswith("Error reading file"):
-                error_message = f"Failed to read {file_path}: {original_content}"
-                print(error_message)
-                updated_state = {
-                    **state,
-                    "current_file_index": current_index + 1,
-                    "log": state.get("log", []) + [log_message, error_message]
-                }
-                return ensure_complete_state(updated_state)
 
-            framework_info = f"Framework: {', '.join(ui_analysis.get('framework', {}).get('detected', ['Unknown']))}"
-            libraries_info = f"UI Libraries: {', '.join(ui_analysis.get('ui_libraries', {}).get('detected', ['None detected']))}"
+def get_region_max_fraction() -> float:
+    return float(os.getenv('ENHANCEMENT_REGION_MAX_FRACTION', '0.6'))
 
-            enhancement_prompt = f"""
-            You are a UI/UX expert enhancing a React and Astro web application file.
 
-            {framework_info}
-            {libraries_info}
+def enhancement_streaming_enabled() -> bool:
+    return os.getenv('ENHANCEMENT_STREAMING', 'true').lower() == 'true'
 
-            File path: {file_path}
 
-            Original file content:
-            ```
-            {original_content}
-            ```
+def get_enhancement_stream_retries() -> int:
+    return max(0, int(os.getenv('ENHANCEMENT_STREAM_RETRIES', '1')))
 
-            Enhancement type: {enhancement_type}
 
-            Planned changes:
-            {planned_changes}
+def get_enhancement_spool_bytes() -> int:
+    """Generated content larger than this is spooled to a temporary file instead of kept in memory."""
+    return int(os.getenv('ENHANCEMENT_SPOOL_BYTES', str(1024 * 1024)))
 
-            Create an enhanced version of this file that:
-            1. Implements the planned changes
-            2. Maintains all original functionality
-            3. Uses best practices for the file type
-            4. Makes visually noticeable improvements
-            5. PRESERVES all important original code structures and functionality
 
-            Return ONLY the complete enhanced file content without any explanation.
-            Do not include markdown code blocks or any explanatory text - your output will be directly written to the file.
-            """
-            file_ext = os.path.splitext(file_path)[1].lower()
-
-            if file_ext == '.astro':
-                enhancement_prompt += """
-                IMPORTANT CONSTRAINTS FOR ASTRO FILES:
-                1. DO NOT add client:load or ANY client hydration directives
-                2. ONLY modify the <style> section for visual improvements
-                3. Keep all frontmatter (between --- tags) unchanged
-                4. Use vanilla <script> tags for minimal interactivity
-                5. TEST YOUR SYNTAX - ensure all tags and braces match
-                """
-            elif file_ext == '.js':
-                enhancement_prompt += """
-                IMPORTANT CONSTRAINTS FOR JAVASCRIPT:
-                1. Ensure all parentheses in if-statements are balanced - if (condition) { ... }
-                2. Double-check all bracket pairs {} [] ()
-                3. All if/for/while statements must have complete syntax
-                4. DO NOT change core function signatures or exports
-                5. Focus on readability and performance improvements only
-                """
-
-            enhancement_result = llm.invoke([HumanMessage(content=enhancement_prompt)])
-            enhanced_content = enhancement_result.content
+async def stream_file_content(prompt: str, file_path: str) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """
+    Stream a full-file generation, stripping the code fence and validating structure as tokens arrive.
 
-            import re
-            code_block_match = re.search(r'```(?:\w+)?\n(.*?)\n```', enhanced_content, re.DOTALL)
-            if code_block_match:
-                enhanced_content = code_block_match.group(1)
-                print(f"Extracted code from markdown code block")
+    A generation whose brackets can no longer balance is aborted on the spot and retried
+    with the error pointed out, instead of being written and then reverted by modify_ui_file.
 
-            print(f"Enhanced content type: {type(enhanced_content)}, length: {len(enhanced_content)}")
-            print(f"First 50 chars of enhanced content: {enhanced_content[:50]}")
+    Returns:
+        (content, None) or (None, temporary file path) for large content, or (None, None) when every
+        attempt failed, followed by the log messages.
+    """
+    log = []
+    request = prompt
+    for attempt in range(get_enhancement_stream_retries() + 1):
+        stripper = t.FenceStripper()
+        validator = t.IncrementalStructureValidator(file_path)
+        spool = t.ContentSpool(get_enhancement_spool_bytes(), suffix=os.path.splitext(file_path)[1])
+        # The response is cached only once it has passed validation below
+        stream = open_stream(llm_for("implement"), [HumanMessage(content=request)])
+        received = 0
+        try:
+            async for chunk in stream:
+                if not isinstance(chunk.content, str):
+                    continue
+                received += len(chunk.content)
+                text = stripper.feed(chunk.content)
+                validator.feed(text)
+                spool.write(text)
+            text = stripper.finish()
+            validator.feed(text)
+            spool.write(text)
+            error = validator.finish()
+            if error:
+                raise t.StreamAborted(error)
+            content, content_file = spool.finish()
+            await stream.commit()
+            return content, content_file, log
+        except t.StreamAborted as e:
+            spool.discard()
+            await stream.discard()
+            abort_message = f"Generation for {file_path} aborted after {received} characters (attempt {attempt + 1}): {e}"
+            print(abort_message)
+            log.append(abort_message)
+            request = prompt + f"""
+        A previous attempt was rejected: {e}.
+        Make sure every bracket you open is closed in the right order.
+        """
+        except BaseException:
+            # A failed request, an unexpected error or cancellation: keep nothing of this attempt
+            spool.discard()
+            await stream.discard()
+            raise
+        finally:
+            # Stops the underlying request when the stream was abandoned early
+            await stream.aclose()
+    return None, None, log
+
+
+async def enhance_file(repo_dir: str, file_info: Dict[str, Any], ui_analysis: Dict[str, Any],
+                       position: int, total: int) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Enhance one planned file with the LLM and write the result.
+
+    Returns:
+        (enhanced_files record, or None if the file was skipped, and the log messages for it)
+    """
+    file_path = file_info["path"]
+    enhancement_type = file_info["enhancement_type"]
+    planned_changes = file_info["changes"]
+
+    log_message = f"Enhancing file {position}/{total}: {file_path}"
+    print(log_message)
 
-            modification_result = t.modify_ui_file.invoke({
-                "repo_dir": repo_dir,
-                "file_path": file_path,
-                "enhancement_type": enhancement_type,
-                "enhanced_content": enhanced_content
-            })
+    try:
+        full_path = os.path.join(repo_dir, file_path)
+        if not os.path.exists(full_path):
+            error_message = f"File {file_path} does not exist - skipping"
+            print(error_message)
+            return None, [log_message, error_message]
 
-            try:
-                modification_data = json.loads(modification_result)
-                success = modification_data.get("success", False)
+        original_content = await t.get_file_content.ainvoke({
+            "repo_dir": repo_dir,
+            "relative_path": file_path
+        })
 
-                if success:
-                    print(f"Successfully enhanced {file_path}")
-                    enhanced_files.append({
-                        "path": file_path,
-                        "enhancement_type": enhancement_type,
-                        "success": True
-                    })
-                else:
-                    error = modification_data.get("error", "Unknown error")
-                    print(f"Failed to enhance {file_path}: {error}")
-                    enhanced_files.append({
+        if original_content.startswith("Error reading file"):
+            error_message = f"Failed to read {file_path}: {original_content}"
+            print(error_message)
+            return None, [log_message, error_message]
+
+        framework_info = f"Framework: {', '.join(ui_analysis.get('framework', {}).get('detected', ['Unknown']))}"
+        libraries_info = f"UI Libraries: {', '.join(ui_analysis.get('ui_libraries', {}).get('detected', ['None detected']))}"
+
+        file_context = f"""
+        You are a UI/UX expert enhancing a React and Astro web application file.
+
+        {framework_info}
+        {libraries_info}
+
+        File path: {file_path}
+
+        Original file content:
+        ```
+        {original_content}
+        ```
+
+        Enhancement type: {enhancement_type}
+
+        Planned changes:
+        {planned_changes}
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+
+        file_constraints = ""
+        if file_ext == '.astro':
+            file_constraints = """
+            IMPORTANT CONSTRAINTS FOR ASTRO FILES:
+            1. DO NOT add client:load or ANY client hydration directives
+            2. ONLY modify the <style> section for visual improvements
+            3. Keep all frontmatter (between --- tags) unchanged
+            4. Use vanilla <script> tags for minimal interactivity
+            5. TEST YOUR SYNTAX - ensure all tags and braces match
+            """
+        elif file_ext == '.js':
+            file_constraints = """
+            IMPORTANT CONSTRAINTS FOR JAVASCRIPT:
+            1. Ensure all parentheses in if-statements are balanced - if (condition) { ... }
+            2. Double-check all bracket pairs {} [] ()
+            3. All if/for/while statements must have complete syntax
+            4. DO NOT change core function signatures or exports
+            5. Focus on readability and performance improvements only
+            """
+
+        enhanced_content = None
+        enhanced_content_file = None
+        # Set when the file comes from a non-streaming full-file call, whose response is dropped if it fails validation
+        full_file_messages = None
+        log = [log_message]
+
+        region_min_lines = get_region_min_lines()
+        selected_regions = None
+        if region_min_lines and original_content.count("\n") + 1 >= region_min_lines:
+            regions = t.split_regions(original_content, file_ext)
+            selected_regions = t.select_regions(regions, planned_changes, get_region_max_fraction())
+        if selected_regions:
+            # Large file with a targeted plan: send only the matching regions plus an outline of the rest
+            region_prompt = f"""
+        You are a UI/UX expert enhancing part of a large React and Astro web application file.
+
+        {framework_info}
+        {libraries_info}
+
+        File path: {file_path}
+
+        The file has {original_content.count(chr(10)) + 1} lines. Only the regions relevant to the planned changes
+        are shown. Outline of the whole file:
+        {t.format_outline(original_content, regions, selected_regions)}
+
+        Regions to enhance:
+        {t.format_regions(original_content, selected_regions)}
+
+        Enhancement type: {enhancement_type}
+
+        Planned changes:
+        {planned_changes}
+
+        Enhance the regions so that they:
+        1. Implement the planned changes
+        2. Maintain all original functionality
+        3. Use best practices for the file type
+        4. Make visually noticeable improvements
+        5. PRESERVE all important original code structures and functionality
+        """ + t.REGION_FORMAT_INSTRUCTIONS + file_constraints
+            region_messages = [HumanMessage(content=region_prompt)]
+            region_result = await llm_for("implement").ainvoke(region_messages)
+            enhanced_content, region_summary = t.try_splice_regions(original_content, selected_regions,
+                                                                    region_result.content)
+            if enhanced_content is not None:
+                region_message = f"Region mode for {file_path}: {region_summary} of {len(regions)}"
+            else:
+                await discard_response(llm_for("implement"), region_messages)
+                region_message = f"Region mode for {file_path} failed ({region_summary}) - using the whole file"
+            print(region_message)
+            log.append(region_message)
+
+        if enhanced_content is None and get_enhancement_edit_mode() == 'edits':
+            # Ask only for the changed regions; the model then emits a fraction of the file
+            edit_prompt = file_context + """
+        Make changes that:
+        1. Implement the planned changes
+        2. Maintain all original functionality
+        3. Use best practices for the file type
+        4. Make visually noticeable improvements
+        5. PRESERVE all important original code structures and functionality
+        """ + t.EDIT_FORMAT_INSTRUCTIONS + file_constraints
+            edit_messages = [HumanMessage(content=edit_prompt)]
+            edit_result = await llm_for("implement").ainvoke(edit_messages)
+            enhanced_content, edit_summary = t.try_apply_edits(original_content, edit_result.content)
+            if enhanced_content is not None:
+                print(f"Edits for {file_path}: {edit_summary}")
+            else:
+                await discard_response(llm_for("implement"), edit_messages)
+                fallback_message = f"Edits for {file_path} could not be applied ({edit_summary}) - requesting the full file"
+                print(fallback_message)
+                log.append(fallback_message)
+
+        if enhanced_content is None:
+            enhancement_prompt = file_context + """
+        Create an enhanced version of this file that:
+        1. Implements the planned changes
+        2. Maintains all original functionality
+        3. Uses best practices for the file type
+        4. Makes visually noticeable improvements
+        5. PRESERVES all important original code structures and functionality
+
+        Return ONLY the complete enhanced file content without any explanation.
+        Do not include markdown code blocks or any explanatory text - your output will be directly written to the file.
+        """ + file_constraints
+
+            if enhancement_streaming_enabled():
+                enhanced_content, enhanced_content_file, stream_log = await stream_file_content(
+                    enhancement_prompt, file_path)
+                log.extend(stream_log)
+                if enhanced_content is None and enhanced_content_file is None:
+                    error = "Every generation attempt was structurally invalid"
+                    log.append(f"Failed to enhance {file_path}: {error}")
+                    return {
                         "path": file_path,
                         "enhancement_type": enhancement_type,
                         "success": False,
                         "error": error
-                    })
+                    }, log
+            else:
+                full_file_messages = [HumanMessage(content=enhancement_prompt)]
+                enhancement_result = await llm_for("implement").ainvoke(full_file_messages)
+                enhanced_content = enhancement_result.content
+
+                import re
+                code_block_match = re.search(r'```(?:\w+)?\n(.*?)\n```', enhanced_content, re.DOTALL)
+                if code_block_match:
+                    enhanced_content = code_block_match.group(1)
+                    print(f"Extracted code from markdown code block")
+
+        if enhanced_content_file:
+            print(f"Enhanced content spooled to {enhanced_content_file} ({os.path.getsize(enhanced_content_file)} bytes)")
+        else:
+            print(f"Enhanced content type: {type(enhanced_content)}, length: {len(enhanced_content)}")
+            print(f"First 50 chars of enhanced content: {enhanced_content[:50]}")
+
+        try:
+            modification_args = {
+                "repo_dir": repo_dir,
+                "file_path": file_path,
+                "enhancement_type": enhancement_type
+            }
+            if enhanced_content_file:
+                modification_args["enhanced_content_file"] = enhanced_content_file
+            else:
+                modification_args["enhanced_content"] = enhanced_content
+            modification_result = await t.modify_ui_file.ainvoke(modification_args)
+        finally:
+            if enhanced_content_file and os.path.exists(enhanced_content_file):
+                os.remove(enhanced_content_file)
 
-                updated_state = {
-                    **state,
-                    "current_file_index": current_index + 1,
-                    "enhanced_files": enhanced_files,
-                    "phase": Phase.IMPLEMENT_ENHANCEMENTS,
-                    "log": state.get("log", []) + [log_message,
-                                                   f"{'Successfully enhanced' if success else 'Failed to enhance'} {file_path}"]
+        try:
+            modification_data = json.loads(modification_result)
+            success = modification_data.get("success", False)
+
+            if success:
+                print(f"Successfully enhanced {file_path}")
+                record = {
+                    "path": file_path,
+                    "enhancement_type": enhancement_type,
+                    "success": True
                 }
-                return ensure_complete_state(updated_state)
-            except Exception as e:
-                log_messages = [log_message, f"Error processing modification result: {e}"]
-                print("\n".join(log_messages))
-                updated_state = {
-                    **state,
-                    "current_file_index": current_index + 1,
-                    "enhanced_files": enhanced_files,
-                    "phase": Phase.IMPLEMENT_ENHANCEMENTS,
-                    "log": state.get("log", []) + log_messages
+            else:
+                error = modification_data.get("error", "Unknown error")
+                print(f"Failed to enhance {file_path}: {error}")
+                if full_file_messages:
+                    await discard_response(llm_for("implement"), full_file_messages)
+                record = {
+                    "path": file_path,
+                    "enhancement_type": enhancement_type,
+                    "success": False,
+                    "error": error
                 }
-                return ensure_complete_state(updated_state)
+            return record, log + [f"{'Successfully enhanced' if success else 'Failed to enhance'} {file_path}"]
         except Exception as e:
-            log_messages = [log_message, f"Error enhancing file {file_path}: {e}"]
+            log_messages = [log_message, f"Error processing modification result: {e}"]
             print("\n".join(log_messages))
-            updated_state = {
-                **state,
-                "current_file_index": current_index + 1,
-                "enhanced_files": enhanced_files,
-                "phase": Phase.IMPLEMENT_ENHANCEMENTS,
-                "log": state.get("log", []) + log_messages
-            }
-            return ensure_complete_state(updated_state)
+            return None, log_messages
+    except Exception as e:
+        log_messages = [log_message, f"Error enhancing file {file_path}: {e}"]
+        print("\n".join(log_messages))
+        return None, log_messages
+
+
+def get_enhancement_batch_size() -> int:
+    return max(1, int(os.getenv('ENHANCEMENT_BATCH_SIZE', '5')))
+
+
+def get_checkpoint_ttl() -> float:
+    return float(os.getenv('ENHANCEMENT_CHECKPOINT_TTL_S', str(7 * 24 * 3600)))
+
+
+class ImplementState(TypedDict, total=False):
+    repo_dir: str
+    files_to_enhance: List[Dict[str, Any]]
+    ui_analysis: Dict[str, Any]
+    checkpoint_dir: str
+    # Batches still to run, as {"batch_id", "indexes"}
+    batches: List[Dict[str, Any]]
+    completed: List[Dict[str, Any]]
+    # Written concurrently by the batch workers, so merged by concatenation
+    batch_results: Annotated[List[Dict[str, Any]], operator.add]
+    results: List[Dict[str, Any]]
+
+
+class BatchTask(TypedDict):
+    repo_dir: str
+    files_to_enhance: List[Dict[str, Any]]
+    ui_analysis: Dict[str, Any]
+    checkpoint_dir: str
+    batch_id: int
+    indexes: List[int]
+
+
+def batch_checkpoint_dir(repo_dir: str, files_to_enhance: List[Dict[str, Any]]) -> str:
+    """Checkpoint directory for one plan; a changed plan gets a fresh directory."""
+    plan_key = hashlib.sha1(json.dumps([os.path.abspath(repo_dir), files_to_enhance],
+                                       sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_cache_dir(), "enhancement_batches", plan_key)
+
+
+def prune_batch_checkpoints(max_age_s: float) -> int:
+    """
+    Delete the checkpoint directories of runs that never finished and were last written more than
+    max_age_s seconds ago.
+
+    Returns:
+        Number of directories deleted.
+    """
+    root = os.path.join(get_cache_dir(), "enhancement_batches")
+    if max_age_s <= 0 or not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age_s
+    pruned = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            entries = [os.path.join(path, entry) for entry in os.listdir(path)]
+            last_write = max([os.path.getmtime(path)] + [os.path.getmtime(entry) for entry in entries])
+        except OSError:
+            continue
+        if last_write < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            pruned += 1
+    return pruned
+
+
+def file_digest(path: str) -> Optional[str]:
+    """sha1 of a file's bytes, or None if it cannot be read."""
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def checkpoint_matches_disk(repo_dir: str, files_to_enhance: List[Dict[str, Any]], batch: Dict[str, Any]) -> bool:
+    """Whether every file of a checkpointed batch still has the content the batch left it with."""
+    for result in batch["results"]:
+        expected = result.get("content_hash")
+        if expected is None or not 0 <= result["index"] < len(files_to_enhance):
+            return False
+        if file_digest(os.path.join(repo_dir, files_to_enhance[result["index"]]["path"])) != expected:
+            return False
+    return True
+
+
+def load_batch_checkpoints(checkpoint_dir: str) -> List[Dict[str, Any]]:
+    """Load the results of every batch completed under checkpoint_dir."""
+    completed = []
+    if not os.path.isdir(checkpoint_dir):
+        return completed
+    for name in sorted(os.listdir(checkpoint_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(checkpoint_dir, name), 'r', encoding='utf-8') as f:
+                completed.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable batch checkpoint {name}: {e}")
+    return completed
+
+
+def write_batch_checkpoint(checkpoint_dir: str, batch: Dict[str, Any]) -> None:
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(checkpoint_dir, f"batch-{batch['batch_id']:05d}.json")
+    with open(checkpoint_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(batch, f)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def plan_batches(state: ImplementState) -> ImplementState:
+    """Split the plan entries not covered by an earlier run's checkpoints into batches."""
+    files_to_enhance = state["files_to_enhance"]
+    concurrency = get_enhancement_concurrency()
+
+    # A checkpoint covers the plan indexes in its results, whatever batch settings produced it, so
+    # resuming under a different concurrency or batch size re-runs exactly the uncovered entries.
+    # Batches whose files changed since (e.g. the target was re-cloned) are run again.
+    completed = []
+    covered = set()
+    stale = 0
+    checkpoints = load_batch_checkpoints(state["checkpoint_dir"])
+    for batch in checkpoints:
+        indexes = {result["index"] for result in batch["results"]}
+        if not indexes or indexes & covered or not all(0 <= index < len(files_to_enhance) for index in indexes):
+            continue
+        if not checkpoint_matches_disk(state["repo_dir"], files_to_enhance, batch):
+            stale += 1
+            continue
+        completed.append(batch)
+        covered |= indexes
+    if stale:
+        print(f"Re-running {stale} checkpointed batches whose files changed on disk")
+
+    # Entries for the same path share a batch and run in plan order, so writes to a file never race
+    indexes_by_path = {}
+    for index, file_info in enumerate(files_to_enhance):
+        if index not in covered:
+            indexes_by_path.setdefault(file_info["path"], []).append(index)
+    remaining = sum(len(indexes) for indexes in indexes_by_path.values())
+
+    # Small plans use smaller batches so every concurrency slot gets work
+    batch_size = min(get_enhancement_batch_size(), max(1, -(-remaining // concurrency)))
+    batches = []
+    current = []
+    for indexes in indexes_by_path.values():
+        current.extend(indexes)
+        if len(current) >= batch_size:
+            batches.append(current)
+            current = []
+    if current:
+        batches.append(current)
+
+    if completed:
+        print(f"Resuming enhancement: {len(covered)}/{len(files_to_enhance)} files already checkpointed "
+              f"in {len(completed)} batches")
+    # New batch ids continue after the checkpointed ones so their checkpoint files never collide
+    first_id = max((batch["batch_id"] for batch in checkpoints), default=-1) + 1
+    return {"batches": [{"batch_id": first_id + offset, "indexes": indexes} for offset, indexes in enumerate(batches)],
+            "completed": completed}
+
+
+def dispatch_batches(state: ImplementState) -> List[Any]:
+    from langgraph.types import Send
+
+    sends = [Send("enhance_batch", {
+        "repo_dir": state["repo_dir"],
+        "files_to_enhance": state["files_to_enhance"],
+        "ui_analysis": state["ui_analysis"],
+        "checkpoint_dir": state["checkpoint_dir"],
+        "batch_id": batch["batch_id"],
+        "indexes": batch["indexes"]
+    }) for batch in state["batches"]]
+    return sends or "reduce_batches"
+
+
+async def enhance_batch(task: BatchTask) -> ImplementState:
+    """Map step: enhance one batch of files in order, then checkpoint its results."""
+    total = len(task["files_to_enhance"])
+    results = []
+    for index in task["indexes"]:
+        record, file_log = await enhance_file(task["repo_dir"], task["files_to_enhance"][index], task["ui_analysis"],
+                                              index + 1, total)
+        results.append({"index": index, "record": record, "log": file_log})
+
+    # Hashed once the batch is done: entries for one path all run in this batch, and a resumed run
+    # trusts the checkpoint only while the file still has this content
+    digests = {}
+    for result in results:
+        path = task["files_to_enhance"][result["index"]]["path"]
+        if path not in digests:
+            digests[path] = await asyncio.to_thread(file_digest, os.path.join(task["repo_dir"], path))
+        result["content_hash"] = digests[path]
+    batch = {"batch_id": task["batch_id"], "results": results}
+    await asyncio.to_thread(write_batch_checkpoint, task["checkpoint_dir"], batch)
+    return {"batch_results": [batch]}
+
+
+def reduce_batches(state: ImplementState) -> ImplementState:
+    """Reduce step: merge checkpointed and fresh batch results back into plan order."""
+    results = [result for batch in state.get("completed", []) + state.get("batch_results", [])
+               for result in batch["results"]]
+    results.sort(key=lambda result: result["index"])
+    return {"results": results}
+
+
+def get_implement_graph() -> Any:
+    """
+    Constant-depth subgraph: plan -> one superstep of batch workers -> reduce, whatever the number
+    of files. Compiled on first use.
+    """
+    global _implement_graph
+    if _implement_graph is None:
+        from langgraph.graph import StateGraph, START, END
+
+        implement_workflow = StateGraph(ImplementState)
+        implement_workflow.add_node("plan_batches", plan_batches)
+        implement_workflow.add_node("enhance_batch", enhance_batch)
+        implement_workflow.add_node("reduce_batches", reduce_batches)
+        implement_workflow.add_edge(START, "plan_batches")
+        implement_workflow.add_conditional_edges("plan_batches", dispatch_batches, ["enhance_batch", "reduce_batches"])
+        implement_workflow.add_edge("enhance_batch", "reduce_batches")
+        implement_workflow.add_edge("reduce_batches", END)
+        _implement_graph = implement_workflow.compile()
+    return _implement_graph
+
+
+async def implement_enhancements(state: State) -> State:
+    checkpoint_dir = None
+    enhanced_files = list(state.get("enhanced_files", []))
+    try:
+        repo_dir = state.get("repo_dir", "")
+        files_to_enhance = state.get("files_to_enhance", [])
+        current_index = state.get("current_file_index", 0)
+        ui_analysis = state.get("ui_analysis", {})
+
+        remaining = files_to_enhance[current_index:]
+        concurrency = get_enhancement_concurrency()
+        log_messages = []
+        if remaining:
+            print(f"Enhancing {len(remaining)} files with concurrency {concurrency}")
+            checkpoint_dir = batch_checkpoint_dir(repo_dir, remaining)
+            pruned = await asyncio.to_thread(prune_batch_checkpoints, get_checkpoint_ttl())
+            if pruned:
+                print(f"Deleted {pruned} expired enhancement checkpoints")
+            implement_result = await get_implement_graph().ainvoke({
+                "repo_dir": repo_dir,
+                "files_to_enhance": remaining,
+                "ui_analysis": ui_analysis,
+                "checkpoint_dir": checkpoint_dir
+            }, config={"max_concurrency": concurrency})
+
+            for result in implement_result["results"]:
+                if result["record"] is not None:
+                    enhanced_files.append(result["record"])
+                log_messages.extend(result["log"])
+            # Every batch made it into the results, so the checkpoints are no longer needed
+            await asyncio.to_thread(shutil.rmtree, checkpoint_dir, True)
+
+        llm_limiter = get_llm_shared()["limiter"]
+        if llm_limiter is not None:
+            limiter_stats = llm_limiter.stats()
+            log_messages.append(f"LLM concurrency limit {limiter_stats['limit']} (peak queue depth "
+                                f"{limiter_stats['max_queue_depth']}, {limiter_stats['rate_limited']} rate-limited)")
+
+        log_message = f"All {len(enhanced_files)} files enhanced successfully"
+        print(log_message)
+        updated_state = {
+            **state,
+            "current_file_index": len(files_to_enhance),
+            "enhanced_files": enhanced_files,
+            "phase": Phase.VERIFY_CHANGES,
+            "log": state.get("log", []) + log_messages + [log_message]
+        }
+        return ensure_complete_state(updated_state)
     except Exception as e:
         error_message = f"Error in implement_enhancements: {e}"
         print(error_message)
+        # Batches that finished before the failure are checkpointed; report them and resume from them next run
+        if checkpoint_dir:
+            for batch in load_batch_checkpoints(checkpoint_dir):
+                if not checkpoint_matches_disk(repo_dir, remaining, batch):
+                    continue
+                enhanced_files.extend(result["record"] for result in batch["results"] if result["record"] is not None)
         updated_state = {
             **state,
+            "enhanced_files": enhanced_files,
             "phase": Phase.VERIFY_CHANGES,
             "log": state.get("log", []) + [error_message]
         }
         return ensure_complete_state(updated_state)
 
 
-def verify_changes(state: State) -> State:
+async def verify_changes(state: State) -> State:
     try:
         repo_dir = state.get("repo_dir", "")
         enhanced_files = state.get("enhanced_files", [])
@@ -701,7 +1368,7 @@ def verify_changes(state: State) -> State:
         print(log_message)
 
         modified_files_json = json.dumps({"files": enhanced_files})
-        verification_result = t.verify_ui_changes.invoke({
+        verification_result = await t.verify_ui_changes.ainvoke({
             "repo_dir": repo_dir,
             "modified_files_json": modified_files_json
         })
@@ -721,7 +1388,7 @@ def verify_changes(state: State) -> State:
                 files_to_revert = [issue["file"] for issue in issues if
                                    "syntax error" in issue.get("issue", "").lower()]
                 if files_to_revert:
-                    revert_result = t.revert_ui_changes.invoke({
+                    revert_result = await t.revert_ui_changes.ainvoke({
                         "repo_dir": repo_dir,
                         "files_to_revert": files_to_revert
                     })
@@ -761,7 +1428,7 @@ def verify_changes(state: State) -> State:
         return ensure_complete_state(updated_state)
 
 
-def create_summary(state: State) -> State:
+async def create_summary(state: State) -> State:
     try:
         enhanced_files = state.get("enhanced_files", [])
         enhancement_plan = state.get("enhancement_plan", {})
@@ -771,16 +1438,16 @@ def create_summary(state: State) -> State:
         log_message = "Creating enhancement summary..."
         print(log_message)
 
-        summary_prompt = f"""
+        summary_prompt, budget_report = fit_prompt("summary", lambda sections: f"""
         You are a UI/UX expert who has just completed enhancements to a web application.
 
         Original enhancement directive: "{enhancement_prompt}"
 
-        Enhancement plan: {json.dumps(enhancement_plan, indent=2)}
+        Enhancement plan: {sections["plan"]}
 
-        Enhanced files: {json.dumps(enhanced_files, indent=2)}
+        Enhanced files: {sections["enhanced_files"]}
 
-        Verification results: {json.dumps(verification_result, indent=2)}
+        Verification results: {sections["verification"]}
 
         Create a comprehensive, well-formatted summary of the enhancements that:
         1. Explains what was accomplished
@@ -789,9 +1456,14 @@ def create_summary(state: State) -> State:
         4. Notes any issues that were encountered
 
         Make the summary conversational and engaging, focusing on the value delivered.
-        """
-
-        summary_result = llm.invoke([HumanMessage(content=summary_prompt)])
+        """, {
+            "plan": enhancement_plan,
+            "enhanced_files": enhanced_files,
+            "verification": verification_result
+        }, indents={"plan": 2, "enhanced_files": 2, "verification": 2})
+        print(describe_budget(budget_report))
+
+        summary_result = await llm_for("summary").ainvoke([HumanMessage(content=summary_prompt)])
         summary = summary_result.content
 
         print(f"Summary generated successfully")
@@ -799,8 +1471,9 @@ def create_summary(state: State) -> State:
         updated_state = {
             **state,
             "summary": summary,
+            "prompt_budgets": {**state.get("prompt_budgets", {}), "summary": budget_report},
             "phase": Phase.COMPLETE,
-            "log": state.get("log", []) + [log_message, "Summary generated successfully"]
+            "log": state.get("log", []) + [log_message, "Summary generated successfully", describe_budget(budget_report)]
         }
         return ensure_complete_state(updated_state)
     except Exception as e:
@@ -826,71 +1499,93 @@ def get_next_step(state: State) -> str:
     return state.get("phase", Phase.COMPLETE)
 
 
-workflow = StateGraph(State)
-
-workflow.add_node(Phase.CLONE_REPO, clone_repository)
-workflow.add_node(Phase.SCAN_UI_FILES, scan_ui_files)
-workflow.add_node(Phase.ANALYZE_UI, analyze_ui)
-workflow.add_node(Phase.IDENTIFY_OPPORTUNITIES, identify_opportunities)
-workflow.add_node(Phase.GENERATE_PLAN, generate_plan)
-workflow.add_node(Phase.IMPLEMENT_ENHANCEMENTS, implement_enhancements)
-workflow.add_node(Phase.VERIFY_CHANGES, verify_changes)
-workflow.add_node(Phase.SUMMARIZE, create_summary)
-
-workflow.add_conditional_edges(
-    Phase.CLONE_REPO,
-    get_next_step,
-    {Phase.SCAN_UI_FILES: Phase.SCAN_UI_FILES, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.SCAN_UI_FILES,
-    get_next_step,
-    {Phase.ANALYZE_UI: Phase.ANALYZE_UI, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.ANALYZE_UI,
-    get_next_step,
-    {Phase.IDENTIFY_OPPORTUNITIES: Phase.IDENTIFY_OPPORTUNITIES, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.IDENTIFY_OPPORTUNITIES,
-    get_next_step,
-    {Phase.GENERATE_PLAN: Phase.GENERATE_PLAN, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.GENERATE_PLAN,
-    get_next_step,
-    {Phase.IMPLEMENT_ENHANCEMENTS: Phase.IMPLEMENT_ENHANCEMENTS, Phase.SUMMARIZE: Phase.SUMMARIZE, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.IMPLEMENT_ENHANCEMENTS,
-    get_next_step,
-    {Phase.IMPLEMENT_ENHANCEMENTS: Phase.IMPLEMENT_ENHANCEMENTS, Phase.VERIFY_CHANGES: Phase.VERIFY_CHANGES,
-     Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.VERIFY_CHANGES,
-    get_next_step,
-    {Phase.SUMMARIZE: Phase.SUMMARIZE, Phase.COMPLETE: END}
-)
-
-workflow.add_conditional_edges(
-    Phase.SUMMARIZE,
-    get_next_step,
-    {Phase.COMPLETE: END}
-)
-
-workflow.set_entry_point(Phase.CLONE_REPO)
-agent = workflow.compile()
-
-
-def enhance_ui(repo_url: str, enhancement_prompt: str = "Enhance the UI") -> Dict[str, Any]:
+def get_agent() -> Any:
+    """The compiled enhancement graph, built on first use."""
+    global _agent
+    if _agent is None:
+        # langgraph is imported here rather than at module level, where it dominated import time
+        from langgraph.graph import StateGraph, START, END
+
+        # Repository branch: clone -> scan -> analyze, run as one node so it overlaps the directive branch
+        # as a whole
+        prepare_workflow = StateGraph(State)
+
+        prepare_workflow.add_node(Phase.CLONE_REPO, clone_repository)
+        prepare_workflow.add_node(Phase.SCAN_UI_FILES, scan_ui_files)
+        prepare_workflow.add_node(Phase.ANALYZE_UI, analyze_ui)
+
+        prepare_workflow.add_conditional_edges(
+            Phase.CLONE_REPO,
+            get_next_step,
+            {Phase.SCAN_UI_FILES: Phase.SCAN_UI_FILES, Phase.COMPLETE: END}
+        )
+
+        prepare_workflow.add_conditional_edges(
+            Phase.SCAN_UI_FILES,
+            get_next_step,
+            {Phase.ANALYZE_UI: Phase.ANALYZE_UI, Phase.COMPLETE: END}
+        )
+
+        prepare_workflow.add_conditional_edges(
+            Phase.ANALYZE_UI,
+            get_next_step,
+            {Phase.IDENTIFY_OPPORTUNITIES: END, Phase.COMPLETE: END}
+        )
+
+        prepare_workflow.set_entry_point(Phase.CLONE_REPO)
+        prepare_graph = prepare_workflow.compile()
+
+        workflow = StateGraph(State)
+
+        workflow.add_node(Phase.PREPARE_REPOSITORY, prepare_graph)
+        workflow.add_node(Phase.INTERPRET_DIRECTIVE, interpret_directive)
+        workflow.add_node(Phase.IDENTIFY_OPPORTUNITIES, identify_opportunities)
+        workflow.add_node(Phase.GENERATE_PLAN, generate_plan)
+        workflow.add_node(Phase.IMPLEMENT_ENHANCEMENTS, implement_enhancements)
+        workflow.add_node(Phase.VERIFY_CHANGES, verify_changes)
+        workflow.add_node(Phase.SUMMARIZE, create_summary)
+
+        # The directive-only LLM calls start at t=0 alongside the clone; identify waits for both branches
+        workflow.add_edge(START, Phase.PREPARE_REPOSITORY)
+        workflow.add_edge(START, Phase.INTERPRET_DIRECTIVE)
+        workflow.add_edge([Phase.PREPARE_REPOSITORY, Phase.INTERPRET_DIRECTIVE], Phase.IDENTIFY_OPPORTUNITIES)
+
+        workflow.add_conditional_edges(
+            Phase.IDENTIFY_OPPORTUNITIES,
+            get_next_step,
+            {Phase.GENERATE_PLAN: Phase.GENERATE_PLAN, Phase.COMPLETE: END}
+        )
+
+        workflow.add_conditional_edges(
+            Phase.GENERATE_PLAN,
+            get_next_step,
+            {Phase.IMPLEMENT_ENHANCEMENTS: Phase.IMPLEMENT_ENHANCEMENTS, Phase.SUMMARIZE: Phase.SUMMARIZE, Phase.COMPLETE: END}
+        )
+
+        workflow.add_conditional_edges(
+            Phase.IMPLEMENT_ENHANCEMENTS,
+            get_next_step,
+            {Phase.VERIFY_CHANGES: Phase.VERIFY_CHANGES, Phase.COMPLETE: END}
+        )
+
+        workflow.add_conditional_edges(
+            Phase.VERIFY_CHANGES,
+            get_next_step,
+            {Phase.SUMMARIZE: Phase.SUMMARIZE, Phase.COMPLETE: END}
+        )
+
+        workflow.add_conditional_edges(
+            Phase.SUMMARIZE,
+            get_next_step,
+            {Phase.COMPLETE: END}
+        )
+
+        _agent = workflow.compile()
+    return _agent
+
+
+async def enhance_ui_async(repo_url: str, enhancement_prompt: str = "Enhance the UI") -> Dict[str, Any]:
+    """Run the enhancement graph on the current event loop; many runs can share one process."""
     print(f"Starting UI enhancement for: {repo_url}")
     print(f"Enhancement prompt: {enhancement_prompt}")
 
@@ -910,16 +1605,40 @@ def enhance_ui(repo_url: str, enhancement_prompt: str = "Enhance the UI") -> Dic
         "enhanced_files": [],
         "verification_result": {},
         "summary": "",
+        "prompt_budgets": {},
         "error": None,
         "log": []
     }
 
     try:
-        result = agent.invoke(initial_state)
+        # Fail before cloning when the endpoint is not configured
+        get_llm_credentials()
+        result = await get_agent().ainvoke(initial_state)
+        shared = get_llm_shared()
+        if shared["cache"] is not None:
+            print(f"LLM response cache: {shared['cache'].stats()}")
+        if shared["policy"] is not None:
+            print(f"LLM resilience: {shared['policy'].stats()}")
+        if shared["limiter"] is not None:
+            print(f"LLM concurrency: {shared['limiter'].stats()}")
+        pool_stats = http_pool_stats()
+        if pool_stats is not None:
+            print(f"LLM connection pool: {pool_stats}")
         return result
     except Exception as e:
         print(f"Error running UI enhancement agent: {e}")
         return {
             "error": str(e),
             "summary": "UI enhancement failed due to an error."
-        }
\ No newline at end of file
+        }
+
+
+def enhance_ui(repo_url: str, enhancement_prompt: str = "Enhance the UI") -> Dict[str, Any]:
+    async def run() -> Dict[str, Any]:
+        try:
+            return await enhance_ui_async(repo_url, enhancement_prompt)
+        finally:
+            # The loop ends with this run, so close its pooled connections while they can still shut down cleanly
+            await close_loop_connections()
+
+    return asyncio.run(run())
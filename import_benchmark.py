@@ -0,0 +1,76 @@
+"""
+Import-time regression check for the agent.
+
+Runs `python -X importtime -c "import agent"` in fresh interpreters without DEEPSEEK_API_KEY, and
+fails (exit status 1) when the import fails, takes longer than the budget, or loads one of the heavy
+packages that should only be imported on first use.
+
+    python import_benchmark.py [--module agent] [--runs 5] [--budget-ms 1000] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# Packages that must not be loaded by importing the module; they are imported when first needed
+DEFERRED_PACKAGES = ["langchain_openai", "openai", "langgraph", "langchain.tools"]
+
+
+def measure_import(module: str) -> Tuple[int, Dict[str, int]]:
+    """
+    Import module once in a fresh interpreter.
+
+    Returns:
+        Tuple of (cumulative import time of module in microseconds, cumulative time per imported module).
+    """
+    env = {key: value for key, value in os.environ.items() if key not in ("DEEPSEEK_API_KEY", "DEEPSEEK_API_BASE")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings.get(module, 0), timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure and check the import time of the agent")
+    parser.add_argument("--module", default="agent")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv('IMPORT_TIME_BUDGET_MS', '1000')))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    try:
+        runs = [measure_import(args.module) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e)
+        return 1
+    # The fastest run is the least disturbed by other load on the machine
+    total, timings = min(runs, key=lambda run: run[0])
+
+    print(f"import {args.module}: {total / 1000:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports:")
+    for name, cumulative in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total / 1000 > args.budget_ms:
+        failures.append(f"import took {total / 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    loaded = [package for package in DEFERRED_PACKAGES if package in timings]
+    if loaded:
+        failures.append(f"heavy packages imported eagerly: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
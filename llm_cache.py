@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, BaseMessageChunk
+
+from tools.scan_cache import get_cache_dir
+
+# Bump when prompts or response handling change in a way that makes old responses unusable
+CACHE_VERSION = "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+def llm_cache_enabled() -> bool:
+    return os.getenv('LLM_CACHE', 'true').lower() == 'true'
+
+
+def llm_deterministic() -> bool:
+    """Deterministic mode pins temperature to 0, trading variety for reproducible, cacheable responses."""
+    return os.getenv('LLM_DETERMINISTIC', 'false').lower() == 'true'
+
+
+def _message_payload(messages: Any) -> Any:
+    if isinstance(messages, str):
+        return messages
+    return [[message.type, message.content] if isinstance(message, BaseMessage) else message
+            for message in messages]
+
+
+def cache_key(model: str, temperature: Optional[float], messages: Any, version: str,
+              max_tokens: Optional[int] = None) -> str:
+    """Content address of one request: model, temperature, output cap, prompt bytes and tool version."""
+    settings = [model, temperature, version] if max_tokens is None else [model, temperature, version, max_tokens]
+    payload = json.dumps(settings + [_message_payload(messages)], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent LLM responses keyed by content address, with TTL and size-based (LRU) eviction.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        if db_path is None:
+            cache_dir = get_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, 'llm_cache.sqlite')
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv('LLM_CACHE_TTL_S', str(7 * 24 * 3600)))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('LLM_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached content for key, or None on a miss (expired rows count as misses)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT content, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.counters["expired"] += 1
+                row = None
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.counters["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, model: str, content: str) -> None:
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, size, now, now)
+            )
+            self.counters["stores"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        # Caller holds the lock
+        if self.ttl_seconds > 0:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.counters["expired"] += cursor.rowcount
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the cache fits again
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.counters["evicted"] += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {**self.counters, "entries": entries, "bytes": total}
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedChatModel:
+    """
+    Drop-in front for a chat model: invoke/ainvoke answer from the response cache when the same
+    model, temperature, prompt and tool version were seen before, and call the model otherwise.
+    Callers that find a response unusable (unparseable JSON, edits that do not apply) drop it with
+    adiscard, so the next run asks the model again instead of replaying it. Anything else is
+    delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, cache: LLMResponseCache, version: str = CACHE_VERSION):
+        self.model = model
+        self.cache = cache
+        self.version = os.getenv('LLM_CACHE_VERSION', version)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, "model_name", None) or getattr(self.model, "model", None) or type(self.model).__name__
+
+    def key_for(self, messages: Any) -> str:
+        return cache_key(self.model_name, getattr(self.model, "temperature", None), messages, self.version,
+                         getattr(self.model, "max_tokens", None))
+
+    def invoke(self, messages: Any, *args, **kwargs) -> AIMessage:
+        key = self.key_for(messages)
+        content = self.cache.get(key)
+        if content is not None:
+            return AIMessage(content=content)
+        result = self.model.invoke(messages, *args, **kwargs)
+        if isinstance(result.content, str) and result.content:
+            self.cache.put(key, self.model_name, result.content)
+        return result
+
+    async def ainvoke(self, messages: Any, *args, **kwargs) -> AIMessage:
+        key = self.key_for(messages)
+        content = await asyncio.to_thread(self.cache.get, key)
+        if content is not None:
+            return AIMessage(content=content)
+        result = await self.model.ainvoke(messages, *args, **kwargs)
+        if isinstance(result.content, str) and result.content:
+            await asyncio.to_thread(self.cache.put, key, self.model_name, result.content)
+        return result
+
+    async def adiscard(self, messages: Any) -> None:
+        """Remove the cached response to messages."""
+        await asyncio.to_thread(self.cache.delete, self.key_for(messages))
+
+    def stream(self, messages: Any, *args, **kwargs) -> Iterator[BaseMessageChunk]:
+        """
+        Stream a response; a cached one arrives as a single chunk. Fresh streams are not stored,
+        since only the caller can tell whether they are valid (see open_stream).
+        """
+        content = self.cache.get(self.key_for(messages))
+        if content is not None:
+            yield AIMessageChunk(content=content)
+            return
+        yield from self.model.stream(messages, *args, **kwargs)
+
+    async def astream(self, messages: Any, *args, **kwargs) -> AsyncIterator[BaseMessageChunk]:
+        async with open_stream(self, messages, *args, **kwargs) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+class PendingStream:
+    """
+    A streamed response that is written to the response cache only when the caller commits it,
+    after reading and validating the whole stream. Discarding it also drops a cached copy, so a
+    response found invalid is not replayed on the next run.
+    """
+
+    def __init__(self, model: Any, messages: Any, *args, **kwargs):
+        self.model = model
+        self.cached = isinstance(model, CachedChatModel)
+        self.key = model.key_for(messages) if self.cached else None
+        self._call = (messages, args, kwargs)
+        self._iterator = None
+        self._stream = None
+        self._parts = []
+        self._from_cache = False
+        self._complete = False
+
+    def __aiter__(self) -> AsyncIterator[BaseMessageChunk]:
+        self._iterator = self._chunks()
+        return self._iterator
+
+    async def _chunks(self) -> AsyncIterator[BaseMessageChunk]:
+        messages, args, kwargs = self._call
+        if self.cached:
+            content = await asyncio.to_thread(self.model.cache.get, self.key)
+            if content is not None:
+                self._from_cache = self._complete = True
+                yield AIMessageChunk(content=content)
+                return
+        # Bypasses the cache layer, which would otherwise look the response up a second time
+        inner = self.model.model if self.cached else self.model
+        self._stream = inner.astream(messages, *args, **kwargs)
+        async for chunk in self._stream:
+            if isinstance(chunk.content, str):
+                self._parts.append(chunk.content)
+            yield chunk
+        self._complete = True
+
+    async def commit(self) -> None:
+        """Store the response; only a fresh stream that was read to the end is stored."""
+        content = "".join(self._parts)
+        if self.cached and self._complete and not self._from_cache and content:
+            await asyncio.to_thread(self.model.cache.put, self.key, self.model.model_name, content)
+
+    async def discard(self) -> None:
+        """Reject the response, removing it from the cache if that is where it came from."""
+        if self.cached and self._from_cache:
+            await asyncio.to_thread(self.model.cache.delete, self.key)
+
+    async def aclose(self) -> None:
+        """Stop the underlying request if the stream was abandoned early."""
+        if self._iterator is not None:
+            await self._iterator.aclose()
+        if self._stream is not None and hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+    async def __aenter__(self) -> "PendingStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+async def discard_response(model: Any, messages: Any) -> None:
+    """Drop the response to messages from model's cache; a no-op for models without one."""
+    if isinstance(model, CachedChatModel):
+        await model.adiscard(messages)
+
+
+def open_stream(model: Any, messages: Any, *args, **kwargs) -> PendingStream:
+    """Stream messages through model (cached or not) without storing the response until it is committed."""
+    return PendingStream(model, messages, *args, **kwargs)
+
+
+def with_response_cache(model: Any, cache: Optional[LLMResponseCache] = None) -> Any:
+    """Put the persistent response cache (a new one unless given) in front of model unless LLM_CACHE is disabled."""
+    if not llm_cache_enabled():
+        return model
+    return CachedChatModel(model, cache or LLMResponseCache())
@@ -0,0 +1,274 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from llm_resilience import get_request_timeout
+
+
+def llm_http_pool_enabled() -> bool:
+    return os.getenv('LLM_HTTP_POOL', 'true').lower() == 'true'
+
+
+def get_http_pool_config() -> Dict[str, Any]:
+    return {
+        "max_connections": int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '64')),
+        "max_keepalive_connections": int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '32')),
+        "keepalive_expiry_s": float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY_S', '90')),
+        "http2": os.getenv('LLM_HTTP2', 'true').lower() == 'true',
+        "connect_timeout_s": float(os.getenv('LLM_HTTP_CONNECT_TIMEOUT_S', '10')),
+        "write_timeout_s": float(os.getenv('LLM_HTTP_WRITE_TIMEOUT_S', '30')),
+        "pool_timeout_s": float(os.getenv('LLM_HTTP_POOL_TIMEOUT_S', '60'))
+    }
+
+
+def get_http_timeout() -> httpx.Timeout:
+    """
+    Per-phase HTTP timeouts of one request attempt. Reads may take as long as LLM_REQUEST_TIMEOUT_S
+    (reasoning models think before the first byte); connecting, writing and waiting for a pooled
+    connection fail much sooner.
+    """
+    config = get_http_pool_config()
+    return httpx.Timeout(get_request_timeout(), connect=config["connect_timeout_s"],
+                         write=config["write_timeout_s"], pool=config["pool_timeout_s"])
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class PoolMetrics:
+    """
+    Request and connection counters for the shared pools, sync and async.
+
+    Utilization is gathered while requests run: the in-flight count is integrated over the time at
+    least one request is in flight, so the mean and the peak still mean something once the run is
+    over, and idle time between runs does not dilute them.
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.counters = {"requests": 0, "failed_requests": 0, "peak_in_flight": 0, "connections_opened": 0}
+        self.in_flight = 0
+        self._in_flight_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._last_change: Optional[float] = None
+        self._seen = weakref.WeakSet()
+        self._pools = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _advance(self) -> None:
+        # Caller holds the lock
+        now = time.monotonic()
+        if self._last_change is not None and self.in_flight:
+            self._in_flight_seconds += self.in_flight * (now - self._last_change)
+            self._busy_seconds += now - self._last_change
+        self._last_change = now
+
+    def started(self) -> None:
+        with self._lock:
+            self._advance()
+            self.counters["requests"] += 1
+            self.in_flight += 1
+            self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.in_flight)
+
+    def finished(self, failed: bool = False) -> None:
+        with self._lock:
+            self._advance()
+            self.in_flight -= 1
+            if failed:
+                self.counters["failed_requests"] += 1
+
+    def observe(self, transport: Any) -> None:
+        """Count the connections of a transport's pool that were not there at the last look."""
+        # httpx keeps its httpcore pool private; without it only the request counters are kept
+        pool = getattr(transport, "_pool", None)
+        if pool is None or not hasattr(pool, "connections"):
+            return
+        with self._lock:
+            self._pools.add(pool)
+            for connection in list(getattr(pool, "connections", [])):
+                if connection not in self._seen:
+                    self._seen.add(connection)
+                    self.counters["connections_opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            connections = [connection for pool in self._pools for connection in list(pool.connections)]
+            counters = dict(self.counters)
+            self._advance()
+            mean_in_flight = self._in_flight_seconds / self._busy_seconds if self._busy_seconds > 0 else 0.0
+        idle = sum(1 for connection in connections if connection.is_idle())
+        opened = counters["connections_opened"]
+        return {
+            **counters,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "mean_utilization": round(mean_in_flight / self.max_connections, 3),
+            "peak_utilization": round(counters["peak_in_flight"] / self.max_connections, 3),
+            # Requests served per connection opened; 1.0 means every request paid for a new handshake
+            "reuse_ratio": round(counters["requests"] / opened, 2) if opened else None
+        }
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream: Any, on_close: Callable[[], None]):
+        self.stream = stream
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.on_close()
+
+
+class _MeteredAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, stream: Any, on_close: Callable[[], None]):
+        self.stream = stream
+        self.on_close = on_close
+        self.closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.closed:
+                self.closed = True
+                self.on_close()
+
+
+def _metered_response(response: httpx.Response, stream: Any) -> httpx.Response:
+    return httpx.Response(status_code=response.status_code, headers=response.headers, stream=stream,
+                          extensions=response.extensions)
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """Pooled sync transport; a request counts as in flight until its response body is closed."""
+
+    def __init__(self, metrics: PoolMetrics, **transport_options):
+        self.transport = httpx.HTTPTransport(**transport_options)
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.metrics.started()
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            self.metrics.finished(failed=True)
+            raise
+        self.metrics.observe(self.transport)
+        return _metered_response(response, _MeteredStream(response.stream, self.metrics.finished))
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class LoopLocalAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled async transport shared by every run in the process.
+
+    asyncio connections belong to the event loop that opened them, so there is one pool per running
+    loop: concurrent runs on one loop share a pool, and each asyncio.run gets its own. Pools of
+    loops that have closed are dropped when the next pool is created.
+    """
+
+    def __init__(self, metrics: PoolMetrics, **transport_options):
+        self.metrics = metrics
+        self.transport_options = transport_options
+        self.transports: Dict[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = {}
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self.transports.get(loop)
+            if transport is None:
+                for other in [other for other in self.transports if other.is_closed()]:
+                    del self.transports[other]
+                transport = self.transports[loop] = httpx.AsyncHTTPTransport(**self.transport_options)
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport()
+        self.metrics.started()
+        try:
+            response = await transport.handle_async_request(request)
+        except BaseException:
+            self.metrics.finished(failed=True)
+            raise
+        self.metrics.observe(transport)
+        return _metered_response(response, _MeteredAsyncStream(response.stream, self.metrics.finished))
+
+    async def aclose_loop(self) -> None:
+        """Close the pool of the running loop, e.g. before asyncio.run tears the loop down."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self.transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+    async def aclose(self) -> None:
+        await self.aclose_loop()
+
+
+_clients: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+_async_transport: Optional[LoopLocalAsyncTransport] = None
+_metrics: Optional[PoolMetrics] = None
+_clients_lock = threading.Lock()
+
+
+def get_http_clients() -> Optional[Tuple[httpx.Client, httpx.AsyncClient]]:
+    """
+    The process-wide (sync, async) httpx clients for model calls, created on first use, or None
+    when LLM_HTTP_POOL is disabled and the OpenAI SDK should create its own.
+    """
+    global _clients, _async_transport, _metrics
+    if not llm_http_pool_enabled():
+        return None
+    with _clients_lock:
+        if _clients is None:
+            config = get_http_pool_config()
+            # Without h2 installed the pool quietly speaks HTTP/1.1
+            http2 = config["http2"] and http2_available()
+            limits = httpx.Limits(max_connections=config["max_connections"],
+                                  max_keepalive_connections=config["max_keepalive_connections"],
+                                  keepalive_expiry=config["keepalive_expiry_s"])
+            timeout = get_http_timeout()
+            _metrics = PoolMetrics(config["max_connections"])
+            _async_transport = LoopLocalAsyncTransport(_metrics, limits=limits, http2=http2)
+            # limits and http2 also apply to proxy transports httpx creates from the environment
+            _clients = (
+                httpx.Client(transport=MeteredTransport(_metrics, limits=limits, http2=http2), limits=limits,
+                             http2=http2, timeout=timeout, follow_redirects=True),
+                httpx.AsyncClient(transport=_async_transport, limits=limits, http2=http2, timeout=timeout,
+                                  follow_redirects=True)
+            )
+        return _clients
+
+
+async def close_loop_connections() -> None:
+    """Close the shared async pool's connections on the running loop, if any were opened."""
+    if _async_transport is not None:
+        await _async_transport.aclose_loop()
+
+
+def http_pool_stats() -> Optional[Dict[str, Any]]:
+    """Pool utilization and connection reuse, or None if the shared clients were never created."""
+    return _metrics.stats() if _metrics is not None else None
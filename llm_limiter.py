@@ -0,0 +1,288 @@
+import asyncio
+import collections
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from llm_resilience import deadline_passed, status_code_of
+from token_budget import count_tokens
+
+# Latency is compared per output token, so long and short answers share one baseline; very short
+# answers are dominated by fixed overhead and count as this many tokens
+MIN_LATENCY_TOKENS = 50
+
+# Latency samples needed before spikes are detected
+LATENCY_WARMUP_SAMPLES = 5
+
+
+def llm_limiter_enabled() -> bool:
+    return os.getenv('LLM_ADAPTIVE_CONCURRENCY', 'true').lower() == 'true'
+
+
+def get_limiter_config() -> Dict[str, Any]:
+    return {
+        "initial_limit": float(os.getenv('LLM_CONCURRENCY_INITIAL', '4')),
+        "min_limit": float(os.getenv('LLM_CONCURRENCY_MIN', '1')),
+        "max_limit": float(os.getenv('LLM_CONCURRENCY_MAX', '32')),
+        "decrease_factor": float(os.getenv('LLM_CONCURRENCY_DECREASE', '0.5')),
+        "latency_spike_factor": float(os.getenv('LLM_LATENCY_SPIKE_FACTOR', '2.0')),
+        "requests_per_minute": float(os.getenv('LLM_RPM_LIMIT', '0')),
+        "tokens_per_minute": float(os.getenv('LLM_TPM_LIMIT', '0')),
+        "expected_completion_tokens": int(os.getenv('LLM_EXPECTED_COMPLETION_TOKENS', '1024'))
+    }
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units a second up to per_minute units; a rate of 0 never limits."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until amount units are available (0 if they are now)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        if self.capacity > 0:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on in-flight LLM requests, plus request-per-minute and token-per-minute buckets.
+
+    While the limit is in use and latency stays near its baseline, the limit grows by about one per
+    window of completed requests. A 429, a timeout or a latency spike multiplies it by
+    decrease_factor, at most once per baseline latency so one burst of errors counts once.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**get_limiter_config(), **(config or {})}
+        self.limit = self.config["initial_limit"]
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.requests = TokenBucket(self.config["requests_per_minute"])
+        self.tokens = TokenBucket(self.config["tokens_per_minute"])
+        self.baseline = None
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.counters = {"requests": 0, "increases": 0, "decreases": 0, "rate_limited": 0, "latency_spikes": 0,
+                         "timeouts": 0, "max_queue_depth": 0, "queued_seconds": 0.0}
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """Wait for a free slot and for both buckets to hold enough for this request."""
+        started = time.monotonic()
+        self.queue_depth += 1
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.queue_depth)
+        try:
+            while True:
+                with self._lock:
+                    if self.in_flight < max(1, int(self.limit)):
+                        delay = max(self.requests.delay_for(1), self.tokens.delay_for(estimated_tokens))
+                        if delay == 0:
+                            self.requests.take(1)
+                            self.tokens.take(estimated_tokens)
+                            self.in_flight += 1
+                            self.counters["requests"] += 1
+                            return
+                        waiter = None
+                    else:
+                        # Futures belong to the caller's event loop, so the limiter outlives asyncio.run
+                        waiter = asyncio.get_running_loop().create_future()
+                        self._waiters.append(waiter)
+                if waiter is None:
+                    await asyncio.sleep(delay)
+                    continue
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    # Pass a wake-up this waiter may have received on to the next one
+                    with self._lock:
+                        self._wake()
+                    raise
+                finally:
+                    with self._lock:
+                        if waiter in self._waiters:
+                            self._waiters.remove(waiter)
+        finally:
+            self.queue_depth -= 1
+            self.counters["queued_seconds"] += time.monotonic() - started
+
+    def release(self, latency: float, output_tokens: int, estimated_tokens: int, used_tokens: Optional[int],
+                error: Optional[BaseException] = None) -> None:
+        """
+        Return the slot and adjust the limit from the outcome of the request.
+
+        A request that ended with any error records no latency sample; only rate limits and
+        timeouts (including a deadline cancelling the request) lower the limit.
+        """
+        with self._lock:
+            was_saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            if used_tokens is not None and used_tokens < estimated_tokens:
+                self.tokens.give_back(estimated_tokens - used_tokens)
+            elif used_tokens is not None:
+                self.tokens.take(used_tokens - estimated_tokens)
+
+            if error is not None:
+                import openai
+                if status_code_of(error) == 429:
+                    self.counters["rate_limited"] += 1
+                    self._decrease()
+                elif isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)) or (
+                        isinstance(error, asyncio.CancelledError) and deadline_passed()):
+                    self.counters["timeouts"] += 1
+                    self._decrease()
+            else:
+                per_token = latency / max(MIN_LATENCY_TOKENS, output_tokens)
+                if (self.samples >= LATENCY_WARMUP_SAMPLES
+                        and per_token > self.baseline * self.config["latency_spike_factor"]):
+                    self.counters["latency_spikes"] += 1
+                    self._decrease()
+                else:
+                    self.baseline = per_token if self.baseline is None else 0.8 * self.baseline + 0.2 * per_token
+                    self.samples += 1
+                    if was_saturated and self.limit < self.config["max_limit"]:
+                        self.limit = min(self.config["max_limit"], self.limit + 1 / self.limit)
+                        self.counters["increases"] += 1
+            self._wake()
+
+    def _decrease(self) -> None:
+        # Caller holds the lock
+        now = time.monotonic()
+        window = max(1.0, (self.baseline or 0) * self.config["expected_completion_tokens"])
+        if now - self.last_decrease < window:
+            return
+        self.last_decrease = now
+        self.limit = max(self.config["min_limit"], self.limit * self.config["decrease_factor"])
+        self.counters["decreases"] += 1
+
+    def _wake(self) -> None:
+        # Caller holds the lock
+        free = max(1, int(self.limit)) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+                free -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                **{key: round(value, 3) if isinstance(value, float) else value for key, value in self.counters.items()},
+                "rpm_available": round(self.requests.level, 1) if self.requests.capacity else None,
+                "tpm_available": round(self.tokens.level) if self.tokens.capacity else None
+            }
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _prompt_tokens(messages: Any) -> int:
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    return sum(count_tokens(message.content if isinstance(message.content, str) else str(message.content))
+               for message in messages)
+
+
+def _used_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def _output_tokens(result: Any) -> int:
+    usage = getattr(result, "usage_metadata", None)
+    if usage and usage.get("output_tokens"):
+        return usage["output_tokens"]
+    content = getattr(result, "content", None)
+    return count_tokens(content) if isinstance(content, str) else 0
+
+
+class LimitedModel:
+    """
+    Routes every async request of a chat model (or a runnable derived from one) through a shared
+    AdaptiveLimiter. Anything else, including synchronous invoke, is delegated unchanged.
+    """
+
+    def __init__(self, model: Any, limiter: AdaptiveLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    def _estimate(self, messages: Any) -> int:
+        completion = getattr(self.model, "max_tokens", None) or self.limiter.config["expected_completion_tokens"]
+        return _prompt_tokens(messages) + completion
+
+    async def ainvoke(self, messages: Any, *args, **kwargs) -> Any:
+        estimated = self._estimate(messages)
+        await self.limiter.acquire(estimated)
+        started = time.monotonic()
+        try:
+            result = await self.model.ainvoke(messages, *args, **kwargs)
+        except BaseException as e:
+            self.limiter.release(time.monotonic() - started, 0, estimated, None, e)
+            raise
+        self.limiter.release(time.monotonic() - started, _output_tokens(result), estimated, _used_tokens(result))
+        return result
+
+    async def astream(self, messages: Any, *args, **kwargs) -> AsyncIterator[Any]:
+        estimated = self._estimate(messages)
+        await self.limiter.acquire(estimated)
+        started = time.monotonic()
+        output = []
+        used = None
+        error = None
+        try:
+            async for chunk in self.model.astream(messages, *args, **kwargs):
+                if isinstance(chunk.content, str):
+                    output.append(chunk.content)
+                used = _used_tokens(chunk) or used
+                yield chunk
+        except BaseException as e:
+            # Includes GeneratorExit: a stream the consumer stopped reading gives no latency sample
+            error = e
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, count_tokens("".join(output)), estimated, used, error)
+
+    def with_structured_output(self, *args, **kwargs) -> "LimitedModel":
+        return LimitedModel(self.model.with_structured_output(*args, **kwargs), self.limiter)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.limiter.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+def with_concurrency_limit(model: Any, limiter: Optional[AdaptiveLimiter] = None) -> Any:
+    """Put an AdaptiveLimiter (a new one unless given) in front of model unless LLM_ADAPTIVE_CONCURRENCY is disabled."""
+    if not llm_limiter_enabled():
+        return model
+    return LimitedModel(model, limiter or AdaptiveLimiter())
@@ -0,0 +1,331 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+
+# Status codes worth another attempt; everything else (400, 401, 404, ...) fails at once
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def llm_resilience_enabled() -> bool:
+    return os.getenv('LLM_RESILIENCE', 'true').lower() == 'true'
+
+
+def get_request_timeout() -> float:
+    """Timeout of a single HTTP attempt; reasoning models can take minutes to answer."""
+    return float(os.getenv('LLM_REQUEST_TIMEOUT_S', '300'))
+
+
+def get_resilience_config() -> Dict[str, Any]:
+    return {
+        "max_retries": int(os.getenv('LLM_MAX_RETRIES', '5')),
+        "backoff_base_s": float(os.getenv('LLM_BACKOFF_BASE_S', '1')),
+        "backoff_max_s": float(os.getenv('LLM_BACKOFF_MAX_S', '60')),
+        "deadline_s": float(os.getenv('LLM_CALL_DEADLINE_S', '900')),
+        "breaker_threshold": int(os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+        "breaker_cooldown_s": float(os.getenv('LLM_BREAKER_COOLDOWN_S', '30'))
+    }
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the endpoint while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """A call and its retries did not finish within the per-call deadline."""
+
+
+# Deadline of the async ResilientModel attempt in progress. Wrapped layers see a deadline only as
+# a CancelledError, and use this to tell it apart from any other cancellation.
+_attempt_deadline: ContextVar[Optional[float]] = ContextVar("llm_attempt_deadline", default=None)
+
+
+def deadline_passed() -> bool:
+    """Whether the running async model call was cut off by its ResilientModel deadline."""
+    deadline = _attempt_deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "response", None), httpx.Response):
+        status = error.response.status_code
+    return status
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Deferred so importing this module does not load the openai SDK; the client has loaded it by now
+    import openai
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, httpx.TimeoutException,
+                          httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return status_code_of(error) in RETRYABLE_STATUS_CODES
+
+
+def is_outage(error: BaseException) -> bool:
+    """Failures that suggest the endpoint is down, as opposed to throttling or a bad request."""
+    return is_retryable(error) and status_code_of(error) not in (408, 409, 429)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by the server through retry-after-ms or Retry-After (seconds or HTTP date)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Neither seconds nor a date; fall back to the policy's own backoff
+        return None
+    if parsed.tzinfo is None:
+        # HTTP dates are GMT, and an aware datetime is needed for the subtraction below
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive outage failures and rejects calls for cooldown seconds; then one
+    trial call is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int, cooldown_s: float, counters: Dict[str, int]):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self.counters = counters
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown_s:
+                    self.counters["breaker_rejections"] += 1
+                    raise CircuitOpenError(
+                        f"LLM endpoint circuit is open after {self.failures} consecutive failures")
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+            elif self.state == "half_open":
+                # Only the trial call may run until it reports back (or is given up on after a cooldown)
+                if time.monotonic() - self.opened_at < self.cooldown_s:
+                    self.counters["breaker_rejections"] += 1
+                    raise CircuitOpenError("LLM endpoint circuit is half-open and a trial call is in flight")
+                self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self, error: BaseException) -> None:
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if not is_outage(error):
+                # The endpoint answered, so it is up
+                self.state = "closed" if self.state == "half_open" else self.state
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.counters["breaker_trips"] += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """Shared retry settings, circuit breaker and counters for every call through a ResilientModel."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**get_resilience_config(), **(config or {})}
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "successes": 0, "failures": 0,
+                         "retry_after_honored": 0, "deadline_exceeded": 0, "breaker_trips": 0,
+                         "breaker_rejections": 0}
+        self.breaker = CircuitBreaker(self.config["breaker_threshold"], self.config["breaker_cooldown_s"],
+                                      self.counters)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After when it asks for longer."""
+        delay = random.uniform(0, min(self.config["backoff_max_s"], self.config["backoff_base_s"] * 2 ** attempt))
+        requested = retry_after_seconds(error)
+        if requested is not None and requested > delay:
+            # Retrying before the server is ready would only earn another 429; the deadline still applies
+            self.counters["retry_after_honored"] += 1
+            delay = requested
+        return delay
+
+    def next_delay(self, attempt: int, error: BaseException, deadline: float) -> Optional[float]:
+        """Delay before retrying after error, or None when the call should fail now."""
+        self.breaker.record_failure(error)
+        if not is_retryable(error) or attempt >= self.config["max_retries"] or self.breaker.state == "open":
+            return None
+        delay = self.backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            self.counters["deadline_exceeded"] += 1
+            return None
+        self.counters["retries"] += 1
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "breaker_state": self.breaker.state}
+
+
+class ResilientModel:
+    """
+    Wraps a chat model (or a runnable derived from one) with retries, backoff, Retry-After handling,
+    a per-call deadline and a circuit breaker. Anything else is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: Any, policy: RetryPolicy):
+        self.model = model
+        self.policy = policy
+
+    def _call(self, call: Callable[[], Any]) -> Any:
+        policy = self.policy
+        policy.counters["calls"] += 1
+        deadline = time.monotonic() + policy.config["deadline_s"]
+        attempt = 0
+        while True:
+            policy.breaker.before_call()
+            policy.counters["attempts"] += 1
+            try:
+                result = call()
+            except Exception as e:
+                delay = policy.next_delay(attempt, e, deadline)
+                if delay is None:
+                    policy.counters["failures"] += 1
+                    raise
+                print(f"LLM call failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            policy.breaker.record_success()
+            policy.counters["successes"] += 1
+            return result
+
+    async def _acall(self, call: Callable[[], Any]) -> Any:
+        policy = self.policy
+        policy.counters["calls"] += 1
+        deadline = time.monotonic() + policy.config["deadline_s"]
+        attempt = 0
+        while True:
+            policy.breaker.before_call()
+            policy.counters["attempts"] += 1
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"LLM call exceeded its {policy.config['deadline_s']}s deadline")
+                token = _attempt_deadline.set(deadline)
+                try:
+                    result = await asyncio.wait_for(call(), timeout=remaining)
+                finally:
+                    _attempt_deadline.reset(token)
+            except DeadlineExceededError:
+                policy.counters["deadline_exceeded"] += 1
+                policy.counters["failures"] += 1
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and time.monotonic() >= deadline:
+                    policy.counters["deadline_exceeded"] += 1
+                    policy.counters["failures"] += 1
+                    raise DeadlineExceededError(
+                        f"LLM call exceeded its {policy.config['deadline_s']}s deadline") from e
+                delay = policy.next_delay(attempt, e, deadline)
+                if delay is None:
+                    policy.counters["failures"] += 1
+                    raise
+                print(f"LLM call failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            policy.breaker.record_success()
+            policy.counters["successes"] += 1
+            return result
+
+    def invoke(self, messages: Any, *args, **kwargs) -> Any:
+        return self._call(lambda: self.model.invoke(messages, *args, **kwargs))
+
+    async def ainvoke(self, messages: Any, *args, **kwargs) -> Any:
+        return await self._acall(lambda: self.model.ainvoke(messages, *args, **kwargs))
+
+    def stream(self, messages: Any, *args, **kwargs) -> Iterator[Any]:
+        """Stream with retries up to the first chunk; a stream that fails midway is not replayed."""
+        iterator = self._call(lambda: _first_chunk(self.model.stream(messages, *args, **kwargs)))
+        yield from iterator
+
+    async def astream(self, messages: Any, *args, **kwargs) -> AsyncIterator[Any]:
+        stream, first = await self._acall(lambda: _afirst_chunk(self.model.astream(messages, *args, **kwargs)))
+        try:
+            if first is not _END:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            await stream.aclose()
+
+    def with_structured_output(self, *args, **kwargs) -> "ResilientModel":
+        return ResilientModel(self.model.with_structured_output(*args, **kwargs), self.policy)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.policy.stats()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+
+_END = object()
+
+
+def _first_chunk(stream: Iterator[Any]) -> Iterator[Any]:
+    # Pulls the first chunk eagerly so connection errors surface inside the retry loop
+    first = next(stream, _END)
+
+    def chunks():
+        if first is not _END:
+            yield first
+            yield from stream
+    return chunks()
+
+
+async def _afirst_chunk(stream: AsyncIterator[Any]) -> Any:
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = _END
+    except BaseException:
+        await stream.aclose()
+        raise
+    return stream, first
+
+
+def with_resilience(model: Any, policy: Optional[RetryPolicy] = None) -> Any:
+    """Wrap model in a ResilientModel (with a new policy unless given) unless LLM_RESILIENCE is disabled."""
+    if not llm_resilience_enabled():
+        return model
+    return ResilientModel(model, policy or RetryPolicy())
@@ -0,0 +1,43 @@
+import os
+from typing import Any, Dict, Optional
+
+from llm_cache import llm_deterministic
+
+# Call sites in agent.py, each of which can use its own model settings
+MODEL_PHASES = ["focus", "design", "opportunities", "plan", "implement", "summary"]
+
+# Phases that classify or write prose and do not need a reasoning model
+FAST_PHASES = {"focus", "design", "summary"}
+
+
+def get_reasoning_model() -> str:
+    return os.getenv('DEEPSEEK_MODEL', "deepseek-reasoner")
+
+
+def get_fast_model() -> str:
+    return os.getenv('LLM_FAST_MODEL', "deepseek-chat")
+
+
+def _optional_number(name: str, cast: type) -> Optional[Any]:
+    value = os.getenv(name)
+    return cast(value) if value not in (None, "") else None
+
+
+def get_phase_model_config(phase: str) -> Dict[str, Any]:
+    """
+    Model settings for one phase.
+
+    LLM_MODEL_<PHASE>, LLM_TEMPERATURE_<PHASE> and LLM_MAX_TOKENS_<PHASE> override the defaults: the
+    fast tier (LLM_FAST_MODEL) for the phases in FAST_PHASES and DEEPSEEK_MODEL for the others, at
+    temperature 0.4 (0 in deterministic mode) with no max_tokens cap.
+    """
+    key = phase.upper()
+    model = os.getenv(f'LLM_MODEL_{key}') or (get_fast_model() if phase in FAST_PHASES else get_reasoning_model())
+    temperature = _optional_number(f'LLM_TEMPERATURE_{key}', float)
+    if temperature is None or llm_deterministic():
+        temperature = 0 if llm_deterministic() else 0.4
+    return {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": _optional_number(f'LLM_MAX_TOKENS_{key}', int)
+    }
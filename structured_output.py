@@ -0,0 +1,82 @@
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage
+
+
+def structured_output_enabled() -> bool:
+    return os.getenv('LLM_STRUCTURED_OUTPUT', 'false').lower() == 'true'
+
+
+def get_structured_method() -> str:
+    """with_structured_output method; function_calling works with the widest range of OpenAI-compatible APIs."""
+    return os.getenv('LLM_STRUCTURED_METHOD', 'function_calling')
+
+
+def get_structured_retries() -> int:
+    return max(0, int(os.getenv('LLM_STRUCTURED_RETRIES', '2')))
+
+
+def build_schema(title: str, description: str, properties: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """JSON schema requiring every given property."""
+    return {
+        "title": title,
+        "description": description,
+        "type": "object",
+        "properties": properties,
+        "required": list(properties)
+    }
+
+
+def missing_fields(result: Any, validators: Dict[str, Callable[[Any], bool]]) -> List[str]:
+    """Names of the fields that are absent from result or fail their validator."""
+    if not isinstance(result, dict):
+        return list(validators)
+    return [name for name, is_valid in validators.items() if name not in result or not is_valid(result[name])]
+
+
+async def ainvoke_structured(model: Any, prompt: str, title: str, description: str,
+                             properties: Dict[str, Dict[str, Any]], validators: Dict[str, Callable[[Any], bool]],
+                             known: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Ask for several fields in one structured-output call, validate them locally, and re-ask only for
+    the fields that came back missing or invalid.
+
+    Args:
+        model: Chat model supporting with_structured_output.
+        prompt (str): Instructions describing every field.
+        title (str): Schema name (used as the function name in function-calling mode).
+        description (str): Schema description.
+        properties: JSON schema per field.
+        validators: Local check per field; a field is accepted when its validator returns True.
+        known: Fields already available; they are not requested and are shown to the model as context.
+
+    Returns:
+        Tuple of (accepted fields, names of fields still missing after the retries).
+    """
+    accepted = {name: value for name, value in (known or {}).items() if name in validators and validators[name](value)}
+    missing = [name for name in validators if name not in accepted]
+
+    for attempt in range(get_structured_retries() + 1):
+        if not missing:
+            break
+        request = prompt
+        if accepted:
+            request += ("\n\nThese fields are already settled; keep them consistent and do not repeat them:\n"
+                        + "\n".join(f"- {name}: {value}" for name, value in accepted.items()))
+        if attempt > 0:
+            request += f"\n\nThe previous answer was missing or invalid for: {', '.join(missing)}. Provide only those fields."
+
+        schema = build_schema(title, description, {name: properties[name] for name in missing})
+        structured = model.with_structured_output(schema, method=get_structured_method())
+        try:
+            result = await structured.ainvoke([HumanMessage(content=request)])
+        except Exception as e:
+            print(f"Structured output call failed (attempt {attempt + 1}): {e}")
+            continue
+
+        still_missing = missing_fields(result, {name: validators[name] for name in missing})
+        accepted.update({name: result[name] for name in missing if name not in still_missing})
+        missing = still_missing
+
+    return accepted, missing
@@ -0,0 +1,37 @@
+import json
+
+from tools.analyze_ui_capabilities import analyze_ui_capabilities
+from tools.ui_detectors import detect_file
+
+VUE_FILE = "<template><div></div></template>\n"
+PLAIN_SCRIPT = "export const add = (a, b) => a + b;\n"
+STYLESHEET = ".a { color: red; }\n"
+
+
+def fused_scan(files):
+    return {
+        "ui_files": {"markup": [{"path": path, "extension": "." + path.rsplit(".", 1)[1],
+                                 "detectors": detect_file(content, "." + path.rsplit(".", 1)[1])}
+                                for path, content in files.items()]},
+        "summary": {"manifest_detection": {"frameworks": {}, "ui_libraries": {}}}
+    }
+
+
+def analyze(tmp_path, files):
+    return json.loads(analyze_ui_capabilities.invoke({"repo_dir": str(tmp_path),
+                                                      "ui_files_json": json.dumps(fused_scan(files))}))
+
+
+def test_stylesheets_do_not_dilute_framework_confidence(tmp_path):
+    files = {"App.vue": VUE_FILE, "util.js": PLAIN_SCRIPT}
+    files.update({f"style{i}.css": STYLESHEET for i in range(8)})
+    result = analyze(tmp_path, files)
+    assert result["framework"]["detected"] == ["vue"]
+    assert result["framework"]["confidence"]["vue"] == 50
+    assert result["analysis_coverage"]["source_files_analyzed"] == 2
+
+
+def test_framework_below_threshold_is_not_reported(tmp_path):
+    files = {"App.vue": VUE_FILE}
+    files.update({f"util{i}.js": PLAIN_SCRIPT for i in range(5)})
+    assert analyze(tmp_path, files)["framework"]["detected"] == []
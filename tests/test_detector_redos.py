@@ -0,0 +1,25 @@
+import pytest
+
+from tools.ui_detectors import DEFAULT_ENGINE, check_redos_corpus, detect_file, redos_corpus
+
+# Generous next to the ~40 ms the slowest entry takes, so a busy machine does not fail the suite
+BUDGET_MS = 1000.0
+
+
+def test_redos_corpus_stays_within_budget():
+    timings = check_redos_corpus(budget_ms=BUDGET_MS)
+    assert set(timings) == set(redos_corpus(100))
+
+
+@pytest.mark.parametrize("name", sorted(redos_corpus(100)))
+def test_redos_inputs_do_not_exceed_detect_file_budget(name):
+    content = redos_corpus(200000)[name]
+    hits = detect_file(content, ".svelte", budget_ms=BUDGET_MS)
+    assert "budget_exceeded" not in hits
+
+
+def test_exhausted_budget_reports_skipped_detectors():
+    # A budget that is spent before the first search skips every candidate detector instead of running it
+    hits, report = DEFAULT_ENGINE.detect_with_budget("import React from 'react'", budget_ms=1e-9)
+    assert report["skipped"]
+    assert hits["frameworks"] == []
@@ -0,0 +1,79 @@
+import pytest
+
+from tools.edit_protocol import EditApplicationError, apply_edits, locate_edit, parse_edits, try_apply_edits
+
+CONTENT = """.header {
+  color: #333;
+  padding: 8px;
+}
+
+.footer {
+  color: #666;
+  margin: 0;
+}
+"""
+
+
+def block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def test_exact_anchor():
+    start, end, method = locate_edit(CONTENT, "  color: #666;\n")
+    assert method == "exact"
+    assert CONTENT[start:end] == "  color: #666;\n"
+
+
+def test_whitespace_anchor_ignores_indentation():
+    start, end, method = locate_edit(CONTENT, ".footer {\n    color: #666;\n")
+    assert method == "whitespace"
+    assert CONTENT[start:end] == ".footer {\n  color: #666;\n"
+
+
+def test_fuzzy_anchor_tolerates_a_small_typo():
+    start, end, method = locate_edit(CONTENT, ".footer {\n  color: #666\n  margin: 0;\n}\n")
+    assert method == "fuzzy"
+    assert CONTENT[start:end] == ".footer {\n  color: #666;\n  margin: 0;\n}\n"
+
+
+def test_fuzzy_anchor_rejects_distant_text():
+    with pytest.raises(EditApplicationError, match="not found"):
+        locate_edit(CONTENT, ".sidebar {\n  display: grid;\n}\n")
+
+
+def test_ambiguous_anchor_is_rejected():
+    with pytest.raises(EditApplicationError, match="matches 2 places"):
+        locate_edit(CONTENT, "}\n")
+
+
+def test_fuzzy_anchor_needs_a_clear_winner():
+    content = "a {\n  color: red;\n}\nb {\n  color: red;\n}\n"
+    with pytest.raises(EditApplicationError, match="no unique fuzzy match"):
+        locate_edit(content, "c {\n  color: red;\n}\n")
+
+
+def test_reindents_replacement_to_the_file():
+    new_content, report = apply_edits(CONTENT, [("color: #666;\nmargin: 0;\n", "color: #000;\nmargin: 4px;\n")])
+    assert report[0]["method"] == "whitespace"
+    assert "  color: #000;\n  margin: 4px;\n" in new_content
+
+
+def test_try_apply_edits_applies_search_replace_blocks():
+    response = block("  color: #333;\n", "  color: #0044ff;\n") + block("  margin: 0;\n", "  margin: 0 auto;\n")
+    new_content, summary = try_apply_edits(CONTENT, response)
+    assert new_content == CONTENT.replace("#333", "#0044ff").replace("margin: 0;", "margin: 0 auto;")
+    assert summary == "applied 2 edits (2 exact)"
+
+
+def test_try_apply_edits_applies_unified_diffs():
+    response = "--- a/x.css\n+++ b/x.css\n@@ -1,3 +1,3 @@\n .header {\n-  color: #333;\n+  color: #111;\n   padding: 8px;\n"
+    assert parse_edits(response)
+    new_content, _ = try_apply_edits(CONTENT, response)
+    assert new_content == CONTENT.replace("#333", "#111")
+
+
+def test_try_apply_edits_reports_unusable_responses():
+    assert try_apply_edits(CONTENT, "I changed nothing") == (None, "no edits found in the response")
+    new_content, reason = try_apply_edits(CONTENT, block("  color: #333;\n", "x\n") + block("nope\n", "y\n"))
+    assert new_content is None
+    assert reason.startswith("edit 2:")
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import import_benchmark
+import tools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_agent_import_is_fast_and_defers_heavy_packages():
+    total_us, timings = import_benchmark.measure_import("agent")
+    assert total_us / 1000 < 1000
+    assert [package for package in import_benchmark.DEFERRED_PACKAGES if package in timings] == []
+
+
+def test_importing_tools_loads_no_submodules():
+    result = subprocess.run([sys.executable, "-c",
+                             "import sys, tools; print(sorted(m for m in sys.modules if m.startswith('tools.')))"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_tools_attribute_is_resolved_and_cached():
+    value = tools.try_apply_edits
+    from tools.edit_protocol import try_apply_edits
+    assert value is try_apply_edits
+    assert vars(tools)["try_apply_edits"] is try_apply_edits
+
+
+def test_tools_unknown_attribute_raises():
+    with pytest.raises(AttributeError, match="not_a_tool"):
+        tools.not_a_tool
+
+
+def test_tools_dir_lists_lazy_exports():
+    assert set(tools.__all__) <= set(dir(tools))
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from llm_limiter import AdaptiveLimiter, LimitedModel
+from llm_resilience import DeadlineExceededError, ResilientModel, RetryPolicy
+
+
+class Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class SlowModel:
+    """Answers after delay seconds, streaming chunks one at a time."""
+
+    def __init__(self, delay=0.0, chunks=3):
+        self.delay = delay
+        self.chunks = chunks
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return Chunk("done")
+
+    async def astream(self, messages):
+        for i in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield Chunk(f"part {i} ")
+
+
+def limiter():
+    return AdaptiveLimiter({"initial_limit": 4, "requests_per_minute": 0, "tokens_per_minute": 0})
+
+
+def test_completed_stream_records_a_latency_sample():
+    model = LimitedModel(SlowModel(), limiter())
+
+    async def run():
+        return [chunk.content async for chunk in model.astream("hi")]
+
+    assert len(asyncio.run(run())) == 3
+    assert model.limiter.samples == 1
+    assert model.limiter.in_flight == 0
+
+
+def test_abandoned_stream_records_no_latency_sample():
+    model = LimitedModel(SlowModel(), limiter())
+
+    async def run():
+        stream = model.astream("hi")
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert model.limiter.samples == 0
+    assert model.limiter.in_flight == 0
+
+
+@pytest.mark.parametrize("method", ["ainvoke", "astream"])
+def test_deadline_cancellation_counts_as_timeout(method):
+    shared = limiter()
+    model = ResilientModel(LimitedModel(SlowModel(delay=1.0), shared),
+                           RetryPolicy({"deadline_s": 0.05, "max_retries": 0}))
+
+    async def run():
+        if method == "ainvoke":
+            await model.ainvoke("hi")
+        else:
+            async for _ in model.astream("hi"):
+                pass
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run())
+    assert shared.counters["timeouts"] == 1
+    assert shared.counters["decreases"] == 1
+    assert shared.samples == 0
+    assert shared.in_flight == 0
+
+
+def test_other_cancellation_is_not_a_timeout():
+    shared = limiter()
+    model = ResilientModel(LimitedModel(SlowModel(delay=1.0), shared), RetryPolicy({"deadline_s": 60}))
+
+    async def run():
+        task = asyncio.ensure_future(model.ainvoke("hi"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert shared.counters["timeouts"] == 0
+    assert shared.samples == 0
+    assert shared.in_flight == 0
@@ -0,0 +1,41 @@
+import email.utils
+import time
+
+import pytest
+
+from llm_resilience import retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeError(Exception):
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.response = FakeResponse(headers)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "5"}, 5.0),
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after-ms": "bad", "retry-after": "2"}, 2.0),
+    ({"retry-after": "-3"}, 0.0),
+    ({"retry-after": "soon"}, None),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, 0.0),
+    # "-0000" yields a naive datetime, which is taken as UTC
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 -0000"}, 0.0),
+    ({}, None),
+])
+def test_retry_after_values(headers, expected):
+    assert retry_after_seconds(FakeError(headers)) == expected
+
+
+def test_retry_after_http_date_in_the_future():
+    delay = retry_after_seconds(FakeError({"retry-after": email.utils.formatdate(time.time() + 30, usegmt=True)}))
+    assert 25 < delay <= 30
+
+
+def test_error_without_response():
+    assert retry_after_seconds(ValueError("no response")) is None
@@ -0,0 +1,84 @@
+import pytest
+
+from tools.region_chunker import format_regions, select_regions, split_regions, try_splice_regions
+
+STYLESHEET = """@import url("base.css");
+
+.header {
+  color: #333;
+}
+
+@media (max-width: 600px) {
+  .header { padding: 4px; }
+}
+
+/* Footer */
+.footer {
+  content: "}";
+  color: #666;
+}
+"""
+
+SCRIPT = """import React from 'react';
+
+// Card shows one item
+export function Card({ title }) {
+  return <div className="card">{title}</div>;
+}
+
+const styles = { card: { padding: 8 } };
+
+export default function App() {
+  return <Card title="hi" />;
+}
+"""
+
+
+def echo_response(content, selected):
+    return "Here you go:\n" + format_regions(content, selected) + "\n"
+
+
+@pytest.mark.parametrize("content, extension", [(STYLESHEET, ".css"), (SCRIPT, ".jsx"), ("<div></div>\n", ".html")])
+def test_regions_cover_the_file_exactly(content, extension):
+    regions = split_regions(content, extension)
+    assert regions[0]["start"] == 0
+    assert regions[-1]["end"] == len(content)
+    assert all(a["end"] == b["start"] for a, b in zip(regions, regions[1:]))
+    assert [region["id"] for region in regions] == list(range(1, len(regions) + 1))
+
+
+def test_strings_do_not_close_css_blocks():
+    regions = split_regions(STYLESHEET, ".css")
+    footer = next(region for region in regions if "footer" in region["terms"])
+    assert STYLESHEET[footer["start"]:footer["end"]].rstrip().endswith("color: #666;\n}")
+
+
+@pytest.mark.parametrize("content, extension", [(STYLESHEET, ".css"), (SCRIPT, ".jsx")])
+def test_unchanged_regions_splice_back_to_the_original(content, extension):
+    regions = split_regions(content, extension)
+    new_content, summary = try_splice_regions(content, regions, echo_response(content, regions))
+    assert new_content == content
+    assert summary == f"spliced {len(regions)} regions (0 changed)"
+
+
+def test_splice_replaces_only_the_selected_regions():
+    regions = split_regions(STYLESHEET, ".css")
+    selected = select_regions(regions, ["Make the .footer color darker"], max_fraction=0.6)
+    assert [region["name"] for region in selected] == [".footer"]
+    response = echo_response(STYLESHEET, selected).replace("#666", "#000")
+    new_content, summary = try_splice_regions(STYLESHEET, selected, response)
+    assert new_content == STYLESHEET.replace("#666", "#000")
+    assert summary == "spliced 1 regions (1 changed)"
+
+
+def test_splice_fails_when_a_region_is_missing():
+    regions = split_regions(SCRIPT, ".jsx")
+    new_content, reason = try_splice_regions(SCRIPT, regions, echo_response(SCRIPT, regions[1:]))
+    assert new_content is None
+    assert reason == "response is missing regions 1"
+
+
+def test_select_regions_declines_when_nothing_or_too_much_matches():
+    regions = split_regions(STYLESHEET, ".css")
+    assert select_regions(regions, "unrelated words only", max_fraction=0.6) is None
+    assert select_regions(regions, ".header .footer", max_fraction=0.1) is None
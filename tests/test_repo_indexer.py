@@ -0,0 +1,57 @@
+import pytest
+
+from tools.repo_indexer import is_ignored, parse_gitignore
+
+
+@pytest.fixture
+def rules(tmp_path):
+    (tmp_path / ".gitignore").write_text(
+        "# build output\n"
+        "dist/\n"
+        "*.log\n"
+        "!keep.log\n"
+        "/root-only.txt\n"
+        "docs/**/*.tmp\n"
+        "cache?/\n"
+        "[Bb]uild\n"
+        "\\#literal\n"
+    )
+    return parse_gitignore(str(tmp_path / ".gitignore"), "")
+
+
+@pytest.mark.parametrize("path, is_dir, expected", [
+    ("dist", True, True),
+    ("dist", False, False),
+    ("src/dist", True, True),
+    ("app.log", False, True),
+    ("src/app.log", False, True),
+    ("keep.log", False, False),
+    ("root-only.txt", False, True),
+    ("src/root-only.txt", False, False),
+    ("docs/a.tmp", False, True),
+    ("docs/a/b/c.tmp", False, True),
+    ("other/a.tmp", False, False),
+    ("cache1", True, True),
+    ("cache12", True, False),
+    ("Build", True, True),
+    ("build", False, True),
+    ("#literal", False, True),
+    ("src/App.jsx", False, False),
+])
+def test_gitignore_rules(rules, path, is_dir, expected):
+    assert is_ignored(path, is_dir, rules) is expected
+
+
+def test_comments_and_blank_lines_make_no_rules(rules):
+    assert len(rules) == 8
+
+
+def test_nested_gitignore_applies_below_its_directory(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.css\n")
+    nested = parse_gitignore(str(tmp_path / ".gitignore"), "packages/web")
+    assert is_ignored("packages/web/src/a.css", False, nested)
+    assert not is_ignored("packages/api/a.css", False, nested)
+
+
+def test_missing_gitignore_has_no_rules(tmp_path):
+    assert parse_gitignore(str(tmp_path / "absent"), "") == []
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from tools.stream_validation import (MAX_PREAMBLE_LINES, ContentSpool, FenceStripper,
+                                     IncrementalStructureValidator, StreamAborted)
+
+
+def strip(text, chunk_size):
+    stripper = FenceStripper()
+    out = "".join(stripper.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size))
+    return out + stripper.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_fence_and_surrounding_prose_are_removed(chunk_size):
+    text = "Sure, here is the file:\n```css\n.a { color: blue; }\n.b {}\n```\nLet me know if you need more.\n"
+    assert strip(text, chunk_size) == ".a { color: blue; }\n.b {}\n"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+def test_unfenced_content_passes_through(chunk_size):
+    text = ".a { color: blue; }\n.b {}"
+    assert strip(text, chunk_size) == text
+
+
+def test_long_unfenced_content_is_released_before_the_end():
+    stripper = FenceStripper()
+    released = stripper.feed("line\n" * MAX_PREAMBLE_LINES)
+    assert released == "line\n" * MAX_PREAMBLE_LINES
+    # A fence this late is content, not a wrapper
+    assert stripper.feed("```\n") == "```\n"
+
+
+def validate(text, chunk_size=4):
+    validator = IncrementalStructureValidator("x.js")
+    for i in range(0, len(text), chunk_size):
+        validator.feed(text[i:i + chunk_size])
+    return validator.finish()
+
+
+def test_balanced_brackets_pass():
+    assert validate("function f(a) {\n  return [a, {b: (1)}];\n}\n") is None
+
+
+def test_mismatched_bracket_aborts_as_soon_as_it_arrives():
+    validator = IncrementalStructureValidator("x.css")
+    validator.feed(".a { color: blue; ")
+    with pytest.raises(StreamAborted, match="Mismatched brackets at line 2, column 2"):
+        validator.feed("\n)")
+
+
+def test_unexpected_closing_bracket_aborts():
+    with pytest.raises(StreamAborted, match="Unexpected closing bracket '}'"):
+        validate("a }")
+
+
+def test_unclosed_bracket_is_reported_only_at_the_end():
+    validator = IncrementalStructureValidator("x.css")
+    validator.feed(".a {\n  color: blue;\n")
+    assert validator.finish() == "Unclosed bracket '{' at line 1, column 5"
+
+
+def test_markup_tags_do_not_abort():
+    assert validate("<div><p>unclosed paragraph</div>\n") is None
+
+
+def test_spool_keeps_small_content_in_memory():
+    spool = ContentSpool(max_bytes=100)
+    spool.write("abc")
+    spool.write("def")
+    assert spool.finish() == ("abcdef", None)
+
+
+def test_spool_moves_large_content_to_a_file_and_discards_it():
+    spool = ContentSpool(max_bytes=4, suffix=".css")
+    spool.write("abc")
+    spool.write("defgh")
+    content, path = spool.finish()
+    assert content is None and path.endswith(".css")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "abcdefgh"
+    spool.discard()
+    assert not os.path.exists(path)
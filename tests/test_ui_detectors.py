@@ -0,0 +1,52 @@
+import pytest
+
+from tools.ui_detectors import DEFAULT_ENGINE, detect_file, detect_per_pattern, synthetic_corpus
+
+SAMPLES = {
+    "react_component": "import React, { useState } from 'react';\n"
+                       "export const App = () => <div className=\"flex p-4 rounded\">hi</div>;\n",
+    "vue_sfc": "<template><div class=\"container\"></div></template>\n<script setup>\nimport { ref } from 'vue'\n</script>\n",
+    "svelte_component": "<script>let count = 0;</script>\n<button>{count}</button>\n<style>button { color: red; }</style>\n",
+    "astro_page": "---\nimport Layout from '../layouts/Layout.astro';\n---\n<html><body></body></html>\n",
+    "styled_components": "const Button = styled(Base)`\n  color: red;\n`;\nconst Title = styled.h1`font-size: 2em;`;\n",
+    "animations": "@keyframes fade { from { opacity: 0 } }\n.x { transition: opacity .2s; transform: scale(1); }\n"
+                  "gsap.to('.box', { x: 100 }); requestAnimationFrame(loop);\n",
+    "no_ui": "def main():\n    return 42\n",
+    "empty": "",
+    "mixed_case": "IMPORT REACT FROM 'REACT'; THREE.Scene(); ScrollTrigger.create();\n",
+}
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+def test_engine_matches_per_pattern_reference(name):
+    content = SAMPLES[name]
+    assert DEFAULT_ENGINE.detect(content) == detect_per_pattern(content)
+
+
+def test_engine_matches_reference_on_synthetic_corpus():
+    for _, content in synthetic_corpus(files=4, blocks=200):
+        assert DEFAULT_ENGINE.detect(content) == detect_per_pattern(content)
+
+
+def test_skipped_detectors_are_not_reported():
+    content = SAMPLES["react_component"]
+    assert "react" in DEFAULT_ENGINE.detect(content)["frameworks"]
+    assert "react" not in DEFAULT_ENGINE.detect(content, skip=[("frameworks", "react")])["frameworks"]
+
+
+def test_detect_file_tokenizes_stylesheets_from_raw_bytes():
+    content = ":root { --brand: #04f; }\n@media (max-width: 768px) { .a { color: var(--brand); } }\n"
+    from_text = detect_file(content, ".css")
+    from_bytes = detect_file(content, ".css", raw=content.encode("utf-8"))
+    assert from_text == from_bytes
+    assert from_text["custom_properties"] is True
+    assert from_text["media_queries"]
+
+
+@pytest.mark.parametrize("name, family, detector", [
+    ("svelte_component", "frameworks", "svelte"),
+    ("astro_page", "frameworks", "astro"),
+    ("styled_components", "ui_libraries", "styled-components"),
+])
+def test_structural_checks_find_what_the_legacy_regexes_found(name, family, detector):
+    assert detector in DEFAULT_ENGINE.detect(SAMPLES[name])[family]
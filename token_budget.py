@@ -0,0 +1,160 @@
+import json
+import os
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Prompt budgets in tokens; 0 disables compaction for that phase
+DEFAULT_PHASE_BUDGETS = {
+    "opportunities": 12000,
+    "plan": 16000,
+    "summary": 8000
+}
+
+# Compaction levels, each stricter than the last. Level 0 is the caller's own rendering; level 1
+# drops indentation and duplicates; later levels cap list lengths and string sizes.
+COMPACTION_LEVELS = [
+    None,
+    {"max_items": None, "max_chars": None},
+    {"max_items": 50, "max_chars": 400},
+    {"max_items": 20, "max_chars": 200},
+    {"max_items": 10, "max_chars": 120},
+    {"max_items": 5, "max_chars": 80},
+    {"max_items": 3, "max_chars": 60}
+]
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken's cl100k_base when installed, else an estimate of 4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def get_phase_budget(phase: str) -> int:
+    """Budget for phase from PROMPT_BUDGET_<PHASE>, else PROMPT_BUDGET_DEFAULT, else the built-in default."""
+    value = os.getenv(f"PROMPT_BUDGET_{phase.upper()}") or os.getenv("PROMPT_BUDGET_DEFAULT")
+    if value:
+        return int(value)
+    return DEFAULT_PHASE_BUDGETS.get(phase, 0)
+
+
+def _summarize_omitted(items: list) -> str:
+    """Marker for list items cut by compaction; omitted paths are summarized by directory."""
+    marker = f"... {len(items)} more"
+    if items and all(isinstance(item, str) and "/" in item for item in items):
+        directories = Counter(item.rsplit("/", 1)[0] for item in items)
+        marker += " (" + ", ".join(f"{directory}/: {count}" for directory, count in directories.most_common(5))
+        if len(directories) > 5:
+            marker += f", {len(directories) - 5} more directories"
+        marker += ")"
+    return marker
+
+
+def compact_value(value: Any, max_items: Optional[int] = None, max_chars: Optional[int] = None) -> Any:
+    """
+    Shrink a JSON-compatible value: duplicate list items are dropped, lists and scalar-valued dicts
+    beyond max_items are cut with a marker saying what was left out, and strings beyond max_chars
+    are truncated.
+    """
+    if isinstance(value, dict):
+        items = [(key, compact_value(item, max_items, max_chars)) for key, item in value.items()]
+        scalar_valued = all(not isinstance(item, (dict, list)) for _, item in items)
+        if max_items is not None and scalar_valued and len(items) > max_items:
+            omitted = len(items) - max_items
+            items = items[:max_items] + [("...", f"{omitted} more")]
+        return dict(items)
+    if isinstance(value, list):
+        unique = []
+        seen = set()
+        for item in value:
+            marker = json.dumps(item, sort_keys=True, default=str)
+            if marker not in seen:
+                seen.add(marker)
+                unique.append(item)
+        kept = unique if max_items is None else unique[:max_items]
+        compacted = [compact_value(item, max_items, max_chars) for item in kept]
+        if len(kept) < len(unique):
+            compacted.append(_summarize_omitted(unique[len(kept):]))
+        return compacted
+    if isinstance(value, str) and max_chars is not None and len(value) > max_chars:
+        return value[:max_chars] + f"... ({len(value) - max_chars} more chars)"
+    return value
+
+
+def render_section(value: Any, level: int, indent: Optional[int] = None) -> str:
+    settings = COMPACTION_LEVELS[level]
+    if settings is None:
+        return json.dumps(value, indent=indent)
+    return json.dumps(compact_value(value, **settings), separators=(",", ":"))
+
+
+def fit_prompt(phase: str, render: Callable[[Dict[str, str]], str], sections: Dict[str, Any],
+               indents: Optional[Dict[str, int]] = None, budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build a prompt whose variable sections are compacted until it fits the phase's token budget.
+
+    Sections start out rendered as before (json.dumps with the given indent). While the prompt is
+    over budget, the largest section that can still shrink moves to the next compaction level.
+
+    Args:
+        phase (str): Budget name, e.g. "plan".
+        render: Builds the prompt from the rendered section strings.
+        sections: Section name to JSON-compatible value.
+        indents: Indentation for a section at level 0 (default: none).
+        budget: Token budget; defaults to get_phase_budget(phase).
+
+    Returns:
+        Tuple of (prompt, report with the token counts before and after compaction per section).
+    """
+    indents = indents or {}
+    budget = get_phase_budget(phase) if budget is None else budget
+    levels = {name: 0 for name in sections}
+    rendered = {name: render_section(value, 0, indents.get(name)) for name, value in sections.items()}
+    sizes = {name: count_tokens(text) for name, text in rendered.items()}
+    before = dict(sizes)
+    prompt = render(rendered)
+    tokens_before = tokens = count_tokens(prompt)
+
+    while budget > 0 and tokens > budget:
+        shrinkable = [name for name in sections if levels[name] < len(COMPACTION_LEVELS) - 1]
+        if not shrinkable:
+            break
+        name = max(shrinkable, key=lambda section: sizes[section])
+        levels[name] += 1
+        rendered[name] = render_section(sections[name], levels[name])
+        sizes[name] = count_tokens(rendered[name])
+        prompt = render(rendered)
+        tokens = count_tokens(prompt)
+
+    report = {
+        "phase": phase,
+        "budget": budget,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens,
+        "within_budget": budget <= 0 or tokens <= budget,
+        "sections": {
+            name: {"tokens_before": before[name], "tokens_after": sizes[name], "level": levels[name]}
+            for name in sections
+        }
+    }
+    return prompt, report
+
+
+def describe_budget(report: Dict[str, Any]) -> str:
+    """One log line for a fit_prompt report."""
+    if report["tokens_before"] == report["tokens_after"]:
+        return f"Prompt for {report['phase']}: {report['tokens_after']} tokens (budget {report['budget']})"
+    compacted = ", ".join(f"{name} {sizes['tokens_before']}->{sizes['tokens_after']}"
+                          for name, sizes in report["sections"].items() if sizes["level"])
+    status = "" if report["within_budget"] else ", still over budget"
+    return (f"Prompt for {report['phase']} compacted from {report['tokens_before']} to {report['tokens_after']} "
+            f"tokens (budget {report['budget']}{status}; {compacted})")
@@ -1,12 +1,46 @@
-from .analyze_ui_capabilities import analyze_ui_capabilities
-from .analyze_ui_capabilities import analyze_ui_capabilities
-from .directory_tree import get_directory_tree
-from .file_content_fetcher import get_file_content
-from .generate_enhancement_plan import generate_enhancement_plan
-from .git_clone import git_clone
-from .identify_enhancement_opportunities import identify_enhancement_opportunities
-from .introduce_new_ui_features import introduce_new_ui_feature
-from .modify_ui_file import modify_ui_file
-from .revert_ui_changes import revert_ui_changes
-from .scan_for_ui_files import scan_for_ui_files
-from .verify_ui_changes import verify_ui_changes
+import importlib
+from typing import Any, List
+
+# Public name -> submodule that defines it. Submodules (and langchain.tools behind the @tool
+# wrappers) are imported on first attribute access, so importing the package stays cheap.
+_EXPORTS = {
+    "analyze_ui_capabilities": "analyze_ui_capabilities",
+    "get_directory_tree": "directory_tree",
+    "EDIT_FORMAT_INSTRUCTIONS": "edit_protocol",
+    "try_apply_edits": "edit_protocol",
+    "get_file_content": "file_content_fetcher",
+    "generate_enhancement_plan": "generate_enhancement_plan",
+    "git_clone": "git_clone",
+    "identify_enhancement_opportunities": "identify_enhancement_opportunities",
+    "introduce_new_ui_feature": "introduce_new_ui_features",
+    "modify_ui_file": "modify_ui_file",
+    "REGION_FORMAT_INSTRUCTIONS": "region_chunker",
+    "format_outline": "region_chunker",
+    "format_regions": "region_chunker",
+    "select_regions": "region_chunker",
+    "split_regions": "region_chunker",
+    "try_splice_regions": "region_chunker",
+    "revert_ui_changes": "revert_ui_changes",
+    "scan_for_ui_files": "scan_for_ui_files",
+    "ContentSpool": "stream_validation",
+    "FenceStripper": "stream_validation",
+    "IncrementalStructureValidator": "stream_validation",
+    "StreamAborted": "stream_validation",
+    "verify_ui_changes": "verify_ui_changes"
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    # Cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,164 @@
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ui_detectors import SOURCE_EXTENSIONS, detect_file
+
+# Families whose per-file hit rates drive the stopping rule
+SAMPLED_FAMILIES = ["frameworks", "ui_libraries", "animations"]
+
+# z for a 95% Wilson score interval
+WILSON_Z = 1.96
+
+
+def get_sampling_config() -> Dict[str, Any]:
+    """Read the adaptive sampler settings from the environment."""
+    return {
+        "max_files": int(os.getenv('UI_SAMPLE_MAX_FILES', '2000')),
+        "time_budget_s": float(os.getenv('UI_SAMPLE_TIME_BUDGET_S', '20')),
+        "tolerance": float(os.getenv('UI_SAMPLE_TOLERANCE', '0.1')),
+        "min_files": int(os.getenv('UI_SAMPLE_MIN_FILES', '30')),
+        "workers": int(os.getenv('UI_SAMPLE_WORKERS', '0')) or (os.cpu_count() or 1),
+        "seed": int(os.getenv('UI_SAMPLE_SEED', '0'))
+    }
+
+
+def wilson_half_width(hits: int, n: int, z: float = WILSON_Z) -> float:
+    """Half-width of the Wilson score interval for hits successes out of n trials."""
+    if n == 0:
+        return 1.0
+    p = hits / n
+    denominator = 1 + z * z / n
+    return z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+
+
+def _detect_path(repo_dir: str, path: str, extension: str,
+                 skip: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+    # Runs in a worker process
+    try:
+        with open(os.path.join(repo_dir, path), 'rb') as f:
+            raw = f.read()
+        return detect_file(raw.decode('utf-8'), extension, skip=skip, raw=raw)
+    except Exception as e:
+        # Skip files that can't be analyzed
+        print(e)
+        return None
+
+
+def _stratified_order(ui_files: Dict[str, List[Dict[str, Any]]], seed: int) -> List[Dict[str, Any]]:
+    """
+    Order files so that any prefix is a stratified random sample.
+
+    Files are grouped by (aspect, extension), shuffled within each stratum, and then dealt
+    round-robin across strata so small strata are represented from the first round on.
+    """
+    rng = random.Random(seed)
+    strata = {}
+    for aspect, files in sorted(ui_files.items()):
+        for file_info in files:
+            strata.setdefault((aspect, file_info["extension"]), []).append(file_info)
+
+    queues = []
+    for key in sorted(strata):
+        files = sorted(strata[key], key=lambda file_info: file_info["path"])
+        rng.shuffle(files)
+        queues.append(files)
+
+    ordered = []
+    depth = 0
+    while queues:
+        queues = [files for files in queues if len(files) > depth]
+        ordered.extend(files[depth] for files in queues)
+        depth += 1
+    return ordered
+
+
+def _max_half_width(detections: List[Dict[str, Any]]) -> float:
+    """Widest Wilson interval over every detector seen so far (unseen detectors are all-zero)."""
+    n = len(detections)
+    counts = {}
+    for hits in detections:
+        for family in SAMPLED_FAMILIES:
+            for name in hits.get(family, []):
+                counts[(family, name)] = counts.get((family, name), 0) + 1
+    # Unseen detectors have zero hits, whose interval is never wider than any seen one
+    widths = [wilson_half_width(count, n) for count in counts.values()] or [wilson_half_width(0, n)]
+    return max(widths)
+
+
+def sample_detections(repo_dir: str, ui_files: Dict[str, List[Dict[str, Any]]],
+                      skip: Optional[List[Tuple[str, str]]] = None,
+                      config: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Run the UI detectors over a stratified random sample of files until the estimates are tight enough.
+
+    Files are processed in rounds on a process pool. After each round the per-file hit rate of every
+    detector gets a 95% Wilson interval; sampling stops once all of them are narrower than the
+    tolerance (and at least min_files were examined), or when the file or time budget runs out.
+
+    Args:
+        repo_dir (str): The root directory of the repository.
+        ui_files: Files by aspect, as returned by scan_for_ui_files.
+        skip: (family, name) detectors already settled elsewhere.
+        config: Sampler settings; defaults to get_sampling_config().
+
+    Returns:
+        Tuple of (per-file detector hits, sampling report). files_analyzed counts the files that
+        could be read, source_files_analyzed those of them with a SOURCE_EXTENSIONS extension.
+    """
+    config = {**get_sampling_config(), **(config or {})}
+    skip = list(skip or [])
+    started = time.perf_counter()
+
+    ordered = _stratified_order(ui_files, config["seed"])
+    limit = min(len(ordered), config["max_files"])
+    workers = max(1, min(config["workers"], limit or 1))
+    round_size = max(workers * 4, 8)
+
+    detections = []
+    source_files = 0
+    examined = 0
+    rounds = 0
+    stop_reason = "exhausted"
+    if limit:
+        # Spawned, not forked: the caller is a multithreaded asyncio process (executor threads, HTTP
+        # pool, sqlite connections), and a forked child can deadlock on a lock held by another thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            while examined < limit:
+                batch = ordered[examined:min(examined + round_size, limit)]
+                results = executor.map(_detect_path, [repo_dir] * len(batch),
+                                       [file_info["path"] for file_info in batch],
+                                       [file_info["extension"] for file_info in batch],
+                                       [skip] * len(batch))
+                for file_info, hits in zip(batch, results):
+                    if hits is not None:
+                        detections.append(hits)
+                        source_files += file_info["extension"] in SOURCE_EXTENSIONS
+                examined += len(batch)
+                rounds += 1
+
+                if examined >= config["min_files"] and _max_half_width(detections) <= config["tolerance"]:
+                    stop_reason = "converged"
+                    break
+                if time.perf_counter() - started >= config["time_budget_s"]:
+                    stop_reason = "time_budget"
+                    break
+            else:
+                if limit < len(ordered):
+                    stop_reason = "file_budget"
+
+    report = {
+        "files_examined": examined,
+        "files_analyzed": len(detections),
+        "source_files_analyzed": source_files,
+        "files_total": len(ordered),
+        "rounds": rounds,
+        "stop_reason": stop_reason,
+        "max_interval_half_width": round(_max_half_width(detections), 4),
+        "elapsed_seconds": round(time.perf_counter() - started, 3)
+    }
+    return detections, report
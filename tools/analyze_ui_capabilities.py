@@ -1,9 +1,11 @@
 import json
-import os
-import re
 
 from langchain.tools import tool
 
+from .adaptive_sampler import sample_detections
+from .manifest_detector import detect_from_manifests, settled_detectors
+from .ui_detectors import ANIMATION_PATTERNS, FRAMEWORK_PATTERNS, SOURCE_EXTENSIONS, UI_LIBRARY_PATTERNS
+
 
 @tool
 def analyze_ui_capabilities(repo_dir: str, ui_files_json: str) -> str:
@@ -20,36 +22,6 @@ def analyze_ui_capabilities(repo_dir: str, ui_files_json: str) -> str:
     ui_data = json.loads(ui_files_json)
     ui_files = ui_data.get("ui_files", {})
 
-    # Framework detection patterns
-    frameworks = {
-        'react': [r'import\s+React|from\s+[\'"]react[\'"]|ReactDOM|useState|useEffect'],
-        'vue': [r'import\s+Vue|from\s+[\'"]vue[\'"]|createApp|<template>|<script setup>'],
-        'angular': [r'import\s+{\s*Component\s*}|@Component|@Angular|NgModule'],
-        'svelte': [r'<script>.*?</script>.*?<style', r'from\s+[\'"]svelte[\'"]'],
-        'astro': [r'---.*?---.*?<html', r'from\s+[\'"]astro[\'"]'],
-        'nextjs': [r'import\s+{\s*useRouter\s*}\s+from\s+[\'"]next/router[\'"]|nextjs|getStaticProps'],
-        'nuxt': [r'from\s+[\'"]nuxt[\'"]|defineNuxtConfig|useNuxtApp'],
-    }
-
-    # UI library detection patterns
-    ui_libraries = {
-        'tailwind': [r'tailwind|className=[\'"][^\'"]*(flex|grid|bg-|text-|p-|m-|rounded)[^\'"]*[\'"]'],
-        'bootstrap': [r'bootstrap|class=[\'"][^\'"]*(btn|container|row|col|navbar)[^\'"]*[\'"]'],
-        'material-ui': [r'@mui|@material-ui|makeStyles|createTheme|ThemeProvider'],
-        'chakra-ui': [r'@chakra-ui|ChakraProvider|useDisclosure'],
-        'styled-components': [r'styled\.|createGlobalStyle|css`|styled\([^\)]+\)`'],
-        'framer-motion': [r'framer-motion|motion\.|animate|useAnimation|AnimatePresence'],
-        'gsap': [r'gsap|TweenMax|TimelineMax|ScrollTrigger'],
-        'three': [r'three\.js|THREE\.|Scene|WebGLRenderer|PerspectiveCamera'],
-    }
-
-    # Animation/transition patterns
-    animation_patterns = {
-        'css': [r'@keyframes|animation:|transition:|transform:'],
-        'js': [r'requestAnimationFrame|animate\(|\.to\(|\.from\(|\.fromTo\('],
-        'libraries': [r'gsap|anime\.|motion\.|framer|lottie|velocity']
-    }
-
     # Results
     ui_analysis = {
         "framework": {
@@ -81,84 +53,102 @@ def analyze_ui_capabilities(repo_dir: str, ui_files_json: str) -> str:
         }
     }
 
-    # Sample a subset of files from each category for deeper analysis
-    sample_files = []
-    for aspect, files in ui_files.items():
-        # Take up to 5 files from each aspect
-        sample_files.extend(files[:5])
+    # Frameworks and libraries declared in package manifests are settled without reading any source
+    manifest_detection = ui_data.get("summary", {}).get("manifest_detection")
+    if manifest_detection is None:
+        manifests = ui_data.get("summary", {}).get("repository_structure", {}).get("manifests")
+        manifest_detection = detect_from_manifests(repo_dir, manifests)
+    settled = settled_detectors(manifest_detection)
+
+    for framework in manifest_detection["frameworks"]:
+        ui_analysis["framework"]["detected"].append(framework)
+        ui_analysis["framework"]["confidence"][framework] = 100
+    for library in manifest_detection["ui_libraries"]:
+        ui_analysis["ui_libraries"]["detected"].append(library)
+        ui_analysis["ui_libraries"]["confidence"][library] = 100
+
+    ui_analysis["manifest_detection"] = manifest_detection
+
+    # Files scanned in fused mode already carry their detector hits, so no file is read again
+    all_files = [file_info for files in ui_files.values() for file_info in files]
+    fused = bool(all_files) and all("detectors" in file_info for file_info in all_files)
+
+    if fused:
+        detections = [file_info["detectors"] for file_info in all_files]
+        source_files = sum(1 for file_info in all_files if file_info["extension"] in SOURCE_EXTENSIONS)
+        ui_analysis["analysis_coverage"] = {
+            "mode": "fused",
+            "files_examined": len(detections),
+            "source_files_analyzed": source_files,
+            "files_total": len(all_files)
+        }
+    else:
+        # Stratified random sample, stopped early once every detector's hit rate is estimated tightly
+        detections, sampling = sample_detections(repo_dir, ui_files, skip=settled)
+        source_files = sampling["source_files_analyzed"]
+        ui_analysis["analysis_coverage"] = {"mode": "sampled", **sampling}
+    # Confidence is the share of analyzed markup/script files with a hit; stylesheets, assets and
+    # unreadable files would only dilute it. Repositories without such files fall back to every file.
+    sample_size = source_files or len(detections)
 
     # Framework detection counters
-    framework_counts = {framework: 0 for framework in frameworks}
-    library_counts = {library: 0 for library in ui_libraries}
-    animation_counts = {anim_type: 0 for anim_type in animation_patterns}
+    framework_counts = {framework: 0 for framework in FRAMEWORK_PATTERNS}
+    library_counts = {library: 0 for library in UI_LIBRARY_PATTERNS}
+    animation_counts = {anim_type: 0 for anim_type in ANIMATION_PATTERNS}
 
-    # Media queries for responsive design
+    # Media queries and breakpoints for responsive design
     media_queries = []
-
-    # Analyze sampled files
-    for file_info in sample_files:
-        try:
-            file_path = os.path.join(repo_dir, file_info["path"])
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # Framework detection
-            for framework, patterns in frameworks.items():
-                for pattern in patterns:
-                    if re.search(pattern, content, re.IGNORECASE | re.DOTALL):
-                        framework_counts[framework] += 1
-                        break
-
-            # UI library detection
-            for library, patterns in ui_libraries.items():
-                for pattern in patterns:
-                    if re.search(pattern, content, re.IGNORECASE | re.DOTALL):
-                        library_counts[library] += 1
-                        break
-
-            # Animation detection
-            for anim_type, patterns in animation_patterns.items():
-                for pattern in patterns:
-                    if re.search(pattern, content, re.IGNORECASE | re.DOTALL):
-                        animation_counts[anim_type] += 1
-                        break
-
-            # Extract media queries for responsive design
-            if file_info["extension"] in ['.css', '.scss', '.less']:
-                media_query_matches = re.findall(r'@media\s*\([^)]+\)', content)
-                media_queries.extend(media_query_matches)
-
-                # Check for CSS variables (theme system)
-                if re.search(r'--[a-zA-Z0-9_-]+:', content):
-                    ui_analysis["theme_system"]["type"] = "css-variables"
-                    ui_analysis["theme_system"]["capabilities"].append("custom-properties")
-
-            # Look for performance optimizations
-            if "loading=" in content or "lazy" in content:
-                if "performance_optimization" not in ui_analysis["performance_optimization"]["techniques"]:
-                    ui_analysis["performance_optimization"]["techniques"].append("lazy-loading")
-
-            if "preload" in content or "prefetch" in content:
-                if "resource-hints" not in ui_analysis["performance_optimization"]["techniques"]:
-                    ui_analysis["performance_optimization"]["techniques"].append("resource-hints")
-
-        except Exception as e:
-            # Skip files that can't be analyzed
-            print(e)
-            continue
+    breakpoints = set()
+    custom_property_definitions = set()
+    custom_property_usages = set()
+    keyframes = set()
+    transition_properties = set()
+
+    # Aggregate per-file detector hits
+    budget_exceeded = {}
+    for hits in detections:
+        for detector in hits.get("budget_exceeded", []):
+            budget_exceeded[detector] = budget_exceeded.get(detector, 0) + 1
+
+        for framework in hits["frameworks"]:
+            framework_counts[framework] += 1
+        for library in hits["ui_libraries"]:
+            library_counts[library] += 1
+        for anim_type in hits["animations"]:
+            animation_counts[anim_type] += 1
+
+        media_queries.extend(hits["media_queries"])
+        breakpoints.update(hits.get("breakpoints", []))
+        custom_property_definitions.update(hits.get("custom_property_definitions", []))
+        custom_property_usages.update(hits.get("custom_property_usages", []))
+        keyframes.update(hits.get("keyframes", []))
+        transition_properties.update(hits.get("transition_properties", []))
+
+        if hits["custom_properties"]:
+            ui_analysis["theme_system"]["type"] = "css-variables"
+            if "custom-properties" not in ui_analysis["theme_system"]["capabilities"]:
+                ui_analysis["theme_system"]["capabilities"].append("custom-properties")
+
+        for technique in hits["performance"]:
+            if technique not in ui_analysis["performance_optimization"]["techniques"]:
+                ui_analysis["performance_optimization"]["techniques"].append(technique)
+
+    # Detectors that ran past the per-file time budget, with the number of files affected
+    if budget_exceeded:
+        ui_analysis["analysis_coverage"]["budget_exceeded"] = budget_exceeded
 
     # Process framework detection results
     for framework, count in framework_counts.items():
-        if count > 0:
-            confidence = min(count / len(sample_files) * 100, 100)
+        if count > 0 and framework not in manifest_detection["frameworks"]:
+            confidence = min(count / sample_size * 100, 100)
             if confidence > 20:  # Only include if confidence is reasonable
                 ui_analysis["framework"]["detected"].append(framework)
                 ui_analysis["framework"]["confidence"][framework] = round(confidence)
 
     # Process UI library detection results
     for library, count in library_counts.items():
-        if count > 0:
-            confidence = min(count / len(sample_files) * 100, 100)
+        if count > 0 and library not in manifest_detection["ui_libraries"]:
+            confidence = min(count / sample_size * 100, 100)
             if confidence > 20:  # Only include if confidence is reasonable
                 ui_analysis["ui_libraries"]["detected"].append(library)
                 ui_analysis["ui_libraries"]["confidence"][library] = round(confidence)
@@ -178,18 +168,19 @@ def analyze_ui_capabilities(repo_dir: str, ui_files_json: str) -> str:
     elif animation_counts["js"] > 0:
         ui_analysis["animation_system"]["capabilities"].append("javascript-based")
 
+    ui_analysis["animation_system"]["keyframes"] = sorted(keyframes)
+    ui_analysis["animation_system"]["transition_properties"] = sorted(transition_properties)
+    if custom_property_definitions or custom_property_usages:
+        ui_analysis["theme_system"]["custom_properties"] = {
+            "defined": len(custom_property_definitions),
+            "used": len(custom_property_usages),
+            "used_but_undefined": len(custom_property_usages - custom_property_definitions)
+        }
+
     # Determine responsive approach
     if len(media_queries) > 0:
         ui_analysis["responsive_design"]["approach"] = "media-queries"
-
-        # Extract breakpoints from media queries
-        breakpoints = set()
-        for query in media_queries:
-            width_matches = re.findall(r'(max|min)-width:\s*(\d+)(px|rem|em)', query)
-            for match in width_matches:
-                breakpoints.add(f"{match[0]}-width-{match[1]}{match[2]}")
-
-        ui_analysis["responsive_design"]["breakpoints"] = list(breakpoints)
+        ui_analysis["responsive_design"]["breakpoints"] = sorted(breakpoints)
     elif "tailwind" in ui_analysis["ui_libraries"]["detected"]:
         ui_analysis["responsive_design"]["approach"] = "utility-classes"
 
@@ -0,0 +1,226 @@
+import mmap
+import re
+from typing import Any, Dict, List, Union
+
+Buffer = Union[str, bytes, bytearray, memoryview, mmap.mmap]
+
+# One alternation covers every token the extractor cares about, so a stylesheet is traversed once.
+# Unquoted url(...) is consumed whole so that "//" inside it is never taken for a line comment.
+_TOKEN_SOURCE = r"""
+    (?P<comment>/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<url>url\(\s*[^)"'\s]*\s*\))
+  | (?P<line_comment>//[^\n]*)
+  | (?P<at>@(?P<at_name>[-\w]+))
+  | (?P<open>\{)
+  | (?P<close>\})
+  | (?P<var>var\(\s*(?P<var_name>--[-\w]+))
+  | (?<![-\w.#$@])(?P<decl>--[-\w]+|transition(?:-property)?)\s*:
+"""
+# The leading lookahead lets the engine reject most positions on their first character.
+# Braces only matter inside @media blocks, so outside them a variant without brace tokens is used.
+_BLOCK_TOKEN_SOURCE = r"(?=[/\"'u@{}vt-])(?:" + _TOKEN_SOURCE + ")"
+_FLAT_TOKEN_SOURCE = (r"(?=[/\"'u@vt-])(?:"
+                      + _TOKEN_SOURCE.replace("| (?P<open>\\{)", "").replace("| (?P<close>\\})", "") + ")")
+_TOKENS_STR = (re.compile(_FLAT_TOKEN_SOURCE, re.S | re.X), re.compile(_BLOCK_TOKEN_SOURCE, re.S | re.X))
+_TOKENS_BYTES = (re.compile(_FLAT_TOKEN_SOURCE.encode('ascii'), re.S | re.X),
+                 re.compile(_BLOCK_TOKEN_SOURCE.encode('ascii'), re.S | re.X))
+
+# Breakpoints in classic (min-width: 600px) and range (width >= 600px, 40em < width) syntax
+_CLASSIC_BREAKPOINT = re.compile(r'(min|max)-width\s*:\s*(\d+(?:\.\d+)?)(px|rem|em)', re.I)
+_RANGE_BREAKPOINT_AFTER = re.compile(r'\bwidth\s*([<>]=?)\s*(\d+(?:\.\d+)?)(px|rem|em)', re.I)
+_RANGE_BREAKPOINT_BEFORE = re.compile(r'(\d+(?:\.\d+)?)(px|rem|em)\s*([<>]=?)\s*width\b', re.I)
+
+# Lines treated as comments only by preprocessor dialects; in plain CSS "//" is not a comment
+LINE_COMMENT_DIALECTS = {'scss', 'sass', 'less'}
+
+KEYFRAMES_AT_RULES = {'keyframes', '-webkit-keyframes', '-moz-keyframes', '-o-keyframes'}
+
+# Keywords of the transition shorthand that are not property names
+_TRANSITION_KEYWORDS = {'all', 'none', 'ease', 'ease-in', 'ease-out', 'ease-in-out', 'linear', 'step-start',
+                        'step-end', 'initial', 'inherit', 'unset', 'revert', 'normal', 'allow-discrete'}
+
+
+def _text(buffer: Buffer, start: int, end: int) -> str:
+    chunk = buffer[start:end]
+    if isinstance(chunk, str):
+        return chunk
+    return bytes(chunk).decode('utf-8', errors='replace')
+
+
+def _find_any(buffer: Buffer, chars: str, start: int, end: int) -> int:
+    """Position of the first of chars at or after start (end if none), skipping #{...} interpolation."""
+    if not isinstance(buffer, str):
+        targets = [char.encode('ascii') for char in chars]
+        interpolation = b"#{"
+        close = b"}"
+    else:
+        targets = list(chars)
+        interpolation = "#{"
+        close = "}"
+
+    pos = start
+    while True:
+        found = [index for index in (buffer.find(target, pos, end) for target in targets) if index != -1]
+        hit = min(found) if found else end
+        interpolated = buffer.find(interpolation, pos, end)
+        if interpolated == -1 or interpolated >= hit:
+            return hit
+        closing = buffer.find(close, interpolated + 2, end)
+        if closing == -1:
+            return end
+        pos = closing + 1
+
+
+def _split_top_level(text: str, separator: str = ',') -> List[str]:
+    parts = []
+    depth = 0
+    current = ""
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(0, depth - 1)
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _combine_queries(outer: str, inner: str) -> str:
+    """Effective query of a @media nested in another one: each comma branch of both, joined with "and"."""
+    return ", ".join(f"{o} and {i}" for o in _split_top_level(outer) for i in _split_top_level(inner))
+
+
+def breakpoints_from_query(query: str) -> List[str]:
+    """Return breakpoints such as "max-width-768px" named by a media query prelude."""
+    found = [(kind.lower(), value, unit) for kind, value, unit in _CLASSIC_BREAKPOINT.findall(query)]
+    found += [("min" if operator.startswith(">") else "max", value, unit)
+              for operator, value, unit in _RANGE_BREAKPOINT_AFTER.findall(query)]
+    found += [("min" if operator.startswith("<") else "max", value, unit)
+              for value, unit, operator in _RANGE_BREAKPOINT_BEFORE.findall(query)]
+
+    breakpoints = []
+    for kind, value, unit in found:
+        breakpoint = f"{kind}-width-{value}{unit.lower()}"
+        if breakpoint not in breakpoints:
+            breakpoints.append(breakpoint)
+    return breakpoints
+
+
+def _transition_properties(value: str, shorthand: bool) -> List[str]:
+    properties = []
+    for part in _split_top_level(value):
+        words = part.split()
+        if not words:
+            continue
+        # The longhand lists bare property names; the shorthand puts the property first in each part
+        name = words[0].lower() if shorthand else part.strip().lower()
+        if name in _TRANSITION_KEYWORDS or name[:1].isdigit() or '(' in name or name.startswith(('$', '@', '#{')):
+            continue
+        if name not in properties:
+            properties.append(name)
+    return properties
+
+
+def tokenize_css(buffer: Buffer, dialect: str = 'css') -> Dict[str, Any]:
+    """
+    Extract responsive, theme and animation facts from a stylesheet in a single traversal.
+
+    Args:
+        buffer: Stylesheet text as str, or any bytes-like buffer (bytes, memoryview, mmap) of UTF-8.
+        dialect (str): "css", "scss", "sass" or "less"; preprocessor dialects also skip // comments.
+
+    Returns:
+        Dict with media_queries (effective query of each @media, nested ones combined with their
+        parents), breakpoints, custom_property_definitions, custom_property_usages, keyframes and
+        transition_properties.
+    """
+    flat_search, block_search = (pattern.search for pattern in
+                                 (_TOKENS_STR if isinstance(buffer, str) else _TOKENS_BYTES))
+    line_comments = dialect in LINE_COMMENT_DIALECTS
+    end = len(buffer)
+
+    result = {
+        "media_queries": [],
+        "breakpoints": [],
+        "custom_property_definitions": [],
+        "custom_property_usages": [],
+        "keyframes": [],
+        "transition_properties": []
+    }
+    seen = {key: set() for key in result}
+
+    def add(key: str, value: str) -> None:
+        if value not in seen[key]:
+            seen[key].add(value)
+            result[key].append(value)
+
+    # One entry per block open inside the outermost @media: the effective media query in force inside it
+    stack = []
+    pending_query = None
+    pos = 0
+    while pos < end:
+        inside_media = stack or pending_query is not None
+        match = (block_search if inside_media else flat_search)(buffer, pos)
+        if not match:
+            break
+        kind = match.lastgroup
+        pos = match.end()
+
+        # Braces are by far the most frequent tokens, so they are handled first
+        if kind == "open":
+            stack.append(pending_query if pending_query is not None else stack[-1])
+            pending_query = None
+        elif kind == "close":
+            if stack:
+                stack.pop()
+            pending_query = None
+        elif kind == "line_comment" and not line_comments:
+            # Not a comment in plain CSS; rescan just past the first slash
+            pos = match.start() + 1
+        elif kind == "at":
+            at_name = _text(buffer, match.start("at_name"), match.end("at_name")).lower()
+            if at_name == "media":
+                prelude_end = _find_any(buffer, "{;", pos, end)
+                query = " ".join(_text(buffer, pos, prelude_end).split())
+                outer = stack[-1] if stack else None
+                if outer:
+                    query = _combine_queries(outer, query)
+                if query not in seen["media_queries"]:
+                    add("media_queries", query)
+                    for breakpoint in breakpoints_from_query(query):
+                        add("breakpoints", breakpoint)
+                # A prelude ending in ";" or at EOF opens no block
+                pending_query = query if buffer[prelude_end:prelude_end + 1] in ("{", b"{") else None
+                pos = prelude_end
+            elif at_name in KEYFRAMES_AT_RULES:
+                prelude_end = _find_any(buffer, "{;", pos, end)
+                name = _text(buffer, pos, prelude_end).strip().strip('"\'')
+                if name:
+                    add("keyframes", name)
+                pos = prelude_end
+        elif kind == "var":
+            add("custom_property_usages", _text(buffer, match.start("var_name"), match.end("var_name")))
+        elif kind == "decl":
+            name = _text(buffer, match.start("decl"), match.end("decl"))
+            if name.startswith("--"):
+                # The value is left to the main loop so var() usages inside it are still seen
+                add("custom_property_definitions", name)
+            else:
+                value_end = _find_any(buffer, ";}", pos, end)
+                value = _text(buffer, pos, value_end)
+                for prop in _transition_properties(value, shorthand=name.lower() == "transition"):
+                    add("transition_properties", prop)
+                for usage in re.findall(r'var\(\s*(--[-\w]+)', value):
+                    add("custom_property_usages", usage)
+                pos = value_end
+    return result
+
+
+def dialect_for_extension(extension: str) -> str:
+    return extension.lstrip('.').lower() if extension.lstrip('.').lower() in LINE_COMMENT_DIALECTS else 'css'
@@ -1,24 +1,79 @@
 import os
+from typing import Iterator, Optional
 
 from langchain.tools import tool
 
+from .repo_indexer import walk_repository
+
+# Defaults keep the rendered tree small enough to drop into a prompt
+DEFAULT_TREE_MAX_DEPTH = 6
+DEFAULT_TREE_MAX_ENTRIES = 2000
+DEFAULT_TREE_MAX_BYTES = 64 * 1024
+
+
+def iter_directory_tree(root_dir: str, max_depth: Optional[int] = None, max_entries: Optional[int] = None,
+                        max_bytes: Optional[int] = None) -> Iterator[str]:
+    """
+    Lazily yield the lines of a directory tree, sharing the indexer's pruned walk.
+
+    Ignored directories (node_modules, build output, .gitignore matches) are never entered, and
+    directories below max_depth are pruned before they are scanned. Nothing is walked until the
+    generator is consumed.
+
+    Args:
+        root_dir (str): The path to the root directory.
+        max_depth (int, optional): Deepest directory level listed; the root is level 0.
+        max_entries (int, optional): Maximum number of lines before the tree is truncated.
+        max_bytes (int, optional): Maximum UTF-8 size of the yielded lines before truncation.
+
+    Yields:
+        One line per directory ("name/") or file, indented four spaces per level, each ending in "\\n".
+        A final "... (truncated)" line is yielded if a limit cut the tree short.
+    """
+    root_name = os.path.basename(os.path.normpath(root_dir))
+    entries = 0
+    size = 0
+
+    def within_limits(line: str) -> bool:
+        nonlocal entries, size
+        entries += 1
+        size += len(line.encode('utf-8'))
+        return (max_entries is None or entries <= max_entries) and (max_bytes is None or size <= max_bytes)
+
+    for rel_dir, dirs, files in walk_repository(root_dir):
+        level = rel_dir.count("/") + 1 if rel_dir else 0
+        # Pruning the yielded list stops the walk from descending any further
+        if max_depth is not None and level >= max_depth:
+            dirs.clear()
+
+        indent = " " * 4 * level
+        line = f"{indent}{os.path.basename(rel_dir) if rel_dir else root_name}/\n"
+        if not within_limits(line):
+            yield "... (truncated)\n"
+            return
+        yield line
+
+        sub_indent = " " * 4 * (level + 1)
+        for entry in files:
+            line = f"{sub_indent}{entry.name}\n"
+            if not within_limits(line):
+                yield "... (truncated)\n"
+                return
+            yield line
+
 
 @tool
-def get_directory_tree(root_dir: str) -> str:
+def get_directory_tree(root_dir: str, max_depth: int = DEFAULT_TREE_MAX_DEPTH,
+                       max_entries: int = DEFAULT_TREE_MAX_ENTRIES, max_bytes: int = DEFAULT_TREE_MAX_BYTES) -> str:
     """Generate a directory tree starting from the specified root directory.
 
     Args:
         root_dir (str): The path to the root directory.
+        max_depth (int): Deepest directory level listed; the root is level 0.
+        max_entries (int): Maximum number of lines before the tree is truncated.
+        max_bytes (int): Maximum size of the tree in bytes before it is truncated.
 
     Returns:
         str: A string representing the directory tree.
     """
-    tree = ""
-    for root, dirs, files in os.walk(root_dir):
-        level = root.replace(root_dir, "").count(os.sep)
-        indent = " " * 4 * level
-        tree += f"{indent}{os.path.basename(root)}/\n"
-        sub_indent = " " * 4 * (level + 1)
-        for f in files:
-            tree += f"{sub_indent}{f}\n"
-    return tree
+    return "".join(iter_directory_tree(root_dir, max_depth, max_entries, max_bytes))
@@ -0,0 +1,241 @@
+import difflib
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Instructions appended to an enhancement prompt in edit mode
+EDIT_FORMAT_INSTRUCTIONS = """
+Return ONLY the changes, as one or more search/replace blocks in exactly this format:
+
+<<<<<<< SEARCH
+(exact lines copied from the original file, including enough surrounding lines to be unique)
+=======
+(the lines that replace them)
+>>>>>>> REPLACE
+
+Rules:
+- Each SEARCH section must match the original file exactly and occur only once in it.
+- Keep blocks small: include only the lines that change plus a line or two of context.
+- Order blocks from the top of the file to the bottom and do not let them overlap.
+- To insert code, SEARCH for the line next to the insertion point and repeat it in REPLACE.
+- Do not include any explanation outside the blocks.
+"""
+
+_SEARCH_REPLACE_BLOCK = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$", re.DOTALL | re.MULTILINE)
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+# Minimum similarity for a fuzzy anchor, and the margin by which it must beat the runner-up
+FUZZY_THRESHOLD = 0.9
+FUZZY_MARGIN = 0.05
+
+
+class EditApplicationError(Exception):
+    """An edit could not be anchored unambiguously in the file."""
+
+
+def parse_search_replace_blocks(text: str) -> List[Tuple[str, str]]:
+    """Extract (search, replace) pairs from search/replace blocks."""
+    return [(search, replace) for search, replace in _SEARCH_REPLACE_BLOCK.findall(text)]
+
+
+def parse_unified_diff(text: str) -> List[Tuple[str, str]]:
+    """
+    Turn unified diff hunks into (search, replace) pairs.
+
+    Context and removed lines form the search text, context and added lines the replacement; the
+    hunk line numbers are ignored, since anchoring is done on content.
+    """
+    edits = []
+    search, replace = [], []
+    in_hunk = False
+
+    def flush():
+        if in_hunk and (search or replace):
+            edits.append(("".join(search), "".join(replace)))
+
+    for line in text.splitlines(keepends=True):
+        if _HUNK_HEADER.match(line):
+            flush()
+            search, replace = [], []
+            in_hunk = True
+        elif not in_hunk or line.startswith(("--- ", "+++ ", "diff ", "index ")):
+            continue
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        elif line.startswith(" "):
+            search.append(line[1:])
+            replace.append(line[1:])
+        elif line.strip() == "":
+            search.append("\n")
+            replace.append("\n")
+        elif line.startswith("\\"):
+            # "\ No newline at end of file"
+            continue
+        else:
+            flush()
+            search, replace = [], []
+            in_hunk = False
+    flush()
+    return edits
+
+
+def parse_edits(text: str) -> List[Tuple[str, str]]:
+    """Parse a model response in either search/replace or unified diff form."""
+    edits = parse_search_replace_blocks(text)
+    if edits:
+        return edits
+    return parse_unified_diff(text)
+
+
+def _line_offsets(lines: List[str]) -> List[int]:
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _reindent(replace: str, search_lines: List[str], matched_lines: List[str]) -> str:
+    """
+    Carry the file's indentation over to a replacement written with the model's indentation.
+
+    Each indentation used in the search text is mapped to the indentation of the line it matched;
+    replacement lines with an unmapped indentation are shifted like the first non-blank line.
+    """
+    indent_map = {}
+    for searched, matched in zip(search_lines, matched_lines):
+        if searched.strip() and matched.strip():
+            indent_map.setdefault(_indent(searched), _indent(matched))
+    if not indent_map or all(old == new for old, new in indent_map.items()):
+        return replace
+    first_old, first_new = next(iter(indent_map.items()))
+
+    adjusted = []
+    for line in replace.splitlines(keepends=True):
+        indent = _indent(line)
+        if not line.strip():
+            adjusted.append(line)
+        elif indent in indent_map:
+            adjusted.append(indent_map[indent] + line[len(indent):])
+        elif line.startswith(first_old):
+            adjusted.append(first_new + line[len(first_old):])
+        else:
+            adjusted.append(line)
+    return "".join(adjusted)
+
+
+def locate_edit(content: str, search: str) -> Tuple[int, int, str]:
+    """
+    Anchor search text in content.
+
+    Tries an exact match, then a match ignoring per-line leading/trailing whitespace, then a fuzzy
+    line-window match. Each stage only succeeds when the anchor is unique.
+
+    Returns:
+        (start offset, end offset, method) of the matched region.
+
+    Raises:
+        EditApplicationError: If the text is empty, ambiguous or not found.
+    """
+    if not search.strip():
+        raise EditApplicationError("empty SEARCH section")
+
+    count = content.count(search)
+    if count == 1:
+        start = content.index(search)
+        return start, start + len(search), "exact"
+    if count > 1:
+        raise EditApplicationError(f"SEARCH section matches {count} places")
+
+    lines = content.splitlines(keepends=True)
+    offsets = _line_offsets(lines)
+    search_lines = search.splitlines(keepends=True)
+    # Blank lines at the edges of a block are often added or dropped by the model
+    while search_lines and not search_lines[0].strip():
+        search_lines.pop(0)
+    while search_lines and not search_lines[-1].strip():
+        search_lines.pop()
+    size = len(search_lines)
+    if size == 0 or size > len(lines):
+        raise EditApplicationError("SEARCH section not found")
+
+    stripped_search = [line.strip() for line in search_lines]
+    stripped_lines = [line.strip() for line in lines]
+    matches = [i for i in range(len(lines) - size + 1) if stripped_lines[i:i + size] == stripped_search]
+    if len(matches) == 1:
+        i = matches[0]
+        return offsets[i], offsets[i + size], "whitespace"
+    if len(matches) > 1:
+        raise EditApplicationError(f"SEARCH section matches {len(matches)} places (ignoring whitespace)")
+
+    # Fuzzy: compare the block with every window of the same number of lines
+    target = "\n".join(stripped_search)
+    scored = []
+    for i in range(len(lines) - size + 1):
+        window = "\n".join(stripped_lines[i:i + size])
+        matcher = difflib.SequenceMatcher(None, target, window, autojunk=False)
+        if matcher.real_quick_ratio() < FUZZY_THRESHOLD or matcher.quick_ratio() < FUZZY_THRESHOLD:
+            continue
+        scored.append((matcher.ratio(), i))
+    scored.sort(reverse=True)
+    if not scored or scored[0][0] < FUZZY_THRESHOLD:
+        raise EditApplicationError("SEARCH section not found")
+    best_score, i = scored[0]
+    # Windows overlapping the best one are the same anchor shifted by a line, not competitors
+    rivals = [score for score, j in scored[1:] if abs(j - i) >= size]
+    if rivals and best_score - rivals[0] < FUZZY_MARGIN:
+        raise EditApplicationError("SEARCH section has no unique fuzzy match")
+    return offsets[i], offsets[i + size], "fuzzy"
+
+
+def apply_edits(content: str, edits: List[Tuple[str, str]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Apply (search, replace) edits in order, each anchored in the result of the previous ones.
+
+    Returns:
+        (new content, one report entry per edit with the anchoring method).
+
+    Raises:
+        EditApplicationError: If any edit fails to anchor; nothing is applied in that case.
+    """
+    if not edits:
+        raise EditApplicationError("no edits found in the response")
+
+    report = []
+    for number, (search, replace) in enumerate(edits, start=1):
+        try:
+            start, end, method = locate_edit(content, search)
+        except EditApplicationError as e:
+            raise EditApplicationError(f"edit {number}: {e}") from None
+
+        matched = content[start:end]
+        if method != "exact":
+            replace = _reindent(replace, search.splitlines(keepends=True), matched.splitlines(keepends=True))
+        # Keep the file's line ending after the region when the model dropped it
+        if matched.endswith("\n") and replace and not replace.endswith("\n"):
+            replace += "\n"
+        content = content[:start] + replace + content[end:]
+        report.append({"edit": number, "method": method, "start": start})
+    return content, report
+
+
+def try_apply_edits(content: str, response: str) -> Tuple[Optional[str], str]:
+    """
+    Parse a model response and apply its edits to content.
+
+    Returns:
+        (new content, summary) on success, or (None, reason) when the response has no usable edits.
+    """
+    try:
+        new_content, report = apply_edits(content, parse_edits(response))
+    except EditApplicationError as e:
+        return None, str(e)
+    methods = {}
+    for entry in report:
+        methods[entry["method"]] = methods.get(entry["method"], 0) + 1
+    return new_content, f"applied {len(report)} edits ({', '.join(f'{count} {method}' for method, count in methods.items())})"
@@ -0,0 +1,74 @@
+from typing import Dict, List, Set, Union
+
+# Non-ASCII characters that re.IGNORECASE treats as equal to an ASCII letter
+_RE_IGNORECASE_FOLDS = {0x130: 'i', 0x131: 'i', 0x17F: 's', 0x212A: 'k'}
+
+
+def regex_fold_lower(text: str) -> str:
+    """Lowercase text so ASCII substring checks agree with re.IGNORECASE matching."""
+    if text.isascii():
+        return text.lower()
+    return text.translate(_RE_IGNORECASE_FOLDS).lower()
+
+
+class KeywordMatcher:
+    """
+    Find which of a fixed set of ASCII keywords occur in a text, case-insensitively.
+
+    Built once per scan. Each text is lowercased and split in a single C-level pass: bytes.translate
+    maps uppercase to lowercase and every character that cannot appear in a keyword to a space,
+    so any keyword occurrence lies inside one of the resulting runs. Keywords are then looked up
+    in the (small) set of distinct runs instead of scanning the whole text once per keyword.
+    """
+
+    def __init__(self, keywords_by_group: Dict[str, List[str]], regex_folding: bool = False):
+        """
+        Args:
+            keywords_by_group: Keywords to look for, grouped (e.g. by UI aspect).
+            regex_folding (bool): Match the way re.IGNORECASE does (e.g. "ſ" matches "s") instead of
+                the default str.lower() comparison.
+        """
+        self.regex_folding = regex_folding
+        self.keywords_by_group = {group: [kw.lower() for kw in keywords]
+                                  for group, keywords in keywords_by_group.items()}
+        keywords = {kw for group_keywords in self.keywords_by_group.values() for kw in group_keywords}
+        if not all(kw and kw.isascii() and not any(c.isspace() for c in kw) for kw in keywords):
+            raise ValueError("KeywordMatcher only supports non-empty ASCII keywords without whitespace")
+
+        self._keywords = [(kw, kw.encode('ascii')) for kw in sorted(keywords)]
+
+        # Keep lowercase letters and any other character used by a keyword; everything else separates runs
+        alphabet = set(b"abcdefghijklmnopqrstuvwxyz") | {byte for _, encoded in self._keywords for byte in encoded}
+        table = bytearray(b" " * 256)
+        for byte in alphabet:
+            table[byte] = byte
+        for byte in b"ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+            if byte + 32 in alphabet:
+                table[byte] = byte + 32
+        self._table = bytes(table)
+
+    def _lower_non_ascii(self, text: str) -> bytes:
+        # str.lower() can map non-ASCII characters to ASCII letters (e.g. the Kelvin sign)
+        if self.regex_folding:
+            return regex_fold_lower(text).encode('utf-8')
+        return text.lower().encode('utf-8')
+
+    def find(self, text: Union[str, bytes]) -> Set[str]:
+        """Return the set of keywords present in text."""
+        if isinstance(text, str):
+            data = text.encode('utf-8')
+            if not data.isascii():
+                data = self._lower_non_ascii(text)
+        elif not text.isascii():
+            data = self._lower_non_ascii(text.decode('utf-8', errors='replace'))
+        else:
+            data = text
+
+        vocabulary = b"\n".join(set(data.translate(self._table).split()))
+        return {kw for kw, encoded in self._keywords if encoded in vocabulary}
+
+    def count_by_group(self, text: Union[str, bytes]) -> Dict[str, int]:
+        """Return the number of distinct keywords from each group present in text."""
+        found = self.find(text)
+        return {group: sum(1 for kw in keywords if kw in found)
+                for group, keywords in self.keywords_by_group.items()}
@@ -0,0 +1,163 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+MANIFEST_NAMES = ['package.json', 'package-lock.json', 'pnpm-lock.yaml']
+
+# npm packages that settle a framework or UI library detector
+PACKAGE_DETECTORS = {
+    'react': ('frameworks', 'react'),
+    'react-dom': ('frameworks', 'react'),
+    'vue': ('frameworks', 'vue'),
+    '@angular/core': ('frameworks', 'angular'),
+    'svelte': ('frameworks', 'svelte'),
+    '@sveltejs/kit': ('frameworks', 'svelte'),
+    'astro': ('frameworks', 'astro'),
+    'next': ('frameworks', 'nextjs'),
+    'nuxt': ('frameworks', 'nuxt'),
+    'tailwindcss': ('ui_libraries', 'tailwind'),
+    'bootstrap': ('ui_libraries', 'bootstrap'),
+    'react-bootstrap': ('ui_libraries', 'bootstrap'),
+    '@mui/material': ('ui_libraries', 'material-ui'),
+    '@material-ui/core': ('ui_libraries', 'material-ui'),
+    '@chakra-ui/react': ('ui_libraries', 'chakra-ui'),
+    'styled-components': ('ui_libraries', 'styled-components'),
+    'framer-motion': ('ui_libraries', 'framer-motion'),
+    'gsap': ('ui_libraries', 'gsap'),
+    'three': ('ui_libraries', 'three'),
+    '@react-three/fiber': ('ui_libraries', 'three'),
+}
+
+DEPENDENCY_SECTIONS = ['dependencies', 'devDependencies', 'peerDependencies', 'optionalDependencies']
+
+
+def _package_json_dependencies(data: Dict[str, Any]) -> Set[str]:
+    names = set()
+    for section in DEPENDENCY_SECTIONS:
+        deps = data.get(section)
+        if isinstance(deps, dict):
+            names.update(deps.keys())
+    return names
+
+
+def _package_lock_dependencies(data: Dict[str, Any]) -> Set[str]:
+    """Direct dependencies of the root and workspace packages in a v2/v3 package-lock.json."""
+    names = set()
+    for location, package in data.get("packages", {}).items():
+        # Entries under node_modules are installed (often transitive) packages, not the project's own
+        if "node_modules/" in location or not isinstance(package, dict):
+            continue
+        names.update(_package_json_dependencies(package))
+    return names
+
+
+def _pnpm_lock_dependencies(text: str) -> Set[str]:
+    """Direct dependencies listed under importers (or at top level in older lockfiles) of pnpm-lock.yaml."""
+    names = set()
+    section_indent = None
+    in_importers = False
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        key_match = re.match(r"\s*['\"]?([^'\":]+)['\"]?:", line)
+        if not key_match:
+            continue
+        key = key_match.group(1).strip()
+
+        if indent == 0:
+            in_importers = key == "importers"
+            section_indent = 0 if key in DEPENDENCY_SECTIONS else None
+            continue
+        if section_indent is not None and indent <= section_indent:
+            section_indent = None
+        if in_importers and key in DEPENDENCY_SECTIONS and indent == 4:
+            section_indent = indent
+            continue
+        if section_indent is not None and indent == section_indent + 2:
+            names.add(key)
+    return names
+
+
+def read_manifest_dependencies(repo_dir: str, manifest_path: str) -> Set[str]:
+    """
+    Read the direct dependency names declared in one manifest or lockfile.
+
+    Args:
+        repo_dir (str): The root directory of the repository.
+        manifest_path (str): Path of the manifest relative to repo_dir.
+
+    Returns:
+        Set of npm package names (empty if the file cannot be parsed).
+    """
+    full_path = os.path.join(repo_dir, manifest_path)
+    file_name = os.path.basename(manifest_path)
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if file_name == 'pnpm-lock.yaml':
+            return _pnpm_lock_dependencies(text)
+        data = json.loads(text)
+        if file_name == 'package-lock.json':
+            return _package_lock_dependencies(data)
+        return _package_json_dependencies(data)
+    except Exception as e:
+        print(f"Error reading manifest {manifest_path}: {e}")
+        return set()
+
+
+def find_manifests(repo_dir: str) -> List[str]:
+    """Find manifests and lockfiles with the indexer's pruned walk (node_modules is never entered)."""
+    from .repo_indexer import walk_repository
+
+    manifests = []
+    for rel_dir, _, file_entries in walk_repository(repo_dir):
+        for entry in file_entries:
+            if entry.name in MANIFEST_NAMES:
+                manifests.append(os.path.join(rel_dir, entry.name) if rel_dir else entry.name)
+    return sorted(manifests)
+
+
+def detect_from_manifests(repo_dir: str, manifest_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Detect frameworks and UI libraries from package manifests and lockfiles across a workspace.
+
+    Args:
+        repo_dir (str): The root directory of the repository.
+        manifest_paths (List[str], optional): Manifests relative to repo_dir; found with a pruned walk if omitted.
+
+    Returns:
+        Dict with "manifests" examined and, per family ("frameworks", "ui_libraries"), a map from
+        detector name to the manifests that declare it.
+    """
+    if manifest_paths is None:
+        manifest_paths = find_manifests(repo_dir)
+
+    result = {
+        "manifests": list(manifest_paths),
+        "frameworks": {},
+        "ui_libraries": {}
+    }
+    if not manifest_paths:
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(16, len(manifest_paths))) as executor:
+        dependency_sets = list(executor.map(lambda path: read_manifest_dependencies(repo_dir, path), manifest_paths))
+
+    for manifest_path, dependencies in zip(manifest_paths, dependency_sets):
+        for package in sorted(dependencies):
+            detector = PACKAGE_DETECTORS.get(package)
+            if not detector:
+                continue
+            family, name = detector
+            sources = result[family].setdefault(name, [])
+            if manifest_path not in sources:
+                sources.append(manifest_path)
+    return result
+
+
+def settled_detectors(manifest_result: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Return the (family, name) detectors a manifest result has already answered."""
+    return [(family, name) for family in ("frameworks", "ui_libraries") for name in manifest_result.get(family, {})]
@@ -4,6 +4,14 @@ import shutil
 
 from langchain.tools import tool
 
+from .stream_validation import IncrementalStructureValidator, StreamAborted
+
+# Extensions whose validate_syntax checks rewrite the whole content, so a spooled file is loaded for them
+WHOLE_CONTENT_EXTENSIONS = ('.js', '.jsx', '.astro')
+
+# Characters read at a time when validating a spooled file
+COPY_CHUNK_CHARS = 1024 * 1024
+
 
 def validate_syntax(file_path: str, content: str) -> tuple[bool, str, str]:
     """Validate file content for basic syntax errors."""
@@ -83,10 +91,32 @@ def validate_astro_file(content: str) -> tuple[bool, str]:
     return True, content
 
 
+def validate_content_file(content_path: str) -> str:
+    """
+    Check the brackets of a spooled file chunk by chunk, exactly as validate_syntax does.
+
+    Returns:
+        An error message, or "" if the content is valid.
+    """
+    validator = IncrementalStructureValidator(content_path)
+    try:
+        with open(content_path, 'r', encoding='utf-8') as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_CHARS), ""):
+                validator.feed(chunk)
+    except StreamAborted as e:
+        return f"Syntax error: {e}"
+    error = validator.finish()
+    return f"Syntax error: {error}" if error else ""
+
+
 @tool
-def modify_ui_file(repo_dir: str, file_path: str, enhancement_type: str, enhanced_content: str = None) -> str:
+def modify_ui_file(repo_dir: str, file_path: str, enhancement_type: str, enhanced_content: str = None,
+                   enhanced_content_file: str = None) -> str:
     """
     Modify a UI file to implement a specific enhancement.
+
+    Large generated content may be passed as enhanced_content_file, the path of a temporary file
+    holding it, instead of inline as enhanced_content.
     """
     full_path = os.path.join(repo_dir, file_path)
     if not os.path.exists(full_path):
@@ -102,12 +132,45 @@ def modify_ui_file(repo_dir: str, file_path: str, enhancement_type: str, enhance
         print(f"ERROR: Failed to create backup: {str(e)}")
         return json.dumps({"success": False, "error": f"Failed to create backup: {str(e)}"})
 
+    if enhanced_content_file and not file_path.endswith(WHOLE_CONTENT_EXTENSIONS):
+        # Large content is validated and copied in chunks, so it is never held in memory as a whole
+        try:
+            error_msg = validate_content_file(enhanced_content_file)
+            if error_msg:
+                print(f"WARNING: {error_msg}")
+                print("ERROR: Cannot fix syntax issues automatically, keeping original content")
+            else:
+                shutil.copyfile(enhanced_content_file, full_path)
+                print(f"Successfully copied enhanced content from {enhanced_content_file} to {file_path}")
+            return json.dumps({
+                "success": True,
+                "file_path": file_path,
+                "enhancement_type": enhancement_type,
+                "message": f"Successfully enhanced {file_path}",
+                "backup_created": True,
+                "backup_path": f"{file_path}.bak"
+            })
+        except Exception as e:
+            error_msg = f"Error enhancing {file_path}: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            try:
+                shutil.copy2(backup_path, full_path)
+                print(f"Successfully restored from backup")
+            except Exception as restore_error:
+                print(f"ERROR: Failed to restore from backup: {str(restore_error)}")
+            return json.dumps({"success": False, "error": error_msg})
+
     try:
         # Read the file content
         with open(full_path, 'r', encoding='utf-8') as f:
             original_content = f.read()
             print(f"Successfully read original content ({len(original_content)} bytes)")
 
+        if enhanced_content_file:
+            with open(enhanced_content_file, 'r', encoding='utf-8') as f:
+                enhanced_content = f.read()
+            print(f"Read enhanced content from {enhanced_content_file} for whole-content checks")
+
         # Determine what content to use - FIXED LOGIC HERE
         if enhanced_content is None or enhanced_content == "":
             print("WARNING: No enhanced content provided, using original content")
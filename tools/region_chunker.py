@@ -0,0 +1,277 @@
+import bisect
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+CSS_EXTENSIONS = {'.css', '.scss', '.less'}
+SCRIPT_EXTENSIONS = {'.js', '.jsx', '.ts', '.tsx'}
+
+# Dialects where "//" starts a comment
+LINE_COMMENT_EXTENSIONS = {'.scss', '.less'}
+
+# A top-level declaration in formatted JS/TS starts at column 0 with one of these
+_DECLARATION = re.compile(
+    r'^(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?'
+    r'(?P<keyword>import|function\*?|class|const|let|var|interface|type|enum)\b\s*(?P<name>[A-Za-z_$][\w$]*)?')
+_EXPORT_DEFAULT = re.compile(r'^export\s+default\b')
+_LEADING_TRIVIA = re.compile(r'^(?://|/\*|\*|@[A-Za-z])')
+
+_CSS_SPECIAL = re.compile(r'[{};"\'/]')
+_NESTED_PRELUDE = re.compile(r'([^{};]+)\{')
+_CSS_TERM = re.compile(r'-{0,2}[A-Za-z_][\w-]*')
+_WORD = re.compile(r'-{0,2}[A-Za-z_$][\w$-]*')
+
+# Words of at-rule preludes that say nothing about what a block styles
+_CSS_NOISE = {'media', 'supports', 'layer', 'container', 'screen', 'print', 'all', 'and', 'not', 'only',
+              'min-width', 'max-width', 'width', 'min-height', 'max-height', 'height', 'orientation',
+              'landscape', 'portrait', 'prefers-color-scheme', 'prefers-reduced-motion', 'dark', 'light',
+              'px', 'rem', 'em', 'hover', 'focus', 'active', 'before', 'after', 'root', 'import', 'charset', 'url'}
+
+MIN_TERM_LENGTH = 3
+
+REGION_FORMAT_INSTRUCTIONS = """
+Return every region you were given, enhanced, between the same markers, for example:
+
+<<<REGION 3>>>
+(the complete enhanced content of region 3)
+<<<END REGION 3>>>
+
+Rules:
+- Return each region exactly once, even if you leave it unchanged, and do not invent new region numbers.
+- New rules or declarations that belong near a region go inside that region.
+- Do not reproduce the parts of the file that are only listed in the outline.
+- Do not include any explanation outside the markers.
+"""
+
+_REGION_BLOCK = re.compile(r'<<<REGION (\d+)>>>[ \t]*\n?(.*?)\n?<<<END REGION \1>>>', re.DOTALL)
+
+
+def _skip_string(content: str, i: int) -> int:
+    """Index just past the string literal opening at i."""
+    quote = content[i]
+    i += 1
+    while i < len(content):
+        if content[i] == '\\':
+            i += 2
+            continue
+        if content[i] == quote or content[i] == '\n':
+            return i + 1
+        i += 1
+    return i
+
+
+def _css_regions(content: str, line_comments: bool) -> List[Dict[str, Any]]:
+    """Top-level rule blocks and statements of a stylesheet; leading comments belong to the block after them."""
+    regions = []
+    depth = 0
+    start = 0
+    prelude_end = None
+    i = 0
+    n = len(content)
+    while i < n:
+        # Jump straight to the next character that can matter
+        match = _CSS_SPECIAL.search(content, i)
+        if not match:
+            break
+        i = match.start()
+        char = content[i]
+        if char == '/' and content.startswith('/*', i):
+            close = content.find('*/', i + 2)
+            i = n if close == -1 else close + 2
+            continue
+        if char == '/' and line_comments and content.startswith('//', i) and (i == 0 or content[i - 1] != ':'):
+            close = content.find('\n', i)
+            i = n if close == -1 else close
+            continue
+        if char in ('"', "'"):
+            i = _skip_string(content, i)
+            continue
+        if char == '{':
+            if depth == 0:
+                prelude_end = i
+            depth += 1
+        elif char == '}' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                end = _line_end(content, i + 1)
+                regions.append(_css_region(content, start, prelude_end, end, "rule"))
+                start = end
+        elif char == ';' and depth == 0:
+            end = _line_end(content, i + 1)
+            regions.append(_css_region(content, start, end, end, "statement"))
+            start = end
+        i += 1
+    _append_tail(content, regions, start)
+    return regions
+
+
+def _line_end(content: str, i: int) -> int:
+    """Extend i over trailing spaces and one newline, so regions hold whole lines."""
+    while i < len(content) and content[i] in ' \t':
+        i += 1
+    if i < len(content) and content[i] == '\n':
+        i += 1
+    return i
+
+
+def _css_region(content: str, start: int, prelude_end: int, end: int, kind: str) -> Dict[str, Any]:
+    prelude = re.sub(r'/\*.*?\*/', ' ', content[start:prelude_end], flags=re.DOTALL)
+    name = " ".join(prelude.split()).rstrip(';')
+    terms_text = name
+    if name.startswith('@') and kind == "rule":
+        # Grouping at-rules are matched on the selectors nested inside them
+        terms_text += " " + " ".join(_NESTED_PRELUDE.findall(content[prelude_end + 1:end]))
+    if kind == "rule":
+        # Custom properties defined in the block make it relevant to changes that name them
+        terms_text += " " + " ".join(re.findall(r'(--[\w-]+)\s*:', content[prelude_end:end]))
+    terms = {term.lower() for term in _CSS_TERM.findall(terms_text)
+             if len(term) >= MIN_TERM_LENGTH and term.lower() not in _CSS_NOISE}
+    return {"start": start, "end": end, "kind": kind, "name": name, "terms": terms}
+
+
+def _script_regions(content: str) -> List[Dict[str, Any]]:
+    """Top-level declarations of a formatted JS/TS module; consecutive imports form one region."""
+    lines = content.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    starts = []
+    for number, line in enumerate(lines):
+        match = _DECLARATION.match(line)
+        if match:
+            keyword, name = match.group("keyword"), match.group("name") or match.group("keyword")
+        elif _EXPORT_DEFAULT.match(line):
+            keyword, name = "export", "default"
+        else:
+            continue
+        if keyword == "import" and starts and starts[-1][2] == "import":
+            # Nothing was declared since the previous import, so the imports form one region
+            continue
+        # Comments and decorators directly above a declaration belong to it
+        first = number
+        while first > 0 and _LEADING_TRIVIA.match(lines[first - 1]):
+            first -= 1
+        starts.append((first, name if keyword != "import" else "imports", keyword))
+
+    regions = []
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, "preamble", "preamble"))
+    for index, (first, name, keyword) in enumerate(starts):
+        last = starts[index + 1][0] if index + 1 < len(starts) else len(lines)
+        start, end = offsets[first], offsets[last]
+        if start == end:
+            continue
+        body = content[start:end]
+        terms = {name.lower()} if len(name) >= MIN_TERM_LENGTH and keyword not in ("import", "preamble") else set()
+        # className strings let class selectors named in the changes find the component that uses them
+        for class_list in re.findall(r'className\s*=\s*["\'{`]([^"\'}`]*)', body):
+            terms.update(word.lower() for word in class_list.split() if len(word) >= MIN_TERM_LENGTH)
+        regions.append({"start": start, "end": end, "kind": keyword, "name": name, "terms": terms})
+    return regions
+
+
+def _append_tail(content: str, regions: List[Dict[str, Any]], start: int) -> None:
+    if start >= len(content):
+        return
+    if regions and not content[start:].strip():
+        regions[-1]["end"] = len(content)
+    else:
+        regions.append({"start": start, "end": len(content), "kind": "tail", "name": "", "terms": set()})
+
+
+def split_regions(content: str, extension: str) -> List[Dict[str, Any]]:
+    """
+    Split a file into consecutive regions that together cover it exactly.
+
+    CSS/SCSS/Less are split into top-level rule blocks and statements, JS/TS/JSX/TSX into top-level
+    declarations. Other files come back as a single region.
+
+    Returns:
+        Regions with id, start/end offsets, kind, name and the lowercase terms they are matched on.
+    """
+    extension = extension.lower()
+    if extension in CSS_EXTENSIONS:
+        regions = _css_regions(content, extension in LINE_COMMENT_EXTENSIONS)
+    elif extension in SCRIPT_EXTENSIONS:
+        regions = _script_regions(content)
+    else:
+        regions = [{"start": 0, "end": len(content), "kind": "file", "name": "", "terms": set()}]
+    for region_id, region in enumerate(regions, start=1):
+        region["id"] = region_id
+    return regions
+
+
+def select_regions(regions: List[Dict[str, Any]], planned_changes: Any, max_fraction: float) -> Optional[List[Dict[str, Any]]]:
+    """
+    Regions whose selectors or identifiers are named in the planned changes.
+
+    Returns:
+        The relevant regions, or None when none match or they would cover more than max_fraction
+        of the file (the whole file is then the better unit of work).
+    """
+    if len(regions) < 2:
+        return None
+    if isinstance(planned_changes, (list, tuple)):
+        planned_changes = "\n".join(str(change) for change in planned_changes)
+    words = {word.lower() for word in _WORD.findall(str(planned_changes))}
+    selected = [region for region in regions if region["terms"] & words]
+    if not selected:
+        return None
+    total = regions[-1]["end"] or 1
+    if sum(region["end"] - region["start"] for region in selected) > max_fraction * total:
+        return None
+    return selected
+
+
+def format_outline(content: str, regions: List[Dict[str, Any]], selected: List[Dict[str, Any]],
+                   max_entries: int = 200) -> str:
+    """One line per region left out of the request, with its line range and name."""
+    line_starts = [0] + [match.end() for match in re.finditer('\n', content)]
+    selected_ids = {region["id"] for region in selected}
+    entries = []
+    for region in regions:
+        first = bisect.bisect_right(line_starts, region["start"])
+        last = bisect.bisect_right(line_starts, max(region["start"], region["end"] - 1))
+        if region["id"] in selected_ids:
+            entries.append(f"lines {first}-{last}: REGION {region['id']} (shown below)")
+        else:
+            name = region["name"] if len(region["name"]) <= 80 else region["name"][:77] + "..."
+            entries.append(f"lines {first}-{last}: {region['kind']} {name}".rstrip())
+    if len(entries) > max_entries:
+        omitted = len(entries) - max_entries
+        shown = [entry for entry in entries if "REGION" in entry]
+        others = [entry for entry in entries if "REGION" not in entry][:max(0, max_entries - len(shown))]
+        entries = sorted(shown + others, key=lambda entry: int(entry.split()[1].split('-')[0]))
+        entries.append(f"... {omitted} more regions not listed")
+    return "\n".join(entries)
+
+
+def format_regions(content: str, selected: List[Dict[str, Any]]) -> str:
+    """The selected regions between numbered markers."""
+    return "\n".join(f"<<<REGION {region['id']}>>>\n{content[region['start']:region['end']].rstrip(chr(10))}\n"
+                     f"<<<END REGION {region['id']}>>>" for region in selected)
+
+
+def try_splice_regions(content: str, selected: List[Dict[str, Any]], response: str) -> Tuple[Optional[str], str]:
+    """
+    Put the enhanced regions from a model response back into content.
+
+    Returns:
+        (new content, summary), or (None, reason) if any selected region is missing from the response.
+    """
+    returned = {int(region_id): text for region_id, text in _REGION_BLOCK.findall(response)}
+    missing = [region["id"] for region in selected if region["id"] not in returned]
+    if missing:
+        return None, f"response is missing regions {', '.join(str(region_id) for region_id in missing)}"
+
+    changed = 0
+    for region in sorted(selected, key=lambda region: region["start"], reverse=True):
+        original = content[region["start"]:region["end"]]
+        replacement = returned[region["id"]]
+        # Keep the line break that separated the region from the next one
+        trailing = original[len(original.rstrip('\n')):]
+        replacement = replacement.rstrip('\n') + trailing
+        if replacement != original:
+            changed += 1
+        content = content[:region["start"]] + replacement + content[region["end"]:]
+    return content, f"spliced {len(selected)} regions ({changed} changed)"
@@ -0,0 +1,487 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .keyword_matcher import KeywordMatcher
+from .scan_cache import ScanCache, scan_cache_enabled
+from .manifest_detector import MANIFEST_NAMES, detect_from_manifests, settled_detectors
+from .ui_detectors import DETECTOR_VERSION, detect_file
+
+# File extensions to scan for
+UI_EXTENSIONS = {
+    'markup': ['.html', '.jsx', '.tsx', '.vue', '.svelte', '.astro', '.ejs'],
+    'style': ['.css', '.scss', '.sass', '.less', '.styled.js', '.style.js'],
+    'script': ['.js', '.ts', '.mjs', '.cjs'],
+    'animation': ['.js', '.ts', '.css', '.scss'],
+    'asset': ['.svg', '.jpg', '.png', '.webp']
+}
+
+# Keywords that indicate different UI aspects
+UI_KEYWORDS = {
+    'theme': ['theme', 'color', 'palette', 'dark', 'light', 'style', 'brand'],
+    'animation': ['animation', 'transition', 'motion', 'gsap', 'animate', 'keyframe'],
+    'layout': ['layout', 'grid', 'flex', 'container', 'responsive', 'mobile'],
+    'component': ['component', 'button', 'input', 'form', 'card', 'modal', 'dialog'],
+    'navigation': ['nav', 'menu', 'link', 'route', 'path', 'drawer', 'sidebar'],
+    'performance': ['performance', 'loading', 'lazy', 'optimize', 'cache']
+}
+
+# Vendor, build and tooling directories that never contain hand-written UI code
+DEFAULT_IGNORED_DIRS = {
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', 'jspm_packages', 'vendor',
+    'dist', 'build', 'out', 'coverage', '.next', '.nuxt', '.output', '.svelte-kit', '.astro',
+    '.cache', '.parcel-cache', '.turbo', '.vercel', '.netlify', '.idea', '__pycache__',
+    '.venv', 'venv', '.tox'
+}
+
+# Files above this size are skipped, as are empty files
+MAX_UI_FILE_SIZE = 1000000
+
+# Cached scan rows are only reused when produced by the same classification rules
+CLASSIFIER_VERSION = hashlib.sha1(
+    json.dumps([UI_EXTENSIONS, UI_KEYWORDS], sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def _extension_category(extension: str) -> Optional[str]:
+    """Return the first UI category whose extension list contains the extension."""
+    for category, extensions in UI_EXTENSIONS.items():
+        if extension in extensions:
+            return category
+    return None
+
+
+def _gitignore_pattern_to_regex(pattern: str) -> str:
+    """Translate a single gitignore glob into a regex matching a relative posix path."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex += f"[{body}]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+def parse_gitignore(gitignore_path: str, base_dir: str) -> List[Tuple[Any, bool, bool, str]]:
+    """
+    Parse a .gitignore file into matching rules.
+
+    Args:
+        gitignore_path (str): Path to the .gitignore file.
+        base_dir (str): Posix path of the directory holding it, relative to the repository root.
+
+    Returns:
+        List of (compiled regex, negated, directory_only, base_dir) rules in file order.
+    """
+    rules = []
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+
+        # Patterns containing a slash are anchored to the .gitignore directory
+        if "/" in line:
+            regex = _gitignore_pattern_to_regex(line.lstrip("/"))
+        else:
+            regex = "(?:.*/)?" + _gitignore_pattern_to_regex(line)
+
+        rules.append((re.compile(f"^{regex}$"), negated, directory_only, base_dir))
+    return rules
+
+
+def is_ignored(rel_path: str, is_dir: bool, rules: List[Tuple[Any, bool, bool, str]]) -> bool:
+    """Apply gitignore rules in order; the last matching rule decides."""
+    ignored = False
+    for regex, negated, directory_only, base_dir in rules:
+        if directory_only and not is_dir:
+            continue
+        if base_dir:
+            if not rel_path.startswith(base_dir + "/"):
+                continue
+            candidate = rel_path[len(base_dir) + 1:]
+        else:
+            candidate = rel_path
+        if regex.match(candidate):
+            ignored = not negated
+    return ignored
+
+
+def walk_repository(repo_dir: str, ignored_dirs=None, use_gitignore: bool = True) -> Iterator[
+        Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    """
+    Walk a repository with os.scandir, pruning ignored directories before descending.
+
+    Args:
+        repo_dir (str): The root directory of the repository.
+        ignored_dirs: Directory names to skip entirely (defaults to DEFAULT_IGNORED_DIRS).
+        use_gitignore (bool): Whether to honour .gitignore files found during the walk.
+
+    Yields:
+        (relative directory, kept subdirectory entries, kept file entries) in depth-first order.
+        As with os.walk, removing entries from the yielded subdirectory list prunes them from the walk.
+    """
+    if ignored_dirs is None:
+        ignored_dirs = DEFAULT_IGNORED_DIRS
+
+    stack = [(repo_dir, "", [])]
+    while stack:
+        abs_dir, rel_dir, rules = stack.pop()
+
+        try:
+            with os.scandir(abs_dir) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Error scanning {abs_dir}: {e}")
+            continue
+
+        if use_gitignore and any(entry.name == ".gitignore" for entry in entries):
+            rules = rules + parse_gitignore(os.path.join(abs_dir, ".gitignore"), rel_dir)
+
+        dirs = []
+        files = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in ignored_dirs or (rules and is_ignored(rel_path, True, rules)):
+                        continue
+                    dirs.append(entry)
+                elif entry.is_file():
+                    if rules and is_ignored(rel_path, False, rules):
+                        continue
+                    files.append(entry)
+            except OSError:
+                continue
+
+        yield rel_dir, dirs, files
+
+        for entry in reversed(dirs):
+            child_rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            stack.append((entry.path, child_rel, rules))
+
+
+def classify_content(path: str, content: Union[str, bytes], matcher: Optional[KeywordMatcher] = None) -> Tuple[
+        Optional[str], Dict[str, int]]:
+    """Determine the UI aspect of a file from keyword hits in its path and content.
+
+    Returns:
+        (aspect or None, weighted keyword count per aspect)
+    """
+    if matcher is None:
+        matcher = KeywordMatcher(UI_KEYWORDS)
+
+    # Count distinct keyword hits per aspect in a single pass over path and content
+    path_counts = matcher.count_by_group(path)
+    content_counts = matcher.count_by_group(content)
+
+    aspect_match = None
+    max_matches = 0
+    keyword_counts = {}
+    for aspect in UI_KEYWORDS:
+        total_matches = path_counts[aspect] * 3 + content_counts[aspect]  # Path matches weighted higher
+        keyword_counts[aspect] = total_matches
+
+        if total_matches > max_matches:
+            max_matches = total_matches
+            aspect_match = aspect
+
+    return (aspect_match if aspect_match and max_matches > 0 else None), keyword_counts
+
+
+def _file_entry(file_info: Dict[str, Any], aspect: Optional[str],
+                detectors: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    entry = {
+        "path": file_info["path"],
+        "extension": file_info["extension"],
+        "category": file_info["category"],
+        "size": file_info["size"],
+        "aspect": aspect or "other"
+    }
+    if detectors is not None:
+        entry["detectors"] = detectors
+    return entry
+
+
+def _detector_version(skip: List[Tuple[str, str]]) -> str:
+    """Version tag for cached detector hits; hits computed with detectors skipped are tagged apart."""
+    if not skip:
+        return DETECTOR_VERSION
+    return DETECTOR_VERSION + "+skip:" + ",".join(f"{family}:{name}" for family, name in sorted(skip))
+
+
+def _cached_detectors(cached: Optional[Dict[str, Any]], detector_version: str) -> Optional[Dict[str, Any]]:
+    """Return cached detector hits if they were produced by the current detectors."""
+    if cached and cached.get("detectors") and cached["detectors"].get("version") == detector_version:
+        return cached["detectors"]["hits"]
+    return None
+
+
+def _cache_row(file_info: Dict[str, Any], content_hash: str, aspect: Optional[str],
+               keyword_counts: Dict[str, int], detectors: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a scan cache row; detectors is the stored {"version", "hits"} record, if any."""
+    return {
+        "path": file_info["path"],
+        "size": file_info["size"],
+        "mtime_ns": file_info["mtime_ns"],
+        "inode": file_info["inode"],
+        "content_hash": content_hash,
+        "version": CLASSIFIER_VERSION,
+        "category": file_info["category"],
+        "aspect": aspect or "other",
+        "keyword_counts": keyword_counts,
+        "detectors": detectors
+    }
+
+
+def _read_and_classify(repo_dir: str, file_info: Dict[str, Any], cached: Optional[Dict[str, Any]],
+                       matcher: KeywordMatcher, detect: bool,
+                       skip: List[Tuple[str, str]]) -> Tuple[
+        Optional[Dict[str, Any]], Optional[Dict[str, Any]], int]:
+    """
+    Read one candidate file and build its ui_files entry, running the UI detectors when detect is set.
+
+    Returns:
+        (ui_files entry or None, cache row to store or None, bytes read)
+    """
+    path = file_info["path"]
+    try:
+        with open(os.path.join(repo_dir, path), 'rb') as f:
+            raw = f.read()
+        content = raw.decode('utf-8')
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None, None, 0
+
+    content_hash = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    same_content = cached is not None and cached["content_hash"] == content_hash
+    if same_content and cached["version"] == CLASSIFIER_VERSION:
+        # Same bytes under a new stat key (e.g. a fresh clone): reuse the classification
+        aspect = cached["aspect"]
+        keyword_counts = cached["keyword_counts"]
+    else:
+        aspect, keyword_counts = classify_content(path, raw, matcher)
+
+    detector_version = _detector_version(skip)
+    stored_detectors = cached.get("detectors") if same_content else None
+    detectors = _cached_detectors(cached, detector_version) if same_content else None
+    if detect and detectors is None:
+        detectors = detect_file(content, file_info["extension"], skip=skip, raw=raw)
+        stored_detectors = {"version": detector_version, "hits": detectors}
+
+    return (_file_entry(file_info, aspect, detectors if detect else None),
+            _cache_row(file_info, content_hash, aspect, keyword_counts, stored_detectors),
+            len(raw))
+
+
+def index_repository(repo_dir: str, max_workers: Optional[int] = None,
+                     use_cache: Optional[bool] = None, detect: bool = False) -> Dict[str, Any]:
+    """
+    Index a repository for UI files using a pruned walk and a bounded reader pool.
+
+    Args:
+        repo_dir (str): The root directory of the repository.
+        max_workers (int, optional): Reader threads; defaults to the UI_SCAN_WORKERS env var or CPU-based.
+        use_cache (bool, optional): Reuse the persistent scan cache; defaults to the UI_SCAN_CACHE env var.
+        detect (bool): Fused mode; also run the UI detectors and attach per-file hits as "detectors".
+            Frameworks and libraries declared in package manifests are settled first and not searched for.
+
+    Returns:
+        Dict with "ui_files" grouped by aspect and a "summary" including scan throughput stats.
+    """
+    start_time = time.perf_counter()
+    if max_workers is None:
+        max_workers = int(os.getenv('UI_SCAN_WORKERS', '0')) or min(32, (os.cpu_count() or 1) * 4)
+
+    # Collect file metadata with a single pruned walk
+    total_files = 0
+    dirs_seen = set()
+    candidates = []
+    manifests = []
+    for rel_dir, _, file_entries in walk_repository(repo_dir):
+        for entry in file_entries:
+            total_files += 1
+            if rel_dir:
+                dirs_seen.add(rel_dir.replace("/", os.sep))
+
+            if entry.name in MANIFEST_NAMES:
+                manifests.append(os.path.join(rel_dir, entry.name) if rel_dir else entry.name)
+
+            extension = os.path.splitext(entry.name)[1].lower()
+            category = _extension_category(extension)
+            if not category:
+                continue
+
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            size = stat.st_size
+
+            # Skip very large files or files that are likely not UI-related
+            if size > MAX_UI_FILE_SIZE or size == 0:
+                continue
+
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            candidates.append({
+                "path": rel_path.replace("/", os.sep),
+                "extension": extension,
+                "category": category,
+                "size": size,
+                "mtime_ns": stat.st_mtime_ns,
+                "inode": stat.st_ino
+            })
+
+    # Settle what package manifests already answer before any content detection
+    manifest_detection = None
+    skip = []
+    if detect:
+        manifest_detection = detect_from_manifests(repo_dir, sorted(manifests))
+        skip = settled_detectors(manifest_detection)
+    detector_version = _detector_version(skip)
+
+    # Results categorized by UI aspect
+    ui_files = {aspect: [] for aspect in UI_KEYWORDS}
+    ui_files['other'] = []
+
+    # Reuse cached results for files whose stat key is unchanged
+    if use_cache is None:
+        use_cache = scan_cache_enabled()
+    cache = None
+    cached_rows = {}
+    repo_key = os.path.realpath(repo_dir)
+    if use_cache:
+        try:
+            cache = ScanCache()
+            cached_rows = cache.load_repo(repo_key)
+        except Exception as e:
+            print(f"Scan cache unavailable, scanning without it: {e}")
+            cache = None
+
+    to_read = []
+    cache_hits = 0
+    for file_info in candidates:
+        cached = cached_rows.get(file_info["path"])
+        if (cached and cached["version"] == CLASSIFIER_VERSION and cached["size"] == file_info["size"]
+                and cached["mtime_ns"] == file_info["mtime_ns"] and cached["inode"] == file_info["inode"]
+                and (not detect or _cached_detectors(cached, detector_version) is not None)):
+            cache_hits += 1
+            file_entry = _file_entry(file_info, cached["aspect"],
+                                     _cached_detectors(cached, detector_version) if detect else None)
+            ui_files[file_entry["aspect"]].append(file_entry)
+        else:
+            to_read.append(file_info)
+
+    # Read and classify the remaining candidates on a bounded thread pool
+    bytes_read = 0
+    files_read = 0
+    new_rows = []
+    matcher = KeywordMatcher(UI_KEYWORDS)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = executor.map(
+            lambda info: _read_and_classify(repo_dir, info, cached_rows.get(info["path"]), matcher, detect, skip),
+            to_read)
+        for file_entry, cache_row, size in results:
+            if file_entry is None:
+                continue
+            files_read += 1
+            bytes_read += size
+            new_rows.append(cache_row)
+            ui_files[file_entry["aspect"]].append(file_entry)
+
+    if cache:
+        try:
+            cache.store(repo_key, new_rows)
+            cache.prune(repo_key, (file_info["path"] for file_info in candidates))
+        except Exception as e:
+            print(f"Failed to update scan cache: {e}")
+        finally:
+            cache.close()
+
+    # Sort each category by path
+    for category in ui_files:
+        ui_files[category].sort(key=lambda x: x["path"])
+
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+
+    # Compile summary statistics
+    summary = {
+        "total_files": sum(len(files) for files in ui_files.values()),
+        "files_by_aspect": {aspect: len(files) for aspect, files in ui_files.items()},
+        "files_by_extension": {},
+        "repository_structure": {
+            "total_files": total_files,
+            "directories": sorted(dirs_seen),
+            "manifests": sorted(manifests)
+        },
+        "scan_stats": {
+            "files_indexed": total_files,
+            "files_read": files_read,
+            "bytes_read": bytes_read,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_sec": round(total_files / elapsed, 1),
+            "bytes_per_sec": round(bytes_read / elapsed, 1),
+            "workers": max_workers,
+            "fused_detection": detect,
+            "cache_enabled": cache is not None,
+            "cache_hits": cache_hits,
+            "cache_misses": len(to_read)
+        }
+    }
+
+    if manifest_detection is not None:
+        summary["manifest_detection"] = manifest_detection
+
+    # Count files by extension
+    for files in ui_files.values():
+        for file in files:
+            ext = file["extension"]
+            summary["files_by_extension"][ext] = summary["files_by_extension"].get(ext, 0) + 1
+
+    return {
+        "ui_files": ui_files,
+        "summary": summary
+    }
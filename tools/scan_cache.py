@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scanned_files (
+    repo TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    category TEXT,
+    aspect TEXT,
+    keyword_counts TEXT,
+    detectors TEXT,
+    PRIMARY KEY (repo, path)
+)
+"""
+
+
+def get_cache_dir() -> str:
+    """Return the workspace directory used for on-disk caches."""
+    cache_dir = os.getenv('UI_ENHANCER_CACHE_DIR', './.ui_enhancer_cache')
+    if not os.path.isabs(cache_dir):
+        cache_dir = os.path.abspath(cache_dir)
+    return cache_dir
+
+
+def scan_cache_enabled() -> bool:
+    return os.getenv('UI_SCAN_CACHE', 'true').lower() == 'true'
+
+
+class ScanCache:
+    """
+    Persistent per-file scan results keyed by (repo, path).
+
+    A row is reused without reading the file when (size, mtime_ns, inode) still match,
+    and reused after reading when only the stat key changed but the content hash is the same.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        if db_path is None:
+            cache_dir = get_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, 'scan_cache.sqlite')
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def load_repo(self, repo: str) -> Dict[str, Dict[str, Any]]:
+        """Load every cached row for a repository, keyed by relative path."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, inode, content_hash, version, category, aspect, "
+                "keyword_counts, detectors FROM scanned_files WHERE repo = ?",
+                (repo,)
+            ).fetchall()
+
+        cached = {}
+        for path, size, mtime_ns, inode, content_hash, version, category, aspect, keyword_counts, detectors in rows:
+            cached[path] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "inode": inode,
+                "content_hash": content_hash,
+                "version": version,
+                "category": category,
+                "aspect": aspect,
+                "keyword_counts": json.loads(keyword_counts) if keyword_counts else {},
+                "detectors": json.loads(detectors) if detectors else None
+            }
+        return cached
+
+    def store(self, repo: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Insert or replace rows; each row carries the same fields returned by load_repo plus "path"."""
+        records = [
+            (repo, row["path"], row["size"], row["mtime_ns"], row["inode"], row["content_hash"], row["version"],
+             row.get("category"), row.get("aspect"), json.dumps(row.get("keyword_counts") or {}),
+             json.dumps(row["detectors"]) if row.get("detectors") is not None else None)
+            for row in rows
+        ]
+        if not records:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scanned_files (repo, path, size, mtime_ns, inode, content_hash, version, "
+                "category, aspect, keyword_counts, detectors) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            self._conn.commit()
+
+    def prune(self, repo: str, live_paths: Iterable[str]) -> int:
+        """Delete rows for files that no longer exist in the repository; returns the number removed."""
+        live = set(live_paths)
+        with self._lock:
+            stale = [(repo, path) for (path,) in
+                     self._conn.execute("SELECT path FROM scanned_files WHERE repo = ?", (repo,))
+                     if path not in live]
+            if stale:
+                self._conn.executemany("DELETE FROM scanned_files WHERE repo = ? AND path = ?", stale)
+                self._conn.commit()
+        return len(stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
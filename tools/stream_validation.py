@@ -0,0 +1,164 @@
+import os
+import re
+import tempfile
+from typing import List, Optional, Tuple
+
+_FENCE = re.compile(r'^\s*```[\w+-]*\s*$')
+
+# Lines of prose a model may put before an opening code fence
+MAX_PREAMBLE_LINES = 20
+
+
+class StreamAborted(Exception):
+    """The streamed content became structurally invalid in a way later tokens cannot repair."""
+
+
+class FenceStripper:
+    """
+    Strip a markdown code fence from streamed model output on the fly.
+
+    Complete lines are passed through as they arrive. A few leading lines are held back until it is
+    clear whether the content is wrapped in a fence (possibly after a line of prose); inside a fence,
+    everything from the closing fence on is dropped.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._preamble: List[str] = []
+        self._state = "start"  # start -> fenced | plain -> closed
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of model output and return the content that is now certain."""
+        self._partial += chunk
+        if "\n" not in self._partial:
+            return ""
+        complete, self._partial = self._partial.rsplit("\n", 1)
+        return "".join(self._line(line + "\n") for line in complete.split("\n"))
+
+    def finish(self) -> str:
+        """Return whatever is still held back once the stream has ended."""
+        tail = self._line(self._partial) if self._partial else ""
+        self._partial = ""
+        if self._state == "start":
+            # Never saw a fence, so the held back lines were content
+            self._state = "plain"
+            tail = "".join(self._preamble) + tail
+            self._preamble = []
+        return tail
+
+    def _line(self, line: str) -> str:
+        if self._state == "closed":
+            return ""
+        if self._state == "start":
+            if _FENCE.match(line):
+                self._state = "fenced"
+                self._preamble = []
+                return ""
+            self._preamble.append(line)
+            if len(self._preamble) < MAX_PREAMBLE_LINES:
+                return ""
+            self._state = "plain"
+            held, self._preamble = "".join(self._preamble), []
+            return held
+        if self._state == "fenced" and line.strip() == "```":
+            self._state = "closed"
+            return ""
+        return line
+
+
+class IncrementalStructureValidator:
+    """
+    Bracket checker fed one chunk at a time.
+
+    Brackets are matched exactly like validate_syntax in modify_ui_file, so a mismatch found on a
+    prefix means the finished file would be rejected too; those errors raise StreamAborted at once.
+    Unclosed brackets are only an error once the stream has ended. Nothing beyond what
+    validate_syntax checks aborts a stream, so a file it accepts is never cut off.
+    """
+
+    BRACKETS = {'(': ')', '[': ']', '{': '}'}
+    CLOSERS = {')': '(', ']': '[', '}': '{'}
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.stack: List[Tuple[str, int, int]] = []
+        self.line_num = 1
+        self.col_num = 1
+
+    def feed(self, text: str) -> None:
+        """
+        Validate the next piece of content.
+
+        Raises:
+            StreamAborted: If the content can no longer become valid.
+        """
+        for char in text:
+            if char == '\n':
+                self.line_num += 1
+                self.col_num = 1
+            else:
+                self.col_num += 1
+
+            if char in self.BRACKETS:
+                self.stack.append((char, self.line_num, self.col_num))
+            elif char in self.CLOSERS:
+                if not self.stack:
+                    raise StreamAborted(f"Unexpected closing bracket '{char}' at line {self.line_num}, "
+                                        f"column {self.col_num}")
+                last_open, _, _ = self.stack.pop()
+                if self.CLOSERS[char] != last_open:
+                    raise StreamAborted(f"Mismatched brackets at line {self.line_num}, column {self.col_num}")
+
+    def finish(self) -> Optional[str]:
+        """Return an error message if the complete content is invalid, else None."""
+        if self.stack:
+            last_open, line, col = self.stack[-1]
+            return f"Unclosed bracket '{last_open}' at line {line}, column {col}"
+        return None
+
+
+class ContentSpool:
+    """
+    Accumulates streamed content in memory, moving it to a temporary file once it exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int, suffix: str = ""):
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.size = 0
+        self.path: Optional[str] = None
+        self._chunks: List[str] = []
+        self._file = None
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self.size += len(text.encode('utf-8'))
+        if self._file is None:
+            self._chunks.append(text)
+            if self.size > self.max_bytes:
+                fd, self.path = tempfile.mkstemp(prefix="enhanced-", suffix=self.suffix)
+                self._file = os.fdopen(fd, 'w', encoding='utf-8')
+                self._file.write("".join(self._chunks))
+                self._chunks = []
+        else:
+            self._file.write(text)
+
+    def finish(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns:
+            (content, None) when the content stayed in memory, or (None, path) when it was spooled.
+        """
+        if self._file is None:
+            return "".join(self._chunks), None
+        self._file.close()
+        return None, self.path
+
+    def discard(self) -> None:
+        """Drop the content, removing the temporary file if one was created."""
+        self._chunks = []
+        if self._file is not None:
+            self._file.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._file = None
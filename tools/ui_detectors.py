@@ -0,0 +1,495 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .css_tokenizer import dialect_for_extension, tokenize_css
+from .keyword_matcher import KeywordMatcher, regex_fold_lower
+
+# Framework detection patterns
+FRAMEWORK_PATTERNS = {
+    'react': [r'import\s+React|from\s+[\'"]react[\'"]|ReactDOM|useState|useEffect'],
+    'vue': [r'import\s+Vue|from\s+[\'"]vue[\'"]|createApp|<template>|<script setup>'],
+    'angular': [r'import\s+{\s*Component\s*}|@Component|@Angular|NgModule'],
+    'svelte': [r'from\s+[\'"]svelte[\'"]'],
+    'astro': [r'from\s+[\'"]astro[\'"]'],
+    'nextjs': [r'import\s+{\s*useRouter\s*}\s+from\s+[\'"]next/router[\'"]|nextjs|getStaticProps'],
+    'nuxt': [r'from\s+[\'"]nuxt[\'"]|defineNuxtConfig|useNuxtApp'],
+}
+
+# UI library detection patterns
+UI_LIBRARY_PATTERNS = {
+    'tailwind': [r'tailwind|className=[\'"][^\'"]*(flex|grid|bg-|text-|p-|m-|rounded)[^\'"]*[\'"]'],
+    'bootstrap': [r'bootstrap|class=[\'"][^\'"]*(btn|container|row|col|navbar)[^\'"]*[\'"]'],
+    'material-ui': [r'@mui|@material-ui|makeStyles|createTheme|ThemeProvider'],
+    'chakra-ui': [r'@chakra-ui|ChakraProvider|useDisclosure'],
+    'styled-components': [r'styled\.|createGlobalStyle|css`'],
+    'framer-motion': [r'framer-motion|motion\.|animate|useAnimation|AnimatePresence'],
+    'gsap': [r'gsap|TweenMax|TimelineMax|ScrollTrigger'],
+    'three': [r'three\.js|THREE\.|Scene|WebGLRenderer|PerspectiveCamera'],
+}
+
+# Animation/transition patterns
+ANIMATION_PATTERNS = {
+    'css': [r'@keyframes|animation:|transition:|transform:'],
+    'js': [r'requestAnimationFrame|animate\(|\.to\(|\.from\(|\.fromTo\('],
+    'libraries': [r'gsap|anime\.|motion\.|framer|lottie|velocity']
+}
+
+DETECTOR_FAMILIES = {
+    "frameworks": FRAMEWORK_PATTERNS,
+    "ui_libraries": UI_LIBRARY_PATTERNS,
+    "animations": ANIMATION_PATTERNS
+}
+
+
+def has_script_block_before_style(text: str) -> bool:
+    """Linear equivalent of <script>.*?</script>.*?<style (DOTALL) on lowercased text."""
+    start = text.find("<script>")
+    if start == -1:
+        return False
+    end = text.find("</script>", start + 8)
+    return end != -1 and text.find("<style", end + 9) != -1
+
+
+def has_frontmatter_before_html(text: str) -> bool:
+    """Linear equivalent of ---.*?---.*?<html (DOTALL) on lowercased text."""
+    first = text.find("---")
+    if first == -1:
+        return False
+    second = text.find("---", first + 3)
+    return second != -1 and text.find("<html", second + 3) != -1
+
+
+def has_styled_call_template(text: str) -> bool:
+    """Linear equivalent of styled\\([^\\)]+\\)` on lowercased text."""
+    close = -1
+    start = text.find("styled(")
+    while start != -1:
+        paren = start + 6
+        # Consecutive calls without a ")" in between share the same closing parenthesis
+        if close <= paren:
+            close = text.find(")", paren + 1)
+            if close == -1:
+                return False
+        if close > paren + 1 and text.startswith("`", close + 1):
+            return True
+        start = text.find("styled(", start + 1)
+    return False
+
+
+# Checks replacing patterns whose backtracking is quadratic or worse on large files without a match
+STRUCTURAL_DETECTORS = {
+    ("frameworks", "svelte"): [has_script_block_before_style],
+    ("frameworks", "astro"): [has_frontmatter_before_html],
+    ("ui_libraries", "styled-components"): [has_styled_call_template],
+}
+
+# The regexes the structural checks replace, kept for the reference detector
+LEGACY_STRUCTURAL_PATTERNS = {
+    ("frameworks", "svelte"): r'<script>.*?</script>.*?<style',
+    ("frameworks", "astro"): r'---.*?---.*?<html',
+    ("ui_libraries", "styled-components"): r'styled\([^\)]+\)`',
+}
+
+STYLESHEET_EXTENSIONS = ['.css', '.scss', '.less']
+
+# Markup and script files, where frameworks and libraries are imported and used; framework and
+# library confidence is the share of these files with a hit (stylesheets and assets can't have one)
+SOURCE_EXTENSIONS = ['.html', '.jsx', '.tsx', '.vue', '.svelte', '.astro', '.ejs', '.js', '.ts', '.mjs', '.cjs']
+
+# Bump when detect_file output changes so cached per-file hits are recomputed
+DETECTOR_VERSION = "3"
+
+# Default per-file detection time budget
+DEFAULT_DETECTION_BUDGET_MS = 200.0
+
+# Bound on cached reduced alternations before the cache is reset
+_MAX_CACHED_PATTERNS = 1024
+
+
+def _split_top_level(pattern: str) -> List[str]:
+    """Split a regex source on "|" outside groups and character classes."""
+    alternatives = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            i = _class_end(pattern, i)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            alternatives.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    alternatives.append(pattern[start:])
+    return alternatives
+
+
+def _class_end(pattern: str, start: int) -> int:
+    """Return the index of the "]" closing the character class opened at start."""
+    i = start + 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        i += 1
+    while i < len(pattern) and pattern[i] != "]":
+        i += 2 if pattern[i] == "\\" else 1
+    return i
+
+
+def literal_runs(alternative: str) -> List[str]:
+    """
+    Return the lowercased runs of letters that every match of a regex alternative must contain.
+
+    Groups, character classes, escapes and optional (?, *, {0,n}) letters end a run, so each run
+    is a necessary condition for a match; an empty list means nothing could be proven.
+    """
+    runs = []
+    current = ""
+    depth = 0
+    i = 0
+    while i < len(alternative):
+        char = alternative[i]
+        if char == "\\":
+            runs.append(current)
+            current = ""
+            i += 2
+            continue
+        if char == "[":
+            runs.append(current)
+            current = ""
+            i = _class_end(alternative, i) + 1
+            continue
+        if char == "(":
+            depth += 1
+            runs.append(current)
+            current = ""
+        elif char == ")":
+            depth -= 1
+        elif depth > 0:
+            pass
+        elif char in "?*" or re.match(r"\{\d*(,\d*)?\}", alternative[i:]):
+            # The previous letter may be absent
+            runs.append(current[:-1])
+            current = ""
+        elif char.isascii() and char.isalpha():
+            current += char
+        else:
+            runs.append(current)
+            current = ""
+        i += 1
+    runs.append(current)
+
+    return sorted({run.lower() for run in runs if run})
+
+
+class DetectorEngine:
+    """
+    All detector patterns compiled into one alternation with a named group per detector.
+
+    Structural checks (plain str.find scans over the lowercased text) stand in for patterns that
+    would backtrack badly; a detector hits when either its regex or one of its checks does.
+
+    Case-insensitive alternations cannot use the regex engine's literal fast search, so each file
+    first goes through a keyword prefilter: a detector is only searched for when, for at least one
+    of its alternatives, every literal run of that alternative occurs in the file.
+
+    detect() then searches with the alternation of detectors not hit yet. Each hit removes its
+    detector and the search resumes at the start of that hit, so detectors matching at the same
+    or overlapping positions are still found, and the result equals running every pattern with
+    its own re.search, while the file is traversed once and Python loops once per hit.
+    """
+
+    def __init__(self, families: Dict[str, Dict[str, List[str]]],
+                 structural: Optional[Dict[Tuple[str, str], List[Callable[[str], bool]]]] = None,
+                 flags: int = re.IGNORECASE | re.DOTALL):
+        self.flags = flags
+        self.structural = structural or {}
+        self.families = {family: list(patterns) for family, patterns in families.items()}
+        self._detectors: List[Tuple[str, str]] = []
+        self._sources: Dict[Tuple[str, str], str] = {}
+        for family, patterns in families.items():
+            for name, name_patterns in patterns.items():
+                key = (family, name)
+                self._detectors.append(key)
+                self._sources[key] = "|".join(f"(?:{pattern})" for pattern in name_patterns)
+        self._group_names = {f"d{i}": key for i, key in enumerate(self._detectors)}
+        self._group_for = {key: group for group, key in self._group_names.items()}
+        self._patterns: Dict[FrozenSet[Tuple[str, str]], Any] = {}
+        self._lock = threading.Lock()
+
+        # Literal runs per alternative; detectors with an alternative without any are always searched
+        self._anchors: Dict[Tuple[str, str], List[FrozenSet[str]]] = {}
+        self._unanchored: Set[Tuple[str, str]] = set()
+        for family, patterns in families.items():
+            for name, name_patterns in patterns.items():
+                key = (family, name)
+                alternatives = [frozenset(literal_runs(alternative))
+                                for pattern in name_patterns for alternative in _split_top_level(pattern)]
+                if not all(alternatives) or not flags & re.IGNORECASE:
+                    self._unanchored.add(key)
+                else:
+                    self._anchors[key] = alternatives
+        anchor_words = sorted({run for alternatives in self._anchors.values() for runs in alternatives for run in runs})
+        self._prefilter = KeywordMatcher({"anchors": anchor_words}, regex_folding=True) if anchor_words else None
+
+    def _pattern_for(self, remaining: FrozenSet[Tuple[str, str]]):
+        pattern = self._patterns.get(remaining)
+        if pattern is None:
+            ordered = [key for key in self._detectors if key in remaining]
+            pattern = re.compile(
+                "|".join(f"(?P<{self._group_for[key]}>{self._sources[key]})" for key in ordered), self.flags)
+            with self._lock:
+                if len(self._patterns) >= _MAX_CACHED_PATTERNS:
+                    self._patterns.clear()
+                self._patterns[remaining] = pattern
+        return pattern
+
+    def detect(self, content: str, skip: Optional[Iterable[Tuple[str, str]]] = None) -> Dict[str, List[str]]:
+        """
+        Report every detector with at least one match in content.
+
+        Args:
+            content (str): Text to scan.
+            skip: (family, name) detectors already settled elsewhere, which are not searched for.
+
+        Returns:
+            Dict mapping each family to the names of its detectors that matched, in declaration order.
+        """
+        return self.detect_with_budget(content, skip)[0]
+
+    def detect_with_budget(self, content: str, skip: Optional[Iterable[Tuple[str, str]]] = None,
+                           budget_ms: Optional[float] = None) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+        """
+        Like detect(), but time every step against a per-file budget.
+
+        A regex step or structural check that takes longer than the budget is recorded under
+        "over_budget" (a step that found nothing is charged to every detector it searched for).
+        Once the budget is spent, detectors not searched for yet are recorded under "skipped".
+
+        Returns:
+            (hits, report) where report has "elapsed_ms", "over_budget" and "skipped" lists of
+            (family, name) detectors.
+        """
+        start_time = time.perf_counter()
+        budget = budget_ms / 1000 if budget_ms else None
+        report = {"elapsed_ms": 0.0, "over_budget": [], "skipped": []}
+
+        skipped = frozenset(skip or ())
+        present = self._prefilter.find(content) if self._prefilter else set()
+        remaining = frozenset(key for key in self._detectors
+                              if key not in skipped and key in self._sources
+                              and (key in self._unanchored or any(runs <= present for runs in self._anchors[key])))
+
+        found = set()
+        pos = 0
+        while remaining:
+            if budget is not None and time.perf_counter() - start_time > budget:
+                report["skipped"].extend(key for key in self._detectors if key in remaining)
+                break
+            step_start = time.perf_counter()
+            match = self._pattern_for(remaining).search(content, pos)
+            step_slow = budget is not None and time.perf_counter() - step_start > budget
+            if not match:
+                if step_slow:
+                    report["over_budget"].extend(key for key in self._detectors if key in remaining)
+                break
+            key = self._group_names[match.lastgroup]
+            if step_slow:
+                report["over_budget"].append(key)
+            found.add(key)
+            remaining = remaining - {key}
+            pos = match.start()
+
+        lowered = None
+        for key, checks in self.structural.items():
+            if key in found or key in skipped:
+                continue
+            if budget is not None and time.perf_counter() - start_time > budget:
+                report["skipped"].append(key)
+                continue
+            if lowered is None:
+                lowered = regex_fold_lower(content)
+            for check in checks:
+                check_start = time.perf_counter()
+                hit = check(lowered)
+                if budget is not None and time.perf_counter() - check_start > budget:
+                    report["over_budget"].append(key)
+                if hit:
+                    found.add(key)
+                    break
+
+        report["elapsed_ms"] = round((time.perf_counter() - start_time) * 1000, 3)
+        hits = {family: [name for name in names if (family, name) in found]
+                for family, names in self.families.items()}
+        return hits, report
+
+
+DEFAULT_ENGINE = DetectorEngine(DETECTOR_FAMILIES, STRUCTURAL_DETECTORS)
+
+
+def get_detection_budget_ms() -> float:
+    return float(os.getenv('UI_DETECTION_BUDGET_MS', DEFAULT_DETECTION_BUDGET_MS))
+
+
+def detect_file(content: str, extension: str, budget_ms: Optional[float] = None,
+                skip: Optional[Iterable[Tuple[str, str]]] = None, raw: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Run every UI detector over one file's content.
+
+    Args:
+        content (str): The file content.
+        extension (str): The lowercased file extension, including the dot.
+        budget_ms (float, optional): Per-file detection time budget; defaults to UI_DETECTION_BUDGET_MS.
+        skip: (family, name) detectors already settled elsewhere (e.g. by package manifests).
+        raw (bytes, optional): The file's UTF-8 bytes as read; when given, the stylesheet tokenizer
+            runs over them directly instead of over the decoded content.
+
+    Returns:
+        Dict of detector hits: frameworks, ui_libraries, animations, performance techniques and,
+        for stylesheets, media_queries, breakpoints, custom_properties (any defined),
+        custom_property_definitions/usages, keyframes and transition_properties, plus "budget_exceeded" naming
+        the detectors that overran or were skipped when the budget ran out.
+    """
+    if budget_ms is None:
+        budget_ms = get_detection_budget_ms()
+    hits, report = DEFAULT_ENGINE.detect_with_budget(content, skip=skip, budget_ms=budget_ms)
+    if report["over_budget"] or report["skipped"]:
+        hits["budget_exceeded"] = [f"{family}:{name}" for family, name in report["over_budget"] + report["skipped"]]
+    hits.update({
+        "media_queries": [],
+        "breakpoints": [],
+        "custom_properties": False,
+        "custom_property_definitions": [],
+        "custom_property_usages": [],
+        "keyframes": [],
+        "transition_properties": [],
+        "performance": []
+    })
+
+    # Responsive, theme and animation facts from one pass of the stylesheet tokenizer
+    if extension in STYLESHEET_EXTENSIONS:
+        hits.update(tokenize_css(raw if raw is not None else content, dialect_for_extension(extension)))
+        hits["custom_properties"] = bool(hits["custom_property_definitions"])
+
+    # Look for performance optimizations
+    if "loading=" in content or "lazy" in content:
+        hits["performance"].append("lazy-loading")
+    if "preload" in content or "prefetch" in content:
+        hits["performance"].append("resource-hints")
+
+    return hits
+
+
+def detect_per_pattern(content: str) -> Dict[str, List[str]]:
+    """Reference detector running every original pattern with its own re.search (the pre-engine behaviour)."""
+    return {family: [name for name, name_patterns in patterns.items()
+                     if any(re.search(pattern, content, re.IGNORECASE | re.DOTALL)
+                            for pattern in name_patterns + [LEGACY_STRUCTURAL_PATTERNS.get((family, name), r'(?!)')])]
+            for family, patterns in DETECTOR_FAMILIES.items()}
+
+
+def synthetic_corpus(files: int = 8, blocks: int = 3000) -> List[Tuple[str, str]]:
+    """Build large JSX and CSS files resembling real component and stylesheet bundles."""
+    corpus = []
+    for index in range(files):
+        if index % 2 == 0:
+            content = "import React, { useState } from 'react';\n" + "".join(
+                f"export function Card{i}({{ title }}) {{\n"
+                f"  const [open, setOpen] = useState(false);\n"
+                f"  return <div className=\"card-{i} shadow\" onClick={{() => setOpen(!open)}}>{{title}}</div>;\n"
+                f"}}\n" for i in range(blocks))
+            corpus.append((f"Cards{index}.jsx", content))
+        else:
+            content = "".join(
+                f".item-{i} {{ color: #333; margin: {i % 64}px; transition: opacity .2s; }}\n"
+                f"@media (max-width: {480 + i % 800}px) {{ .item-{i} {{ display: none; }} }}\n"
+                for i in range(blocks))
+            corpus.append((f"bundle{index}.css", content))
+    return corpus
+
+
+def benchmark_detection(files: int = 8, blocks: int = 3000, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Compare per-file detection cost of the per-pattern searches and the combined engine.
+
+    Returns:
+        Dict with corpus size, milliseconds per file for each implementation and the speedup.
+    """
+    corpus = synthetic_corpus(files, blocks)
+    timings = {}
+    for label, detector in (("per_pattern", detect_per_pattern), ("engine", DEFAULT_ENGINE.detect)):
+        detector(corpus[0][1])
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, content in corpus:
+                detector(content)
+        timings[label] = (time.perf_counter() - start) / (repeat * len(corpus)) * 1000
+
+    for _, content in corpus:
+        if detect_per_pattern(content) != DEFAULT_ENGINE.detect(content):
+            raise AssertionError("Detector engine disagrees with per-pattern detection")
+
+    return {
+        "files": len(corpus),
+        "bytes": sum(len(content) for _, content in corpus),
+        "per_pattern_ms_per_file": round(timings["per_pattern"], 2),
+        "engine_ms_per_file": round(timings["engine"], 2),
+        "speedup": round(timings["per_pattern"] / max(timings["engine"], 1e-9), 1)
+    }
+
+
+def redos_corpus(size: int = 200000) -> Dict[str, str]:
+    """Adversarial inputs for the detectors: near-misses that make backtracking patterns blow up."""
+    return {
+        "frontmatter_fences_without_html": "---\n" * (size // 4),
+        "script_tags_without_close": "<script>" * (size // 8),
+        "script_blocks_without_style": "<script></script>" * (size // 17),
+        "styled_calls_without_close": "styled(" * (size // 7),
+        "styled_calls_without_template": "styled(Button)" * (size // 14),
+        "class_attributes_without_match": ('className="' + "x" * 40) * (size // 51),
+        "minified_bundle": "a{b:c}" * (size // 6),
+    }
+
+
+def check_redos_corpus(budget_ms: float = DEFAULT_DETECTION_BUDGET_MS, size: int = 200000) -> Dict[str, float]:
+    """
+    Run the engine over the ReDoS corpus and fail if any input exceeds the budget.
+
+    Returns:
+        Milliseconds per corpus entry.
+
+    Raises:
+        AssertionError: If an entry is over budget or the engine disagrees with the reference on a small sample.
+    """
+    timings = {}
+    for name, content in redos_corpus(size).items():
+        hits, report = DEFAULT_ENGINE.detect_with_budget(content, budget_ms=budget_ms)
+        timings[name] = report["elapsed_ms"]
+        if report["over_budget"] or report["skipped"] or report["elapsed_ms"] > budget_ms:
+            raise AssertionError(f"Detection over budget on {name}: {report}")
+
+        # The reference is quadratic on these inputs, so only compare on a short prefix
+        sample = content[:2000]
+        if DEFAULT_ENGINE.detect(sample) != detect_per_pattern(sample):
+            raise AssertionError(f"Detector engine disagrees with per-pattern detection on {name}")
+    return timings
+
+
+if __name__ == "__main__":
+    # python -m tools.ui_detectors [--redos]
+    import sys
+
+    if "--redos" in sys.argv:
+        print(check_redos_corpus())
+    else:
+        print(benchmark_detection())